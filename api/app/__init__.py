@@ -4,30 +4,44 @@ from flask_cors import CORS
 import tomli as toml
 
 from .configuration import load_config
+from .serialization import FastJSONProvider
 
 
 def create_app():
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     CORS(app, supports_credentials=True, origins="*")
     # Load config
     config = load_config()
     app.config['DEBUG'] = config['flask']['debug']
     app.config['MAX_CONTENT_LENGTH'] = config['uploads']['max_size']
 
+    if config['database']['run_migrations']:
+        from .migrations import run_migrations
+        from .history import ensure_activity_partitions
+        run_migrations()
+        ensure_activity_partitions()
+
     # Register blueprints
     from .analytics import analytics_bp
     from .canvas import canvas_bp
+    from .changes import changes_bp
     from .code_snippets import code_snippets_bp
     from .equations import equation_bp
     from .events import events_bp
+    from .export import export_bp
     from .files import files_bp
     from .images import images_bp
+    from .imports import imports_bp
     from .logging import logging_bp
     from .main import main_bp
     from .pages import pages_bp
     from .projects import projects_bp
     from .recipes import recipe_bp
+    from .revisions import revisions_bp
+    from .search import search_bp
     from .sessions import sessions_bp
+    from .sync import sync_bp
     from .tags import tags_bp
     from .todo import todo_bp
     from .translations import translations_bp
@@ -35,17 +49,23 @@ def create_app():
 
     app.register_blueprint(analytics_bp)
     app.register_blueprint(canvas_bp)
+    app.register_blueprint(changes_bp)
     app.register_blueprint(code_snippets_bp)
     app.register_blueprint(equation_bp)
     app.register_blueprint(events_bp)
+    app.register_blueprint(export_bp)
     app.register_blueprint(files_bp)
     app.register_blueprint(images_bp)
+    app.register_blueprint(imports_bp)
     app.register_blueprint(logging_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(pages_bp)
     app.register_blueprint(projects_bp)
     app.register_blueprint(recipe_bp)
+    app.register_blueprint(revisions_bp)
+    app.register_blueprint(search_bp)
     app.register_blueprint(sessions_bp)
+    app.register_blueprint(sync_bp)
     app.register_blueprint(tags_bp)
     app.register_blueprint(todo_bp)
     app.register_blueprint(translations_bp)
@@ -0,0 +1,155 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from .configuration import load_config
+from .db import get_db_connection
+
+config = load_config()
+
+# Columns written for each request log table. accessTime is always appended and set when the event is submitted,
+# so batching does not shift the logged time to the moment of the flush.
+audit_tables = {
+    'projectrequests': ['SessionID', 'ProjectID', 'accessGranted', 'notes'],
+    'pagerequests': ['SessionID', 'PageID', 'accessGranted', 'notes'],
+    'canvasrequests': ['CanvasID', 'accessGranted', 'notes'],
+    'equationsrequests': ['EquationID', 'accessGranted', 'notes'],
+    'reciperequests': ['RecipeID', 'accessGranted', 'notes'],
+    'codesnippetsrequests': ['CodeID', 'accessGranted', 'notes'],
+    'translationrequests': ['TranslationID', 'accessGranted', 'notes'],
+}
+
+overflow_policies = ('block', 'drop', 'write')
+
+
+class AuditLogWriter:
+    """
+    Queues request log rows in memory and writes them from a background thread with one multi-row INSERT per table,
+    every flush_interval_ms or as soon as batch_size rows are waiting.
+
+    When the queue is full the overflow policy decides what happens to a new row: 'block' waits for room, 'drop'
+    discards it and 'write' inserts it synchronously on the request path.
+    """
+
+    def __init__(self, batch_size, flush_interval_ms, max_queue, overflow):
+        if overflow not in overflow_policies:
+            raise ValueError(f"Unknown audit overflow policy: {overflow}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.overflow = overflow
+        self.stats = {'submitted': 0, 'written': 0, 'dropped': 0, 'failed': 0}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._write_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, table, values):
+        row = (table, tuple(values) + (datetime.now(),))
+        self.stats['submitted'] += 1
+        if self.overflow == 'block':
+            self._queue.put(row)
+            return
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            if self.overflow == 'drop':
+                self.stats['dropped'] += 1
+            else:
+                self._write([row])
+
+    def flush(self):
+        """
+        Writes everything queued so far on the calling thread.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        self._stopping.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        by_table = {}
+        for table, values in batch:
+            by_table.setdefault(table, []).append(values)
+
+        with self._write_lock:
+            for table, rows in by_table.items():
+                try:
+                    self._insert(table, rows)
+                except psycopg2.Error:
+                    # One bad row (e.g. a resource deleted before the flush) fails the whole statement, so retry
+                    # row by row and only lose the rows that cannot be written.
+                    for row in rows:
+                        try:
+                            self._insert(table, [row])
+                        except psycopg2.Error:
+                            self.stats['failed'] += 1
+
+    def _insert(self, table, rows):
+        columns = ', '.join(audit_tables[table] + ['accessTime'])
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            execute_values(cursor, f"INSERT INTO {table} ({columns}) VALUES %s;", rows, page_size=self.batch_size)
+        self.stats['written'] += len(rows)
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_log():
+    """
+    Returns this process's writer, starting it on first use. Queued rows are flushed when the worker exits.
+    """
+    global _writer, _writer_pid
+    if _writer is None or _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid():
+                audit_config = config['audit']
+                _writer = AuditLogWriter(audit_config['batch_size'], audit_config['flush_interval_ms'],
+                                         audit_config['max_queue'], audit_config['overflow'])
+                _writer_pid = os.getpid()
+                atexit.register(_writer.close)
+    return _writer
+
+
+def log_request(table, *values):
+    get_audit_log().submit(table, values)
+
+
+def flush_audit_log():
+    get_audit_log().flush()
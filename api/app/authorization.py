@@ -0,0 +1,109 @@
+from flask import g
+
+from .db import get_db_connection
+from .sessions import sessions_fields, sessions_columns, session_cache, cache_session, listen_for_invalidations
+
+# Each lookup resolves a resource ID to the user that owns it along with the project and page it belongs to.
+resource_owners = {
+    'project': """
+        SELECT projects.UserID, projects.ProjectID, NULL::INTEGER AS PageID FROM projects
+        WHERE projects.ProjectID = %s
+    """,
+    'page': """
+        SELECT projects.UserID, pages.ProjectID, pages.PageID FROM pages
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE pages.PageID = %s
+    """,
+    'canvas': """
+        SELECT projects.UserID, pages.ProjectID, pages.PageID FROM canvas
+        inner join pages on pages.PageID = canvas.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE canvas.CanvasID = %s
+    """,
+    'equation': """
+        SELECT projects.UserID, pages.ProjectID, pages.PageID FROM equations
+        inner join pages on pages.PageID = equations.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE equations.EquationID = %s
+    """,
+    'recipe': """
+        SELECT projects.UserID, pages.ProjectID, pages.PageID FROM recipes
+        inner join pages on pages.PageID = recipes.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE recipes.RecipeID = %s
+    """,
+    'snippet': """
+        SELECT projects.UserID, pages.ProjectID, pages.PageID FROM codesnippets
+        inner join pages on pages.PageID = codesnippets.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE codesnippets.CodeID = %s
+    """,
+    'translation': """
+        SELECT projects.UserID, pages.ProjectID, pages.PageID FROM translations
+        inner join pages on pages.PageID = translations.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE translations.TranslationID = %s
+    """,
+    'file': """
+        SELECT projects.UserID, pages.ProjectID, pages.PageID FROM files
+        inner join pages on pages.PageID = files.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE files.FileID = %s
+    """,
+    'todo': """
+        SELECT projects.UserID, todo.ProjectID, NULL::INTEGER AS PageID FROM todo
+        inner join projects on projects.ProjectID = todo.ProjectID
+        WHERE todo.TodoID = %s
+    """,
+    'event': """
+        SELECT projects.UserID, events.ProjectID, NULL::INTEGER AS PageID FROM events
+        inner join projects on projects.ProjectID = events.ProjectID
+        WHERE events.EventID = %s
+    """,
+}
+
+
+def verify_resource_access(token, resource, resource_id):
+    """
+    Resolves token -> session -> owned resource in a single statement. When the session is already cached only the
+    ownership lookup runs and the sessions table is not touched.
+
+    Returns (valid, authorized, session). The session is placed on flask.g along with the project and page the
+    resource belongs to, so handlers don't need to query the sessions table again.
+    """
+    g.session, g.project_id, g.page_id = None, None, None
+    if token is None or resource_id is None:
+        return False, False, None
+
+    session = session_cache.get(token)
+
+    if session is not None:
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT owner.ProjectID, owner.PageID FROM ({resource_owners[resource]}) AS owner
+                where owner.UserID = %s;
+            """, (resource_id, session['UserID']))
+            owner = cursor.fetchone()
+        project_id, page_id = owner if owner is not None else (None, None)
+    else:
+        listen_for_invalidations()
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {sessions_columns}, owner.ProjectID, owner.PageID FROM sessions
+                left join ({resource_owners[resource]}) AS owner
+                on owner.UserID = sessions.UserID
+                where sessions.token = %s;
+            """, (resource_id, token))
+            result = cursor.fetchone()
+
+        if result is None:
+            return False, False, None
+
+        session = cache_session({k: v for k, v in zip(sessions_fields, result)})
+        project_id, page_id = result[len(sessions_fields):]
+
+        if session is None:
+            return False, False, None
+
+    g.session, g.project_id, g.page_id = session, project_id, page_id
+    return True, project_id is not None, session
@@ -0,0 +1,122 @@
+import hashlib
+
+from psycopg2 import errors
+
+from .configuration import load_config
+from .db import get_db_connection
+
+config = load_config()
+
+# Blobs are content addressed: one row per distinct SHA-512, shared by every file and image with that content.
+# refCount is maintained by triggers on files and images, which delete a blob once nothing points at it.
+
+
+def hash_stream(stream):
+    chunk_size = config['uploads']['chunk_size']
+    hash_object = hashlib.sha512()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        hash_object.update(chunk)
+    return hash_object.hexdigest()
+
+
+def find_blob(cursor, blob_hash):
+    # Locking the row keeps a concurrent delete from collecting the blob before the caller's reference is inserted
+    cursor.execute("SELECT BlobID FROM blobs WHERE hash = %s FOR UPDATE;", (blob_hash,))
+    blob = cursor.fetchone()
+    if blob is not None:
+        blob = blob[0]
+    return blob
+
+
+def write_chunks(cursor, stream):
+    """
+    Copies stream into a new, unnamed blob chunk by chunk, hashing as it goes, so no more than one chunk is held in
+    memory. Returns the BlobID, the SHA-512 hex digest and the size.
+    """
+    chunk_size = config['uploads']['chunk_size']
+    hash_object = hashlib.sha512()
+    size = 0
+
+    cursor.execute("INSERT INTO blobs (chunkSize) VALUES (%s) RETURNING BlobID;", (chunk_size,))
+    blob_id = cursor.fetchone()[0]
+
+    seq = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        hash_object.update(chunk)
+        size += len(chunk)
+        cursor.execute("INSERT INTO blobChunks (BlobID, seq, data) VALUES (%s, %s, %s);", (blob_id, seq, chunk))
+        seq += 1
+
+    return blob_id, hash_object.hexdigest(), size
+
+
+def name_blob(cursor, blob_id, blob_hash, size):
+    """
+    Gives a freshly written blob its hash, or drops it in favour of an existing blob with the same content.
+    Returns the BlobID to reference.
+    """
+    while True:
+        existing = find_blob(cursor, blob_hash)
+        if existing is not None:
+            cursor.execute("DELETE FROM blobs WHERE BlobID = %s;", (blob_id,))
+            return existing
+
+        cursor.execute("SAVEPOINT name_blob;")
+        try:
+            cursor.execute("UPDATE blobs SET hash = %s, size = %s WHERE BlobID = %s;", (blob_hash, size, blob_id))
+            cursor.execute("RELEASE SAVEPOINT name_blob;")
+            return blob_id
+        except errors.UniqueViolation:
+            # Another upload of the same content committed first; use its blob
+            cursor.execute("ROLLBACK TO SAVEPOINT name_blob;")
+
+
+def store_blob(cursor, stream):
+    """
+    Returns (BlobID, hash) of a blob holding the content of stream, writing it only if no blob has that content yet.
+    The reference to the blob must be inserted in the same transaction.
+
+    Seekable streams (spooled uploads) are hashed first so that duplicates are never written.
+    """
+    if stream.seekable():
+        start = stream.tell()
+        blob_hash = hash_stream(stream)
+        blob_id = find_blob(cursor, blob_hash)
+        if blob_id is not None:
+            return blob_id, blob_hash
+        stream.seek(start)
+
+    blob_id, blob_hash, size = write_chunks(cursor, stream)
+    return name_blob(cursor, blob_id, blob_hash, size), blob_hash
+
+
+def read_blob_chunk(blob_id, seq):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT data FROM blobChunks where BlobID = %s AND seq = %s;", (blob_id, seq))
+        chunk = cursor.fetchone()
+    if chunk is not None:
+        chunk = bytes(chunk[0])
+    return chunk
+
+
+def stream_blob(blob_id, chunk_size, start, stop):
+    """
+    Yields bytes [start, stop) of a blob, checking a connection out of the pool only for each chunk.
+    """
+    offset = start
+    while offset < stop:
+        seq, skip = divmod(offset, chunk_size)
+        chunk = read_blob_chunk(blob_id, seq)
+        if chunk is None:
+            return
+        chunk = chunk[skip:skip + stop - offset]
+        if not chunk:
+            return
+        offset += len(chunk)
+        yield chunk
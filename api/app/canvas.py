@@ -4,149 +4,103 @@ from datetime import datetime
 
 canvas_bp = Blueprint('canvas', __name__, url_prefix='/canvas')
 from .db import get_db_connection
-from .sessions import verify_session_for_access
-from .pages import authorized_page_access
-from .projects import authorized_project_access
+from .authorization import verify_resource_access
+from .audit import log_request
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .projection import get_fields_arg
+from .tables import Table, fetch_row, fetch_rows
+from .conditional import get_content_validators, content_validators, not_modified, not_modified_response, set_validators
 
 canvas_fields = ['CanvasID', 'PageID', 'name', 'description', 'content', 'timeCreated', 'lastEditTime']
-
-
-def convert_time(object):
-    object['timeCreated'] = object['timeCreated'].timestamp()
-    object['lastEditTime'] = object['lastEditTime'].timestamp()
-    return object
+canvas_table = Table('canvas', canvas_fields, timestamps=['timeCreated', 'lastEditTime'])
+canvas_list_fields = [field for field in canvas_fields if field != 'content']
 
 
 def log_access(canvas_id, allowed, notes):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO canvasrequests (CanvasID, accessGranted, notes)
-        VALUES (%s, %s, %s);
-    """, (canvas_id, allowed, notes))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    log_request('canvasrequests', canvas_id, allowed, notes)
 
 
 def get_last_update(canvas_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT lastEditTime FROM canvas where CanvasID = %s;", (canvas_id,))
-    last_update = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {canvas_table.column('lastEditTime')} FROM canvas where CanvasID = %s;", (canvas_id,))
+        last_update = cursor.fetchone()
     if last_update is not None:
-        return last_update[0].timestamp()
+        return last_update[0]
     return None
 
 
 def delete_canvas(canvas_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM canvas where CanvasID = %s;", (canvas_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM canvas where CanvasID = %s;", (canvas_id,))
 
 
 def update_canvas(canvas_id, name, description):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE canvas SET name = %s, description = %s, lastEditTime = %s
-        WHERE CanvasID = %s
-        RETURNING *;
-    """, (name, description, datetime.now(), canvas_id,))
-    canvas = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if canvas is not None:
-        canvas = {k: v for k, v in zip(canvas_fields, canvas)}
-        canvas = convert_time(canvas)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE canvas SET name = %s, description = %s, lastEditTime = %s
+            WHERE CanvasID = %s
+            RETURNING {canvas_table.select()};
+        """, (name, description, datetime.now(), canvas_id,))
+        canvas = fetch_row(cursor)
     return canvas
 
 
 def update_canvas_content(canvas_id, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE canvas SET content = %s, lastEditTime = %s
-        WHERE CanvasID = %s
-        RETURNING *;
-    """, (content, datetime.now(), canvas_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE canvas SET content = %s, lastEditTime = %s
+            WHERE CanvasID = %s
+            RETURNING {canvas_table.select()};
+        """, (content, datetime.now(), canvas_id,))
 
 
 def get_canvas_by_id(canvas_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM canvas where CanvasID = %s;", (canvas_id,))
-    canvas = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if canvas is not None:
-        canvas = {k: v for k, v in zip(canvas_fields, canvas)}
-        canvas = convert_time(canvas)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {canvas_table.select()} FROM canvas where CanvasID = %s;", (canvas_id,))
+        canvas = fetch_row(cursor)
     return canvas
 
 
-def get_canvas_by_page(page_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM canvas where PageID = %s;", (page_id,))
-    canvases = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if canvases is not None:
-        canvas_list = []
-        for canvas in canvases:
-            canvas = {k: v for k, v in zip(canvas_fields, canvas) if k != "content"}
-            canvas = convert_time(canvas)
-            canvas_list.append(canvas)
-        return canvas_list
-    return None
+def page_canvas_query(page_id, limit=None, after=None, fields=canvas_list_fields):
+    condition, order_by = keyset(['canvas.CanvasID'], after)
+    columns = canvas_table.select(fields)
+    return (f"SELECT {columns} FROM canvas where PageID = %s{condition} {order_by} LIMIT %s;",
+            (page_id, *(after or []), fetch_limit(limit)))
 
 
-def get_canvas_by_project(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""SELECT canvas.*, pages.pageID FROM canvas
+def get_canvas_by_page(page_id, limit=None, after=None, fields=canvas_list_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(*page_canvas_query(page_id, limit, after, fields))
+        canvases = fetch_rows(cursor)
+    return page_of(canvases, limit, lambda canvas: [canvas['CanvasID']])
+
+
+def fetch_canvas_by_project(cursor, project_id, limit=None, after=None, fields=canvas_list_fields):
+    condition, order_by = keyset(['canvas.CanvasID'], after)
+    columns = canvas_table.select(fields)
+    cursor.execute(f"""SELECT {columns}, pages.PageID AS "pageID" FROM canvas
     inner join pages
     on pages.pageID = canvas.pageID
-    where pages.projectID = %s
-    """, (project_id,))
-    canvases = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if canvases is not None:
-        canvas_list = []
-        for canvas in canvases:
-            canvas = {k: v for k, v in zip(canvas_fields+['pageID'], canvas) if k != "content"}
-            canvas = convert_time(canvas)
-            canvas_list.append(canvas)
-        return canvas_list
-    return None
+    where pages.projectID = %s{condition}
+    {order_by} LIMIT %s;
+    """, (project_id, *(after or []), fetch_limit(limit)))
+    canvases = fetch_rows(cursor)
+    return page_of(canvases, limit, lambda canvas: [canvas['CanvasID']])
+
+
+def get_canvas_by_project(project_id, limit=None, after=None, fields=canvas_list_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_canvas_by_project(cursor, project_id, limit, after, fields)
 
 
 def create_canvas(page_id, name, description, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO canvas (PageID, name, description, content, lastEditTime)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING *;
-    """, (page_id, name, description, content, datetime.now()))
-    canvas = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if canvas is not None:
-        canvas = {k: v for k, v in zip(canvas_fields, canvas)}
-        canvas = convert_time(canvas)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO canvas (PageID, name, description, content, lastEditTime)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING {canvas_table.select()};
+        """, (page_id, name, description, content, datetime.now()))
+        canvas = fetch_row(cursor)
     return canvas
 
 
@@ -160,12 +114,12 @@ def create_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     new_canvas = create_canvas(page_id, name, description, content)
@@ -185,24 +139,33 @@ def get_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'canvas', canvas_id)
 
     if not valid:
         log_access(canvas_id, False, "GET")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    canvas = get_canvas_by_id(canvas_id)
-
-    if not authorized_page_access(token, canvas['PageID']):
+    if not authorized:
         log_access(canvas_id, False, "GET")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
-    if canvas is None:
+    validators = get_content_validators(canvas_table, 'CanvasID', canvas_id)
+
+    if validators is None:
         return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.FORBIDDEN)
 
     log_access(canvas_id, True, "GET")
+
+    if not_modified(*validators):
+        return not_modified_response(*validators)
+
+    canvas = get_canvas_by_id(canvas_id)
+
+    if canvas is None:
+        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.FORBIDDEN)
+
     response = make_response({'status': 'success', 'message': canvas}, STATUS.OK)
-    return response
+    return set_validators(response, *content_validators(canvas, canvas_fields))
 
 
 @canvas_bp.route('/get_fields', methods=['GET'])
@@ -211,18 +174,18 @@ def get_fields_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'canvas', canvas_id)
 
     if not valid:
         log_access(canvas_id, False, "GET")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    canvas = get_canvas_by_id(canvas_id)
-
-    if not authorized_page_access(token, canvas['PageID']):
+    if not authorized:
         log_access(canvas_id, False, "GET")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    canvas = get_canvas_by_id(canvas_id)
+
     if canvas is None:
         return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.FORBIDDEN)
 
@@ -241,21 +204,22 @@ def get_all_by_page_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    canvases = get_canvas_by_page(page_id)
-
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
-    if canvases is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(canvas_list_fields)
+        canvases, next_page = get_canvas_by_page(page_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    response = make_response({'status': 'success', 'message': canvases}, STATUS.OK)
-    return response
+    return page_response(canvases, next_page)
 
 
 @canvas_bp.route('/get_all_by_project', methods=['GET'])
@@ -264,21 +228,22 @@ def get_all_by_project_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Cannot Access Project"}, STATUS.FORBIDDEN)
 
-    canvases = get_canvas_by_project(project_id)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(canvas_list_fields)
+        canvases, next_page = get_canvas_by_project(project_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    if canvases is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
-
-    response = make_response({'status': 'success', 'message': canvases}, STATUS.OK)
-    return response
+    return page_response(canvases, next_page)
 
 
 @canvas_bp.route('/update', methods=['PATCH'])
@@ -290,15 +255,13 @@ def update_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'canvas', canvas_id)
 
     if not valid:
         log_access(canvas_id, False, "UPDATE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    equation = get_canvas_by_id(canvas_id)
-
-    if not authorized_page_access(token, equation['PageID']):
+    if not authorized:
         log_access(canvas_id, False, "UPDATE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
@@ -319,16 +282,18 @@ def update_content_ep():
     content = data.get("new_content")
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'canvas', canvas_id)
 
     if not valid:
         log_access(canvas_id, False, "UPDATE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
-    canvas = get_canvas_by_id(canvas_id)
-    if not authorized_page_access(token, canvas['PageID']):
+
+    if not authorized:
         log_access(canvas_id, False, "UPDATE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    canvas = get_canvas_by_id(canvas_id)
+
     update_canvas_content(canvas_id, content)
     log_access(canvas_id, True, "UPDATE")
     response = make_response({'status': 'success', 'message': f'Updated {canvas["name"]}'}, STATUS.OK)
@@ -342,18 +307,18 @@ def delete_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'canvas', canvas_id)
 
     if not valid:
         log_access(canvas_id, False, "DELETE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    canvas = get_canvas_by_id(canvas_id)
-
-    if not authorized_page_access(token, canvas['PageID']):
+    if not authorized:
         log_access(canvas_id, False, "DELETE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    canvas = get_canvas_by_id(canvas_id)
+
     log_access(canvas_id, True, "DELETE")
     delete_canvas(canvas_id)
 
@@ -369,6 +334,17 @@ def test_ep():
 @canvas_bp.route('/last_update', methods=['GET'])
 def last_update():
     canvas_id = int(request.args.get("id"))
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'canvas', canvas_id)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        return make_response({'status': 'error', 'message': "Not Authorized To Access"}, STATUS.FORBIDDEN)
+
     time = get_last_update(canvas_id)
     if time is None:
         return make_response({"canvas_id": canvas_id, "last_update": "Null"}, STATUS.OK)
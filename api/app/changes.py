@@ -0,0 +1,187 @@
+from flask import Blueprint, jsonify, request, make_response, Response
+from http import HTTPStatus as STATUS
+import json
+import queue
+import threading
+import time
+
+changes_bp = Blueprint('changes', __name__, url_prefix='/changes')
+from .configuration import load_config
+from .authorization import verify_resource_access
+from .notifications import listen
+
+config = load_config()
+change_channel = 'changes'
+
+
+class Subscription:
+    """
+    Changes waiting to be sent to one connected client, for any number of (scope, id) keys. If the client falls more
+    than max_queue changes behind, the backlog is dropped and the client is told to resync instead.
+    """
+
+    def __init__(self, keys, max_queue):
+        self.keys = frozenset(keys)
+        self.resync = False
+        self._queue = queue.Queue(maxsize=max_queue)
+
+    def put(self, change):
+        try:
+            self._queue.put_nowait(change)
+        except queue.Full:
+            self.resync = True
+
+    def get(self, timeout):
+        return self._queue.get(timeout=timeout)
+
+
+class ChangeBroker:
+    """
+    Fans the changes NOTIFYed by the content table triggers out to the subscriptions of this worker process, by
+    project and by page.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._listening = None
+
+    def subscribe(self, keys):
+        subscription = Subscription(keys, config['changes']['max_queue'])
+        with self._lock:
+            for key in subscription.keys:
+                self._subscriptions.setdefault(key, set()).add(subscription)
+            if self._listening is None:
+                self._listening = listen(change_channel, self.publish, on_reconnect=self.resync_all)
+        return subscription
+
+    def wait_listening(self, timeout):
+        # Whether this worker receives the changes yet, waiting up to timeout seconds for its LISTEN
+        return self._listening is not None and self._listening.wait(timeout)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for key in subscription.keys:
+                subscriptions = self._subscriptions.get(key)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscriptions[key]
+
+    def publish(self, payload):
+        change = json.loads(payload)
+        with self._lock:
+            # A set, as a client subscribed to both the project and the page gets the change once
+            targets = set(self._subscriptions.get(('project', change['project_id']), ()))
+            targets |= self._subscriptions.get(('page', change['page_id']), set())
+        for subscription in targets:
+            subscription.put(change)
+
+    def resync_all(self):
+        # Notifications sent while the listener was reconnecting are lost
+        with self._lock:
+            subscriptions = [s for scoped in self._subscriptions.values() for s in scoped]
+        for subscription in subscriptions:
+            subscription.resync = True
+
+
+broker = ChangeBroker()
+
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_changes(subscription):
+    """
+    Yields server-sent events for a subscription until max_stream_seconds have passed. The client's EventSource then
+    reconnects, which also re-checks its session. A 'ready' event is sent on every connect, once the worker is
+    listening for changes, and a 'resync' event whenever changes may have been missed; both mean the client should
+    refetch.
+    """
+    heartbeat_seconds = config['changes']['heartbeat_seconds']
+    deadline = time.monotonic() + config['changes']['max_stream_seconds']
+    try:
+        yield f"retry: {config['changes']['retry_ms']}\n"
+        # The first streams of a worker start its LISTEN connection. Changes made before it listens aren't received,
+        # so streams that had to wait for it are told to resync.
+        if not broker.wait_listening(0):
+            subscription.resync = True
+            while not broker.wait_listening(min(heartbeat_seconds, max(deadline - time.monotonic(), 0))):
+                if time.monotonic() >= deadline:
+                    return
+                yield ": keepalive\n\n"
+        yield server_sent_event('ready', {'scopes': [{'scope': scope, 'id': scope_id}
+                                                     for scope, scope_id in sorted(subscription.keys)]})
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if subscription.resync:
+                subscription.resync = False
+                yield server_sent_event('resync', {})
+            try:
+                change = subscription.get(timeout=min(heartbeat_seconds, remaining))
+            except queue.Empty:
+                # Comment line; keeps proxies from timing out the connection and detects closed clients
+                yield ": keepalive\n\n"
+                continue
+            yield server_sent_event('change', change)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@changes_bp.route('/test', methods=['GET'])
+def test_ep():
+    return jsonify({"test": "Changes Endpoint Reached."})
+
+
+def get_stream_scopes():
+    """
+    The (scope, id) keys of a stream, from any number of ?project_id= and ?page_id= arguments. Raises ValueError when
+    there are none, more than max_scopes, or one isn't an ID.
+    """
+    keys = set()
+    for scope in ('project', 'page'):
+        for scope_id in request.args.getlist(f"{scope}_id"):
+            try:
+                keys.add((scope, int(scope_id)))
+            except ValueError:
+                raise ValueError(f"Invalid {scope}_id")
+    if not keys:
+        raise ValueError("Missing project_id or page_id")
+    if len(keys) > config['changes']['max_scopes']:
+        raise ValueError("Too Many Projects and Pages")
+    return keys
+
+
+@changes_bp.route('/stream', methods=['GET'])
+def stream_ep():
+    """
+    One stream carries the changes of every project and page a client is showing, so each browser tab holds a single
+    connection: ?project_id=1&page_id=4&page_id=5.
+    """
+    try:
+        keys = get_stream_scopes()
+    except ValueError as e:
+        return make_response({'status': 'error', 'message': str(e)}, STATUS.BAD_REQUEST)
+
+    token = request.cookies.get("token")
+
+    for scope, scope_id in keys:
+        valid, authorized, session = verify_resource_access(token, scope, scope_id)
+
+        if not valid:
+            return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+        if not authorized:
+            return make_response({'status': 'error', 'message': "Not Authorized To Access"}, STATUS.FORBIDDEN)
+
+    subscription = broker.subscribe(keys)
+    response = Response(stream_changes(subscription), mimetype='text/event-stream')
+    # Also covers clients that disconnect before the first event is written
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    # Tells nginx to pass events through as they are written instead of buffering the response
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
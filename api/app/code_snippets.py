@@ -4,135 +4,89 @@ from datetime import datetime
 
 code_snippets_bp = Blueprint('code_snippet', __name__, url_prefix='/code_snippet')
 from .db import get_db_connection
-from .sessions import verify_session_for_access
-from .pages import authorized_page_access
-from .projects import authorized_project_access
+from .authorization import verify_resource_access
+from .audit import log_request
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .projection import get_fields_arg
+from .tables import Table, fetch_row, fetch_rows
 
 code_fields = ['CodeID', 'PageID', 'name', 'description', 'language', 'content', 'timeCreated', 'lastEditTime']
+code_table = Table('CodeSnippets', code_fields, timestamps=['timeCreated', 'lastEditTime'])
 
 
 def log_access(snippet_id, allowed, notes):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO codesnippetsrequests (CodeID, accessGranted, notes)
-        VALUES (%s, %s, %s);
-    """, (snippet_id, allowed, notes))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-
-def convert_time(object):
-    object['timeCreated'] = object['timeCreated'].timestamp()
-    object['lastEditTime'] = object['lastEditTime'].timestamp()
-    return object
+    log_request('codesnippetsrequests', snippet_id, allowed, notes)
 
 
 def get_last_update(snippet_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT lastEditTime FROM CodeSnippets where CodeID = %s;", (snippet_id,))
-    last_update = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {code_table.column('lastEditTime')} FROM CodeSnippets where CodeID = %s;",
+                       (snippet_id,))
+        last_update = cursor.fetchone()
     if last_update is not None:
-        return last_update[0].timestamp()
+        return last_update[0]
     return None
 
 
 def delete_snippet(snippet_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM CodeSnippets where CodeID = %s;", (snippet_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM CodeSnippets where CodeID = %s;", (snippet_id,))
 
 
 def update_snippet(snippet_id, name, description, language, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE CodeSnippets SET name = %s, description = %s, language = %s, content = %s, lastEditTime = %s
-        WHERE CodeID = %s
-        RETURNING *;
-    """, (name, description, language, content, datetime.now(), snippet_id,))
-    snippet = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if snippet is not None:
-        snippet = {k: v for k, v in zip(code_fields, snippet)}
-        snippet = convert_time(snippet)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE CodeSnippets SET name = %s, description = %s, language = %s, content = %s, lastEditTime = %s
+            WHERE CodeID = %s
+            RETURNING {code_table.select()};
+        """, (name, description, language, content, datetime.now(), snippet_id,))
+        snippet = fetch_row(cursor)
     return snippet
 
 
 def get_snippet_by_id(snippet_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM CodeSnippets where CodeID = %s;", (snippet_id,))
-    snippet = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if snippet is not None:
-        snippet = {k: v for k, v in zip(code_fields, snippet)}
-        snippet = convert_time(snippet)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {code_table.select()} FROM CodeSnippets where CodeID = %s;", (snippet_id,))
+        snippet = fetch_row(cursor)
     return snippet
 
 
-def get_snippets_by_page(page_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM CodeSnippets where PageID = %s;", (page_id,))
-    snippets = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if snippets is not None:
-        snippets_list = []
-        for snippet in snippets:
-            snippet = {k: v for k, v in zip(code_fields, snippet)}
-            snippet = convert_time(snippet)
-            snippets_list.append(snippet)
-        return snippets_list
-    return None
+def get_snippets_by_page(page_id, limit=None, after=None, fields=code_fields):
+    condition, order_by = keyset(['CodeSnippets.CodeID'], after)
+    columns = code_table.select(fields)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {columns} FROM CodeSnippets where PageID = %s{condition} {order_by} LIMIT %s;",
+                       (page_id, *(after or []), fetch_limit(limit)))
+        snippets = fetch_rows(cursor)
+    return page_of(snippets, limit, lambda snippet: [snippet['CodeID']])
 
 
-def get_snippets_by_project(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""SELECT CodeSnippets.*, pages.pageID FROM CodeSnippets
-     inner join pages on CodeSnippets.pageID = pages.pageID
-     where pages.projectID = %s;
-     """, (project_id,))
-    snippets = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if snippets is not None:
-        snippets_list = []
-        for snippet in snippets:
-            snippet = {k: v for k, v in zip(code_fields + ['pageID'], snippet)}
-            snippet = convert_time(snippet)
-            snippets_list.append(snippet)
-        return snippets_list
-    return None
+def fetch_snippets_by_project(cursor, project_id, limit=None, after=None, fields=code_fields):
+    condition, order_by = keyset(['CodeSnippets.CodeID'], after)
+    columns = code_table.select(fields)
+    cursor.execute(f"""
+    SELECT {columns}, pages.PageID AS "pageID" FROM CodeSnippets
+    inner join pages on pages.pageID = CodeSnippets.pageID
+    where pages.projectID = %s{condition}
+    {order_by} LIMIT %s;
+    """, (project_id, *(after or []), fetch_limit(limit)))
+    snippets = fetch_rows(cursor)
+    return page_of(snippets, limit, lambda snippet: [snippet['CodeID']])
+
+
+def get_snippets_by_project(project_id, limit=None, after=None, fields=code_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_snippets_by_project(cursor, project_id, limit, after, fields)
 
 
 def create_snippet(page_id, name, description, language, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO codesnippets (PageID, name, description, language, content, lastEditTime)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        RETURNING *;
-    """, (page_id, name, description, language, content, datetime.now()))
-    new_snippet = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if new_snippet is not None:
-        new_snippet = {k: v for k, v in zip(code_fields, new_snippet)}
-        new_snippet = convert_time(new_snippet)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO codesnippets (PageID, name, description, language, content, lastEditTime)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING {code_table.select()};
+        """, (page_id, name, description, language, content, datetime.now()))
+        new_snippet = fetch_row(cursor)
     return new_snippet
 
 
@@ -152,12 +106,12 @@ def create_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     new_snippet = create_snippet(page_id, name, description, language, content)
@@ -177,18 +131,18 @@ def get_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'snippet', snippet_id)
 
     if not valid:
         log_access(snippet_id, valid, "GET")
         return make_response("Invalid Session", STATUS.FORBIDDEN)
 
-    snippet = get_snippet_by_id(snippet_id)
-
-    if not authorized_page_access(token, snippet['PageID']):
+    if not authorized:
         log_access(snippet_id, False, "GET")
         return make_response("Not Authorized To Access Equation", STATUS.FORBIDDEN)
 
+    snippet = get_snippet_by_id(snippet_id)
+
     if snippet is None:
         return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.FORBIDDEN)
 
@@ -203,21 +157,22 @@ def get_all_by_page_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response("Invalid Session", STATUS.FORBIDDEN)
 
-    equations = get_snippets_by_page(page_id)
-
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response("Not Authorized To Access Equation", STATUS.FORBIDDEN)
 
-    if equations is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.FORBIDDEN)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(code_fields)
+        equations, next_page = get_snippets_by_page(page_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    response = make_response({'status': 'success', 'message': equations}, STATUS.OK)
-    return response
+    return page_response(equations, next_page)
 
 
 @code_snippets_bp.route('/get_all_by_project', methods=['GET'])
@@ -226,21 +181,22 @@ def get_all_by_project_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Cannot Access Project"}, STATUS.FORBIDDEN)
 
-    snippets = get_snippets_by_project(project_id)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(code_fields)
+        snippets, next_page = get_snippets_by_project(project_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    if snippets is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.FORBIDDEN)
-
-    response = make_response({'status': 'success', 'message': snippets}, STATUS.OK)
-    return response
+    return page_response(snippets, next_page)
 
 
 @code_snippets_bp.route('/update', methods=['PATCH'])
@@ -254,15 +210,13 @@ def update_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'snippet', snippet_id)
 
     if not valid:
         log_access(snippet_id, False, "UPDATE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    equation = get_snippet_by_id(snippet_id)
-
-    if not authorized_page_access(token, equation['PageID']):
+    if not authorized:
         log_access(snippet_id, False, "UPDATE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
@@ -283,18 +237,18 @@ def delete_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'snippet', snippet_id)
 
     if not valid:
         log_access(snippet_id, False, "DELETE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    snippet = get_snippet_by_id(snippet_id)
-
-    if not authorized_page_access(token, snippet['PageID']):
+    if not authorized:
         log_access(snippet_id, False, "DELETE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    snippet = get_snippet_by_id(snippet_id)
+
     log_access(snippet_id, True, "DELETE")
     delete_snippet(snippet_id)
 
@@ -305,6 +259,17 @@ def delete_ep():
 @code_snippets_bp.route('/last_update', methods=['GET'])
 def last_update():
     snippet_id = int(request.args.get("id"))
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'snippet', snippet_id)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        return make_response({'status': 'error', 'message': "Not Authorized To Access"}, STATUS.FORBIDDEN)
+
     time = get_last_update(snippet_id)
     if time is None:
         return make_response({"snippet_id": snippet_id, "last_update": "Null"}, STATUS.OK)
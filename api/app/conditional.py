@@ -0,0 +1,61 @@
+from flask import request, Response
+from http import HTTPStatus as STATUS
+from datetime import datetime, timezone
+import hashlib
+
+from .db import get_db_connection
+from .tables import fetch_row
+
+# Conditional GETs for resources with a large content column (pages, canvases, translations). The validators are
+# derived from every other column: every write to content also sets lastEditTime, and renames and the like change
+# the other columns, so the metadata alone tells whether the full resource has changed.
+
+
+def metadata_fields(fields):
+    return [field for field in fields if field != 'content']
+
+
+def content_validators(resource, fields):
+    """
+    Returns (etag, last_modified) for a resource as sent to the client, with its times already converted to
+    timestamps.
+    """
+    metadata = "\x1f".join(str(resource[field]) for field in metadata_fields(fields))
+    etag = hashlib.sha256(metadata.encode()).hexdigest()[:32]
+    last_modified = datetime.fromtimestamp(resource['lastEditTime'], timezone.utc)
+    return etag, last_modified
+
+
+def get_content_validators(table, id_column, resource_id):
+    """
+    Reads everything but content for one row of table (a tables.Table) and returns its (etag, last_modified), or None
+    if it doesn't exist.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        columns = table.select(metadata_fields(table.fields))
+        cursor.execute(f"SELECT {columns} FROM {table.name} where {id_column} = %s;", (resource_id,))
+        resource = fetch_row(cursor)
+    if resource is None:
+        return None
+    return content_validators(resource, table.fields)
+
+
+def not_modified(etag, last_modified):
+    # If-Modified-Since only counts when the client sent no If-None-Match, and only to the second
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def set_validators(response, etag, last_modified):
+    # no-cache lets the browser keep the response but makes it revalidate before every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+
+def not_modified_response(etag, last_modified):
+    return set_validators(Response(status=STATUS.NOT_MODIFIED), etag, last_modified)
@@ -1,4 +1,13 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import pool
+
+from .configuration import load_config
 
 DB_CONFIG = {
     "dbname": "mydatabase",
@@ -9,6 +18,167 @@ DB_CONFIG = {
     "port": "5432",
 }
 
+config = load_config()
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """
+    Per-process pool of PostgreSQL connections.
+
+    psycopg2's ThreadedConnectionPool raises as soon as it is exhausted, so checkouts are gated by a semaphore and
+    wait up to checkout_timeout_seconds for a connection to be returned instead. Connections that have been idle for
+    longer than health_check_seconds are pinged before being handed out and replaced if they have gone stale.
+    """
+
+    def __init__(self, min_connections, max_connections, checkout_timeout, health_check_seconds):
+        self.max_connections = max_connections
+        self.checkout_timeout = checkout_timeout
+        self.health_check_seconds = health_check_seconds
+        self._pool = pool.ThreadedConnectionPool(min_connections, max_connections, **DB_CONFIG)
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self.stats = {
+            'in_use': 0,
+            'peak_in_use': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+            'stale_replaced': 0,
+        }
+
+    def getconn(self):
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats['waits'] += 1
+            if not self._slots.acquire(timeout=self.checkout_timeout):
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                raise pool.PoolError("Timed out waiting for a database connection")
+            with self._lock:
+                self.stats['wait_seconds'] += time.monotonic() - start
+
+        try:
+            conn = self._healthy_connection()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.stats['checkouts'] += 1
+            self.stats['in_use'] += 1
+            self.stats['peak_in_use'] = max(self.stats['peak_in_use'], self.stats['in_use'])
+        return conn
+
+    def putconn(self, conn, discard=False):
+        discard = discard or conn.closed
+        with self._lock:
+            self.stats['in_use'] -= 1
+            if discard:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=discard)
+        finally:
+            self._slots.release()
+
+    def _healthy_connection(self):
+        # Once one connection has gone stale (e.g. the database restarted) the rest of the idle ones probably have
+        # too, so every connection handed out after it is pinged, however recently it was used. The pool opens a
+        # new connection once its idle ones are used up, so this ends after at most max_connections replacements.
+        ping_all = False
+        for _ in range(self.max_connections + 1):
+            conn = self._pool.getconn()
+            if not conn.closed and not ping_all and not self._needs_ping(conn):
+                return conn
+            try:
+                if conn.closed:
+                    raise psycopg2.InterfaceError("connection already closed")
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1;")
+                conn.rollback()
+                return conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                with self._lock:
+                    self.stats['stale_replaced'] += 1
+                    self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+                ping_all = True
+        raise psycopg2.OperationalError("Could not open a working database connection")
 
+    def _needs_ping(self, conn):
+        last_used = self._last_used.get(id(conn))
+        return last_used is None or (time.monotonic() - last_used) > self.health_check_seconds
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['max_connections'] = self.max_connections
+        stats['saturation'] = stats['in_use'] / self.max_connections
+        return stats
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns the pool for the current process, creating it on first use. Gunicorn forks its workers, so a pool
+    inherited from the parent process is never reused.
+    """
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                db_config = config['database']
+                _pool = ConnectionPool(db_config['pool_min_connections'], db_config['pool_max_connections'],
+                                       db_config['checkout_timeout_seconds'], db_config['health_check_seconds'])
+                _pool_pid = os.getpid()
+    return _pool
+
+
+@contextmanager
 def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
\ No newline at end of file
+    """
+    Checks a connection out of the pool for the duration of the with block. The transaction is committed when the
+    block exits normally and rolled back if it raises; either way the connection is returned to the pool.
+    """
+    connection_pool = get_pool()
+    conn = connection_pool.getconn()
+    discard = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        raise
+    finally:
+        connection_pool.putconn(conn, discard=discard)
+
+
+def pool_health():
+    """
+    Verifies a connection can be checked out of this process's pool and used. The pool's counters are logged when it
+    can't, rather than returned, since /health is unauthenticated.
+    """
+    try:
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+            cursor.fetchone()
+        return True
+    except (psycopg2.Error, pool.PoolError):
+        logger.warning("Database health check failed, pool: %s", get_pool().snapshot())
+        return False
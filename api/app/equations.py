@@ -4,136 +4,89 @@ from datetime import datetime
 
 equation_bp = Blueprint('equations', __name__, url_prefix='/equations')
 from .db import get_db_connection
-from .sessions import verify_session_for_access
-from .pages import authorized_page_access
-from .projects import authorized_project_access
+from .authorization import verify_resource_access
+from .audit import log_request
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .projection import get_fields_arg
+from .tables import Table, fetch_row, fetch_rows
 
 equations_fields = ['EquationID', 'PageID', 'name', 'description', 'content', 'timeCreated', 'lastEditTime']
+equations_table = Table('equations', equations_fields, timestamps=['timeCreated', 'lastEditTime'])
 
 
 def log_access(equation_id, allowed, notes):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO equationsrequests (EquationID, accessGranted, notes)
-        VALUES (%s, %s, %s);
-    """, (equation_id, allowed, notes))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-
-def convert_time(object):
-    object['timeCreated'] = object['timeCreated'].timestamp()
-    object['lastEditTime'] = object['lastEditTime'].timestamp()
-    return object
+    log_request('equationsrequests', equation_id, allowed, notes)
 
 
 def get_last_update(equation_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT lastEditTime FROM equations where EquationID = %s;", (equation_id,))
-    last_update = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {equations_table.column('lastEditTime')} FROM equations where EquationID = %s;",
+                       (equation_id,))
+        last_update = cursor.fetchone()
     if last_update is not None:
-        return last_update[0].timestamp()
+        return last_update[0]
     return None
 
 
 def delete_equation(equation_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM equations where EquationID = %s;", (equation_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM equations where EquationID = %s;", (equation_id,))
 
 
 def update_equation(equation_id, name, description, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE equations SET name = %s, description = %s, content = %s, lastEditTime = %s
-        WHERE EquationID = %s
-        RETURNING *;
-    """, (name, description, content, datetime.now(), equation_id,))
-    equation = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if equation is not None:
-        equation = {k: v for k, v in zip(equations_fields, equation)}
-        equation = convert_time(equation)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE equations SET name = %s, description = %s, content = %s, lastEditTime = %s
+            WHERE EquationID = %s
+            RETURNING {equations_table.select()};
+        """, (name, description, content, datetime.now(), equation_id,))
+        equation = fetch_row(cursor)
     return equation
 
 
 def get_equation_by_id(equation_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM equations where EquationID = %s;", (equation_id,))
-    equation = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if equation is not None:
-        equation = {k: v for k, v in zip(equations_fields, equation)}
-        equation = convert_time(equation)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {equations_table.select()} FROM equations where EquationID = %s;", (equation_id,))
+        equation = fetch_row(cursor)
     return equation
 
 
-def get_equations_by_page(page_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM equations where PageID = %s;", (page_id,))
-    equations = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if equations is not None:
-        equations_list = []
-        for equation in equations:
-            equation = {k: v for k, v in zip(equations_fields, equation)}
-            equation = convert_time(equation)
-            equations_list.append(equation)
-        return equations_list
-    return None
+def get_equations_by_page(page_id, limit=None, after=None, fields=equations_fields):
+    condition, order_by = keyset(['equations.EquationID'], after)
+    columns = equations_table.select(fields)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {columns} FROM equations where PageID = %s{condition} {order_by} LIMIT %s;",
+                       (page_id, *(after or []), fetch_limit(limit)))
+        equations = fetch_rows(cursor)
+    return page_of(equations, limit, lambda equation: [equation['EquationID']])
 
 
-def get_equations_by_project(project_ID):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    SELECT equations.*, pages.pageID FROM equations 
+def fetch_equations_by_project(cursor, project_ID, limit=None, after=None, fields=equations_fields):
+    condition, order_by = keyset(['equations.EquationID'], after)
+    columns = equations_table.select(fields)
+    cursor.execute(f"""
+    SELECT {columns}, pages.PageID AS "pageID" FROM equations
     inner join pages on pages.pageID = equations.pageID
-    where pages.projectID = %s;
-    """, (project_ID,))
-    equations = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if equations is not None:
-        equations_list = []
-        for equation in equations:
-            equation = {k: v for k, v in zip(equations_fields + ['pageID'], equation)}
-            equation = convert_time(equation)
-            equations_list.append(equation)
-        return equations_list
-    return None
+    where pages.projectID = %s{condition}
+    {order_by} LIMIT %s;
+    """, (project_ID, *(after or []), fetch_limit(limit)))
+    equations = fetch_rows(cursor)
+    return page_of(equations, limit, lambda equation: [equation['EquationID']])
+
+
+def get_equations_by_project(project_ID, limit=None, after=None, fields=equations_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_equations_by_project(cursor, project_ID, limit, after, fields)
 
 
 def create_equation(page_id, name, description, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO equations (PageID, name, description, content, lastEditTime)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING *;
-    """, (page_id, name, description, content, datetime.now()))
-    new_equation = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if new_equation is not None:
-        new_equation = {k: v for k, v in zip(equations_fields, new_equation)}
-        new_equation = convert_time(new_equation)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO equations (PageID, name, description, content, lastEditTime)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING {equations_table.select()};
+        """, (page_id, name, description, content, datetime.now()))
+        new_equation = fetch_row(cursor)
     return new_equation
 
 
@@ -152,12 +105,12 @@ def create_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     new_equation = create_equation(page_id, name, description, content)
@@ -177,18 +130,18 @@ def get_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'equation', equation_id)
 
     if not valid:
         log_access(equation_id, valid, "GET")
         return make_response("Invalid Session", STATUS.FORBIDDEN)
 
-    equation = get_equation_by_id(equation_id)
-
-    if not authorized_page_access(token, equation['PageID']):
+    if not authorized:
         log_access(equation_id, False, "GET")
         return make_response("Not Authorized To Access Equation", STATUS.FORBIDDEN)
 
+    equation = get_equation_by_id(equation_id)
+
     if equation is None:
         return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
 
@@ -203,21 +156,22 @@ def get_all_by_page_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response("Invalid Session", STATUS.FORBIDDEN)
 
-    equations = get_equations_by_page(page_id)
-
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response("Not Authorized To Access Equation", STATUS.FORBIDDEN)
 
-    if equations is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(equations_fields)
+        equations, next_page = get_equations_by_page(page_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    response = make_response({'status': 'success', 'message': equations}, STATUS.OK)
-    return response
+    return page_response(equations, next_page)
 
 
 @equation_bp.route('/get_all_by_project', methods=['GET'])
@@ -226,21 +180,22 @@ def get_all_by_project_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Cannot Access Project"}, STATUS.FORBIDDEN)
 
-    equations = get_equations_by_project(project_id)
-
-    if equations is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(equations_fields)
+        equations, next_page = get_equations_by_project(project_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    response = make_response({'status': 'success', 'message': equations}, STATUS.OK)
-    return response
+    return page_response(equations, next_page)
 
 
 @equation_bp.route('/update', methods=['PATCH'])
@@ -253,15 +208,13 @@ def update_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'equation', equation_id)
 
     if not valid:
         log_access(equation_id, valid, "UPDATE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    equation = get_equation_by_id(equation_id)
-
-    if not authorized_page_access(token, equation['PageID']):
+    if not authorized:
         log_access(equation_id, False, "UPDATE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
@@ -282,18 +235,18 @@ def delete_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'equation', equation_id)
 
     if not valid:
         log_access(equation_id, valid, "DELETE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    equation = get_equation_by_id(equation_id)
-
-    if not authorized_page_access(token, equation['PageID']):
+    if not authorized:
         log_access(equation_id, False, "DELETE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    equation = get_equation_by_id(equation_id)
+
     log_access(equation_id, valid, "DELETE")
     delete_equation(equation_id)
 
@@ -304,6 +257,17 @@ def delete_ep():
 @equation_bp.route('/last_update', methods=['GET'])
 def last_update():
     equation_id = int(request.args.get("id"))
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'equation', equation_id)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        return make_response({'status': 'error', 'message': "Not Authorized To Access"}, STATUS.FORBIDDEN)
+
     time = get_last_update(equation_id)
     if time is None:
         return make_response({"equation_id": equation_id, "last_update": "Null"}, STATUS.OK)
@@ -6,129 +6,90 @@ events_bp = Blueprint('events', __name__, url_prefix='/events')
 
 from .db import get_db_connection
 from .sessions import verify_session_for_access
-from .projects import authorized_project_access
+from .authorization import verify_resource_access
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .projection import get_fields_arg
+from .tables import Table, fetch_row, fetch_rows
 
 event_fields = ['EventID', 'ProjectID', 'name', 'description', 'timeCreated', 'startTime', 'endTime', 'lastUpdate']
-
-
-def convert_time(object):
-    object['timeCreated'] = object['timeCreated'].timestamp()
-    object['startTime'] = object['startTime'].timestamp()
-    object['endTime'] = object['endTime'].timestamp()
-
-    object['lastUpdate'] = object['lastUpdate'].timestamp()
-    return object
+event_table = Table('events', event_fields, timestamps=['timeCreated', 'startTime', 'endTime', 'lastUpdate'])
 
 
 def get_last_update(event_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT lastUpdate FROM events where EventID = %s;", (event_id,))
-    last_update = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {event_table.column('lastUpdate')} FROM events where EventID = %s;", (event_id,))
+        last_update = cursor.fetchone()
     if last_update is not None:
-        return last_update[0].timestamp()
+        return last_update[0]
     return None
 
 
 def create_event(projectID, name, description, start_time, end_time):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO events (ProjectID, name, description, startTime, endTime)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING *;
-    """, (projectID, name, description, start_time, end_time))
-    new_event = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if new_event is not None:
-        new_event = {k: v for k, v in zip(event_fields, new_event)}
-        new_event = convert_time(new_event)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO events (ProjectID, name, description, startTime, endTime)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING {event_table.select()};
+        """, (projectID, name, description, start_time, end_time))
+        new_event = fetch_row(cursor)
     return new_event
 
 
 def update_event(event_id, name, description, start_time, end_time):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE events SET name = %s, description = %s, startTime = %s, endTime = %s, lastUpdate = %s
-        WHERE eventID = %s
-        RETURNING *;
-    """, (name, description, start_time, end_time, datetime.now(), event_id))
-    updated_event = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if updated_event is not None:
-        updated_event = {k: v for k, v in zip(event_fields, updated_event)}
-        updated_event = convert_time(updated_event)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE events SET name = %s, description = %s, startTime = %s, endTime = %s, lastUpdate = %s
+            WHERE eventID = %s
+            RETURNING {event_table.select()};
+        """, (name, description, start_time, end_time, datetime.now(), event_id))
+        updated_event = fetch_row(cursor)
     return updated_event
 
 
 def delete_event(event_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM events where EventID = %s;", (event_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM events where EventID = %s;", (event_id,))
 
 
 def get_event_by_id(event_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM events where EventID = %s", (event_id,))
-    event = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if event is not None:
-        event = {k: v for k, v in zip(event_fields, event)}
-        event = convert_time(event)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {event_table.select()} FROM events where EventID = %s", (event_id,))
+        event = fetch_row(cursor)
     return event
 
 
-def get_all_events(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM events where projectID = %s", (project_id,))
-    events = cursor.fetchall()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if events is not None:
-        event_list = []
-        for event in events:
-            event = {k: v for k, v in zip(event_fields, event)}
-            event = convert_time(event)
-            event_list.append(event)
-        return event_list
-    return None
+def all_events_query(project_id, limit=None, after=None, fields=event_fields):
+    condition, order_by = keyset(['events.EventID'], after)
+    columns = event_table.select(fields)
+    return (f"SELECT {columns} FROM events where projectID = %s{condition} {order_by} LIMIT %s;",
+            (project_id, *(after or []), fetch_limit(limit)))
 
 
-def get_all_events_by_user(user_id, start_time, end_time):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    SELECT events.* FROM events
-    inner join projects on
-    projects.projectID = events.projectID
-    where projects.UserID = %s
-    AND startTime BETWEEN %s AND %s 
-    """, (user_id, start_time, end_time))
-    events = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if events is not None:
-        event_list = []
-        for event in events:
-            event = {k: v for k, v in zip(event_fields, event)}
-            event = convert_time(event)
-            event_list.append(event)
-        return event_list
-    return None
+def fetch_all_events(cursor, project_id, limit=None, after=None, fields=event_fields):
+    cursor.execute(*all_events_query(project_id, limit, after, fields))
+    events = fetch_rows(cursor)
+    return page_of(events, limit, lambda event: [event['EventID']])
+
+
+def get_all_events(project_id, limit=None, after=None, fields=event_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_all_events(cursor, project_id, limit, after, fields)
+
+
+def get_all_events_by_user(user_id, start_time, end_time, limit=None, after=None, fields=event_fields):
+    condition, order_by = keyset(['events.EventID'], after)
+    columns = event_table.select(fields)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+        SELECT {columns} FROM events
+        inner join projects on
+        projects.projectID = events.projectID
+        where projects.UserID = %s
+        AND startTime BETWEEN %s AND %s{condition}
+        {order_by} LIMIT %s;
+        """, (user_id, start_time, end_time, *(after or []), fetch_limit(limit)))
+        events = fetch_rows(cursor)
+    return page_of(events, limit, lambda event: [event['EventID']])
 
 
 @events_bp.route('/test', methods=['GET'])
@@ -150,12 +111,12 @@ def create_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     new_event = create_event(project_id, event_name, event_description, start_time, end_time)
@@ -171,16 +132,16 @@ def get_ep():
     event_id = int(request.args.get("id"))
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'event', event_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    event = get_event_by_id(event_id)
-
-    if not authorized_project_access(token, event['ProjectID']):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    event = get_event_by_id(event_id)
+
     if event is None:
         return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.FORBIDDEN)
 
@@ -194,21 +155,22 @@ def get_all_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response("Not Authorized To Access", STATUS.FORBIDDEN)
 
-    event_list = get_all_events(project_id)
-
-    if event_list is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.FORBIDDEN)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(event_fields)
+        event_list, next_page = get_all_events(project_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    response = make_response({'status': 'success', 'message': event_list}, STATUS.OK)
-    return response
+    return page_response(event_list, next_page)
 
 
 @events_bp.route('/get_user_events', methods=['GET'])
@@ -225,13 +187,14 @@ def get_all_user_events_ep():
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    event_list = get_all_events_by_user(session['UserID'], start_time, end_time)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(event_fields)
+        event_list, next_page = get_all_events_by_user(session['UserID'], start_time, end_time, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    if event_list is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.FORBIDDEN)
-
-    response = make_response({'status': 'success', 'message': event_list}, STATUS.OK)
-    return response
+    return page_response(event_list, next_page)
 
 
 @events_bp.route('/update', methods=['PATCH'])
@@ -248,14 +211,12 @@ def update_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'event', event_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    todo = get_event_by_id(event_id)
-
-    if not authorized_project_access(token, todo['ProjectID']):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     updated_event = update_event(event_id, event_name, event_description, start_time, end_time)
@@ -274,16 +235,16 @@ def delete_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'event', event_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    event = get_event_by_id(event_id)
-
-    if not authorized_project_access(token, event['ProjectID']):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    event = get_event_by_id(event_id)
+
     delete_event(event_id)
 
     response = make_response({'status': 'success', 'message': f'Deleted {event["name"]}'}, STATUS.OK)
@@ -293,6 +254,17 @@ def delete_ep():
 @events_bp.route('/last_update', methods=['GET'])
 def last_update():
     event_id = int(request.args.get("id"))
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'event', event_id)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        return make_response({'status': 'error', 'message': "Not Authorized To Access"}, STATUS.FORBIDDEN)
+
     time = get_last_update(event_id)
     if time is None:
         return make_response({"event_id": event_id, "last_update": "Null"}, STATUS.OK)
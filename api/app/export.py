@@ -0,0 +1,259 @@
+import json
+import re
+import time
+import zipfile
+from itertools import groupby
+
+from flask import Blueprint, jsonify, request, make_response, Response, current_app, stream_with_context
+from http import HTTPStatus as STATUS
+
+export_bp = Blueprint('export', __name__, url_prefix='/export')
+from .configuration import load_config
+from .db import get_db_connection
+from .sessions import verify_session_for_access
+from .authorization import verify_resource_access
+from .logging import create_access_request
+from .tables import Table
+from .tags import tag_table
+from .todo import todo_table
+from .events import event_table
+from .pages import page_table
+from .equations import equations_table
+from .recipes import recipe_table
+from .code_snippets import code_table
+from .translations import translation_table
+from .canvas import canvas_table
+from .files import file_table, files_fields
+
+config = load_config()
+
+# An export is a zip of one NDJSON file per table, each line a row as the API sends it, and blobs/<hash> for the
+# content of every file and image, stored once however many rows share it. manifest.json, written last, gives the row
+# counts. Everything is read from server-side cursors in one read only snapshot and the archive is written to the
+# response as it is built, so neither the rows nor the blobs are held in memory or on disk.
+
+archive_format = 1
+
+project_table = Table('projects', ['ProjectID', 'UserID', 'name', 'description', 'timeCreated', 'lastUpdate'],
+                      timestamps=['timeCreated', 'lastUpdate'])
+tag_mapping_table = Table('tagmappings', ['MappingID', 'ProjectID', 'TagID'])
+image_table = Table('images', ['ImageID', 'UserID', 'timeCreated'], timestamps=['timeCreated'])
+# The blob is identified by its hash
+file_export_table = Table('files', [field for field in files_fields if field != 'BlobID'],
+                          timestamps=file_table.timestamps, renamed=file_table.renamed)
+
+# Rows are limited to the user's projects, or to one of them when project_id is given
+project_scope = """projects.UserID = %(user_id)s
+        AND (%(project_id)s::integer IS NULL OR projects.ProjectID = %(project_id)s)"""
+
+
+def project_child(table):
+    return f"""FROM {table.name} inner join projects on projects.ProjectID = {table.name}.ProjectID
+        WHERE {project_scope}"""
+
+
+def page_child(table):
+    return f"""FROM {table.name} inner join pages on pages.PageID = {table.name}.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE {project_scope}"""
+
+
+# Each section is (name, table, FROM and WHERE), in an order that has parents before their children
+export_sections = [
+    ('projects', project_table, f"FROM projects WHERE {project_scope}"),
+    ('tags', tag_table, """FROM tags WHERE tags.UserID = %(user_id)s AND (%(project_id)s::integer IS NULL
+        OR tags.TagID IN (SELECT TagID FROM tagmappings WHERE ProjectID = %(project_id)s))"""),
+    ('tagmappings', tag_mapping_table, project_child(tag_mapping_table)),
+    ('todo', todo_table, project_child(todo_table)),
+    ('events', event_table, project_child(event_table)),
+    ('pages', page_table, project_child(page_table)),
+    ('equations', equations_table, page_child(equations_table)),
+    ('recipes', recipe_table, page_child(recipe_table)),
+    ('codesnippets', code_table, page_child(code_table)),
+    ('translations', translation_table, page_child(translation_table)),
+    ('canvas', canvas_table, page_child(canvas_table)),
+    ('files', file_export_table, page_child(file_export_table)),
+]
+
+# Images belong to the user rather than a project. A project export carries the ones its pages, recipes,
+# translations and canvases show, which is how transfer_v3_v3.py finds them.
+image_link = re.compile(r'/api/images/image\?id=(\d+)')
+
+
+def referenced_images(section, row):
+    if section in ('pages', 'recipes', 'translations'):
+        return [int(image_id) for image_id in image_link.findall(row['content'] or '')]
+    if section == 'canvas':
+        try:
+            return [int(image['id']) for image in json.loads(row['content'] or '{}').get('images', [])]
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return []
+    return []
+
+
+def image_query(project_id):
+    query = f"""
+        SELECT {image_table.select()}, blobs.hash AS "hash" FROM images
+        inner join blobs on blobs.BlobID = images.BlobID
+        WHERE images.UserID = %(user_id)s"""
+    if project_id is not None:
+        query += " AND images.ImageID = ANY(%(images)s)"
+    return query + " ORDER BY images.ImageID;"
+
+
+def blob_entry(blob_hash, size):
+    entry = zipfile.ZipInfo(f"blobs/{blob_hash}", date_time=time.gmtime()[:6])
+    # Set up front so zipfile knows whether the entry needs zip64
+    entry.file_size = size
+    # Files and images are mostly compressed already
+    entry.compress_type = zipfile.ZIP_STORED
+    return entry
+
+
+class ArchiveSink:
+    """
+    Write-only stream for zipfile, collecting what is written until it is drained into the response. zipfile sees
+    that it cannot seek and writes each entry's sizes after its data.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+
+def stream_rows(conn, query, params):
+    # Rows of query as dicts, read fetch_size at a time from a server-side cursor
+    with conn.cursor(name="export") as cursor:
+        cursor.itersize = config['streaming']['fetch_size']
+        cursor.execute(query, params)
+        names = None
+        for row in cursor:
+            if names is None:
+                names = [column.name for column in cursor.description]
+            yield dict(zip(names, row))
+
+
+def export_archive(user_id, project_id=None):
+    """
+    Generator of the bytes of a zip of the user's data, or of one of their projects'.
+    """
+    json_provider = current_app.json
+    chunk_bytes = config['streaming']['chunk_bytes']
+    params = {'user_id': user_id, 'project_id': project_id}
+    sink = ArchiveSink()
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # Every section is read from the same snapshot, so children always have their parents
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+            cursor.execute("SELECT name, preferences FROM users WHERE UserID = %s;", (user_id,))
+            user = dict(zip(['name', 'preferences'], cursor.fetchone()))
+
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            counts = {}
+            images = set()
+            blob_hashes = set()
+
+            for section, table, source in export_sections:
+                query = f"SELECT {table.select()} {source} ORDER BY {table.name}.{table.fields[0]};"
+                counts[section] = 0
+                with archive.open(f"{section}.ndjson", 'w', force_zip64=True) as out:
+                    for row in stream_rows(conn, query, params):
+                        out.write(json_provider.dump_bytes(row) + b'\n')
+                        counts[section] += 1
+                        if section == 'files':
+                            blob_hashes.add(row['hash'])
+                        elif project_id is not None:
+                            images.update(referenced_images(section, row))
+                        if sink.size >= chunk_bytes:
+                            yield sink.drain()
+
+            counts['images'] = 0
+            with archive.open("images.ndjson", 'w', force_zip64=True) as out:
+                for row in stream_rows(conn, image_query(project_id), {**params, 'images': sorted(images)}):
+                    out.write(json_provider.dump_bytes(row) + b'\n')
+                    counts['images'] += 1
+                    blob_hashes.add(row['hash'])
+                    if sink.size >= chunk_bytes:
+                        yield sink.drain()
+
+            # One query for every blob's chunks, in order. A blob without chunks is empty.
+            blob_chunks = """
+                SELECT blobs.hash AS "hash", blobs.size AS "size", blobChunks.data AS "data" FROM blobs
+                left join blobChunks on blobChunks.BlobID = blobs.BlobID
+                WHERE blobs.hash = ANY(%(hashes)s)
+                ORDER BY blobs.BlobID, blobChunks.seq;
+            """
+            chunks = stream_rows(conn, blob_chunks, {'hashes': sorted(blob_hashes)})
+            for (blob_hash, size), blob in groupby(chunks, key=lambda chunk: (chunk['hash'], chunk['size'])):
+                with archive.open(blob_entry(blob_hash, size), 'w') as out:
+                    for chunk in blob:
+                        if chunk['data'] is not None:
+                            out.write(chunk['data'])
+                        if sink.size >= chunk_bytes:
+                            yield sink.drain()
+
+            manifest = {
+                'format': archive_format,
+                'scope': 'user' if project_id is None else 'project',
+                'UserID': user_id,
+                'ProjectID': project_id,
+                'user': user,
+                'exported': time.time(),
+                'counts': counts,
+                'blobs': len(blob_hashes),
+            }
+            archive.writestr("manifest.json", json_provider.dumps(manifest))
+
+    yield sink.drain()
+
+
+@export_bp.route('/test', methods=['GET'])
+def test_ep():
+    return jsonify({"test": "Export Endpoint Reached."})
+
+
+@export_bp.route('', methods=['GET'])
+def export_ep():
+    """
+    The session user's projects, tags and images as a zip, or with ?project_id= only that project's.
+    """
+    project_id = request.args.get("project_id")
+    token = request.cookies.get("token")
+
+    if project_id is None:
+        valid, session = verify_session_for_access(token)
+        if not valid:
+            return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+        filename = "export.zip"
+    else:
+        project_id = int(project_id)
+        valid, authorized, session = verify_resource_access(token, 'project', project_id)
+
+        if not valid:
+            return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+        if not authorized:
+            create_access_request(session['SessionID'], project_id, False, "EXPORT")
+            return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
+
+        create_access_request(session['SessionID'], project_id, valid, "EXPORT")
+        filename = f"project-{project_id}.zip"
+
+    response = Response(stream_with_context(export_archive(session['UserID'], project_id)), status=STATUS.OK,
+                        mimetype='application/zip', direct_passthrough=True)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -1,99 +1,120 @@
-from flask import Blueprint, jsonify, request, make_response, send_file
+from flask import Blueprint, jsonify, request, make_response, Response
 from http import HTTPStatus as STATUS
-from io import BytesIO
-import hashlib
+import unicodedata
+from urllib.parse import quote
 
 files_bp = Blueprint('files', __name__, url_prefix='/files')
+from .configuration import load_config
 from .db import get_db_connection
-from .sessions import verify_session_for_access
-from .pages import authorized_page_access
-from .projects import authorized_project_access
-files_fields = ['FileID', 'PageID', 'name', 'hash', 'filename', 'description', 'upload_date', 'content']
-
-
-def create_file(page_id, name, filename, description, content):
-    hash_object = hashlib.sha512(content)
-    file_hash = hash_object.hexdigest()
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO files (PageID, name, hash, filename, description, content)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        RETURNING FileID;
-    """, (page_id, name, file_hash, filename, description, content))
-    file_id = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
+from .authorization import verify_resource_access
+from .blobs import store_blob, stream_blob
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .pagination import streaming_requested, next_cursor
+from .streaming import stream_page
+from .projection import get_fields_arg
+from .tables import Table, fetch_row, fetch_rows
+
+config = load_config()
+files_fields = ['FileID', 'PageID', 'name', 'hash', 'filename', 'description', 'upload_date', 'BlobID']
+file_metadata_fields = files_fields[:-1]
+file_table = Table('files', files_fields, timestamps=['upload_date'], renamed={'upload_date': 'timeCreated'})
+
+
+def create_file(page_id, name, filename, description, stream):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        blob_id, file_hash = store_blob(cursor, stream)
+        cursor.execute("""
+            INSERT INTO files (PageID, name, hash, filename, description, BlobID)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING FileID;
+        """, (page_id, name, file_hash, filename, description, blob_id))
+        file_id = cursor.fetchone()
     if file_id is not None:
         file_id = file_id[0]
     return file_id
 
 
-def convert_time(object):
-    object['upload_date'] = object['upload_date'].timestamp()
-    return object
-
-
 def get_file_by_id(file_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM files where fileID = %s;", (file_id,))
-    file = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if file is not None:
-        file = {k: v for k, v in zip(files_fields, file)}
-        file = convert_time(file)
+    """
+    Returns the file's metadata along with its blob, the blob's chunk size and its size in bytes.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT {file_table.select()}, blobs.chunkSize AS "chunkSize", blobs.size FROM files
+            inner join blobs on blobs.BlobID = files.BlobID
+            where fileID = %s;
+        """, (file_id,))
+        file = fetch_row(cursor)
     return file
 
 
-def get_files_by_page(page_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM files where PageID = %s;", (page_id,))
-    files = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if files is not None:
-        file_list = []
-        for file in files:
-            file = {k: v for k, v in zip(files_fields, file) if k != "content"}
-            file = convert_time(file)
-            file_list.append(file)
-        return file_list
-    return None
-
-
-def get_files_by_project(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""SELECT files.* FROM files
+def page_files_query(page_id, limit=None, after=None, fields=file_metadata_fields):
+    condition, order_by = keyset(['files.FileID'], after)
+    columns = file_table.select(fields)
+    return (f"SELECT {columns} FROM files where PageID = %s{condition} {order_by} LIMIT %s;",
+            (page_id, *(after or []), fetch_limit(limit)))
+
+
+def get_files_by_page(page_id, limit=None, after=None, fields=file_metadata_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(*page_files_query(page_id, limit, after, fields))
+        files = fetch_rows(cursor)
+    return page_of(files, limit, file_key)
+
+
+def file_key(file):
+    return [file['FileID']]
+
+
+def project_files_query(project_id, limit=None, after=None, fields=file_metadata_fields):
+    condition, order_by = keyset(['files.FileID'], after)
+    columns = file_table.select(fields)
+    return (f"""SELECT {columns} FROM files
     inner join pages
     on pages.pageID =  files.pageID
-    where pages.projectID = %s;
-    """, (project_id,))
-    files = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if files is not None:
-        file_list = []
-        for file in files:
-            file = {k: v for k, v in zip(files_fields, file) if k != "content"}
-            file = convert_time(file)
-            file_list.append(file)
-        return file_list
-    return None
+    where pages.projectID = %s{condition}
+    {order_by} LIMIT %s;
+    """, (project_id, *(after or []), fetch_limit(limit)))
+
+
+def fetch_files_by_project(cursor, project_id, limit=None, after=None, fields=file_metadata_fields):
+    cursor.execute(*project_files_query(project_id, limit, after, fields))
+    files = fetch_rows(cursor)
+    return page_of(files, limit, file_key)
+
+
+def get_files_by_project(project_id, limit=None, after=None, fields=file_metadata_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_files_by_project(cursor, project_id, limit, after, fields)
 
 
 def delete_file(file_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM files where fileID = %s;", (file_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM files where fileID = %s;", (file_id,))
+
+
+def requested_range(etag):
+    """
+    Returns the Range of the request if it should be honoured. Only single ranges are served, and only while the
+    client's copy named by If-Range is still current.
+    """
+    if request.range is None or len(request.range.ranges) != 1:
+        return None
+    if request.if_range.date is not None:
+        return None
+    if request.if_range.etag is not None and request.if_range.etag != etag:
+        return None
+    return request.range
+
+
+def download_name(filename):
+    # Same encoding as flask.send_file: an ASCII fallback plus the RFC 5987 UTF-8 name
+    try:
+        filename.encode("ascii")
+        return {'filename': filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"}
 
 
 @files_bp.route('/test', methods=['GET'])
@@ -109,19 +130,19 @@ def upload_file_ep():
     description = request.form.get("description")
 
     filename = file.filename
-    content = file.read()
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response("Session is Invalid", STATUS.FORBIDDEN)
 
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response("Not Authorized To Access Project", STATUS.FORBIDDEN)
 
-    new_file = create_file(page_id, name, filename, description, content)
+    # The form parser has already spooled the upload to a temporary file, which is copied over chunk by chunk
+    new_file = create_file(page_id, name, filename, description, file.stream)
 
     response = make_response({'status': 'success', 'message':f"Uploaded: {name}", 'id': new_file}, STATUS.OK)
     return response
@@ -133,26 +154,48 @@ def get_file_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'file', file_id)
 
     if not valid:
         return make_response("Invalid Session", STATUS.FORBIDDEN)
 
-    file = get_file_by_id(file_id)
-
-    if not authorized_page_access(token, file['PageID']):
+    if not authorized:
         return make_response("Not Authorized To Access Equation", STATUS.FORBIDDEN)
 
+    file = get_file_by_id(file_id)
+
     if file is None:
         response = make_response("Does Not Exist", STATUS.OK)
         return response
 
-    return send_file(
-        BytesIO(file['content']),
-        mimetype="application/octet-stream",
-        as_attachment=True,
-        download_name=file['filename']
-    )
+    etag = file['hash']
+    if request.if_none_match.contains(etag):
+        response = Response(status=STATUS.NOT_MODIFIED)
+        response.set_etag(etag)
+        return response
+
+    size = file['size'] or 0
+    start, stop, status = 0, size, STATUS.OK
+    requested = requested_range(etag)
+    if requested is not None:
+        byte_range = requested.range_for_length(size)
+        if byte_range is None:
+            response = Response(status=STATUS.REQUESTED_RANGE_NOT_SATISFIABLE)
+            response.headers['Content-Range'] = f"bytes */{size}"
+            return response
+        start, stop = byte_range
+        status = STATUS.PARTIAL_CONTENT
+
+    response = Response(stream_blob(file['BlobID'], file['chunkSize'], start, stop), status=status, mimetype="application/octet-stream",
+                        direct_passthrough=True)
+    response.content_length = stop - start
+    if status == STATUS.PARTIAL_CONTENT:
+        response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers.set('Content-Disposition', 'attachment', **download_name(file['filename']))
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.set_etag(etag)
+    return response
 
 
 @files_bp.route('/files_by_page', methods=['get'])
@@ -161,21 +204,22 @@ def get_files_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response("Invalid Session", STATUS.FORBIDDEN)
 
-    files = get_files_by_page(page_id)
-
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response("Not Authorized To Access", STATUS.FORBIDDEN)
 
-    if files is None:
-        response = make_response("Does Not Exist", STATUS.OK)
-        return response
-    response = make_response(files, STATUS.OK)
-    return response
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(file_metadata_fields)
+        files, next_page = get_files_by_page(page_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
+
+    return page_response(files, next_page)
 
 
 @files_bp.route('/files_by_project', methods=['get'])
@@ -184,21 +228,24 @@ def get_files_by_project_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Cannot Access Project"}, STATUS.FORBIDDEN)
 
-    files = get_files_by_project(project_id)
+    try:
+        limit, after = get_page_args(streamable=True)
+        fields = get_fields_arg(file_metadata_fields)
+        if streaming_requested():
+            return stream_page(*project_files_query(project_id, limit, after, fields), limit, next_cursor(file_key))
+        files, next_page = get_files_by_project(project_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    if files is None:
-        response = make_response("Does Not Exist", STATUS.OK)
-        return response
-    response = make_response(files, STATUS.OK)
-    return response
+    return page_response(files, next_page)
 
 
 @files_bp.route('/file', methods=['DELETE'])
@@ -208,16 +255,16 @@ def delete_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'file', file_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    file = get_file_by_id(file_id)
-
-    if not authorized_page_access(token, file['PageID']):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    file = get_file_by_id(file_id)
+
     delete_file(file_id)
 
     response = make_response({'status': 'success', 'message': f'Deleted {file["name"]}'}, STATUS.OK)
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+from .configuration import load_config
+from .db import get_db_connection
+from .pagination import page_of
+
+config = load_config()
+
+history_fields = ['ActivityID', 'name', 'event', 'type', 'time']
+history_types = ['project', 'page', 'code', 'translation', 'equation', 'recipe', 'canvas', 'file']
+history_owners = {'user': 'UserID', 'project': 'ProjectID'}
+
+
+def ensure_activity_partitions():
+    """
+    Creates the activityLog partitions for the current month and the configured number of months ahead.
+    """
+    now = datetime.now()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT ensure_activity_partitions(%s, %s);",
+                       (now, now + timedelta(days=31 * config['history']['partition_months_ahead'])))
+
+
+def history_query(owner, owner_id, start_time, end_time, types=None, after=None, limit=None):
+    """
+    The query reading activityLog for a user or project between start_time and end_time, oldest first, and its
+    parameters. Its rows are (ActivityID, name, event, type, time), and hold one row past limit if there is one.
+
+    types restricts the result to some of history_types. after is the (time, ActivityID) of the last event of the
+    previous page and limit the page size.
+    """
+    conditions = [f"{history_owners[owner]} = %s", "accessTime BETWEEN %s AND %s"]
+    params = [owner_id, start_time, end_time]
+    if types is not None:
+        conditions.append("type = ANY(%s)")
+        params.append(list(types))
+    if after is not None:
+        conditions.append("(accessTime, ActivityID) > (%s, %s)")
+        params.extend(after)
+    query = f"""
+        SELECT ActivityID AS "ActivityID", name, event, type, accessTime AS time FROM activityLog
+        where {' AND '.join(conditions)}
+        order by accessTime, ActivityID
+    """
+    if limit is not None:
+        query += " limit %s"
+        # One extra row tells whether there is another page
+        params.append(limit + 1)
+    return query, params
+
+
+def history_item(log):
+    # An activityLog row as sent to clients. accessTime holds UTC, as extract(epoch from ...) reads it elsewhere.
+    return {'name': log['name'], 'event': log['event'], 'type': log['type'],
+            'time': log['time'].replace(tzinfo=timezone.utc).timestamp()}
+
+
+def history_next(log):
+    # Where the page after log continues
+    return (log['time'], log['ActivityID'])
+
+
+def get_history(owner, owner_id, start_time, end_time, types=None, after=None, limit=None):
+    """
+    Reads the history_query of a user or project. Rows are streamed from a server-side cursor in batches of
+    fetch_size.
+
+    Returns (logs, next), where next is the cursor of the following page, or None when there are no more events.
+    """
+    query, params = history_query(owner, owner_id, start_time, end_time, types, after, limit)
+
+    logs = []
+    with get_db_connection() as conn, conn.cursor(name='history') as cursor:
+        cursor.itersize = config['history']['fetch_size']
+        cursor.execute(query, params)
+        for row in cursor:
+            logs.append({k: v for k, v in zip(history_fields, row)})
+
+    logs, next_page = page_of(logs, limit, history_next)
+    return [history_item(log) for log in logs], next_page
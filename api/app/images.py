@@ -1,49 +1,45 @@
-from flask import Blueprint, jsonify, request, make_response, send_file
+from flask import Blueprint, jsonify, request, make_response, Response
 from http import HTTPStatus as STATUS
-from io import BytesIO
-import hashlib
 
 images_bp = Blueprint('images', __name__, url_prefix='/images')
 from .db import get_db_connection
 from .sessions import verify_session_for_access
+from .blobs import store_blob, stream_blob
 
-image_fields = ['ImageID', 'UserID', 'Content', 'TimeCreated']
-
-
-def create_image(user_id, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO images (UserID, content)
-        VALUES (%s, %s)
-        RETURNING ImageID;
-    """, (user_id, content))
-    image_id = cursor.fetchone()[0]
-    conn.commit()
-    cursor.close()
-    conn.close()
+image_fields = ['ImageID', 'UserID', 'TimeCreated', 'BlobID']
+
+
+def create_image(user_id, stream):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        blob_id, image_hash = store_blob(cursor, stream)
+        cursor.execute("""
+            INSERT INTO images (UserID, BlobID)
+            VALUES (%s, %s)
+            RETURNING ImageID;
+        """, (user_id, blob_id))
+        image_id = cursor.fetchone()[0]
     return image_id
 
 
 def get_image(user_id, image_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT content FROM images WHERE UserID = %s AND ImageID = %s;",
-        (user_id, image_id))
-    image_bytes = cursor.fetchone()[0]
-    cursor.close()
-    conn.close()
-    return image_bytes
-
-
-def delete_image(image_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM images images ImageID = %s;", (image_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    """
+    Returns the image's blob, its hash, chunk size and size in bytes, or None if the user has no such image.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT blobs.BlobID, blobs.hash, blobs.chunkSize, blobs.size FROM images
+            inner join blobs on blobs.BlobID = images.BlobID
+            WHERE images.UserID = %s AND images.ImageID = %s;
+        """, (user_id, image_id))
+        image = cursor.fetchone()
+    if image is not None:
+        image = {k: v for k, v in zip(['BlobID', 'hash', 'chunkSize', 'size'], image)}
+    return image
+
+
+def delete_image(user_id, image_id):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM images WHERE UserID = %s AND ImageID = %s;", (user_id, image_id))
 
 
 @images_bp.route('/test', methods=['GET'])
@@ -54,7 +50,6 @@ def test_ep():
 @images_bp.route('/image', methods=['post'])
 def upload_file_ep():
     file = request.files.get("file")
-    content = file.read()
 
     token = request.cookies.get("token")
 
@@ -63,7 +58,7 @@ def upload_file_ep():
     if not valid:
         return make_response("Session is Invalid", STATUS.FORBIDDEN)
 
-    image_id = create_image(session['UserID'], content)
+    image_id = create_image(session['UserID'], file.stream)
 
     response = make_response({"id": image_id}, STATUS.OK)
 
@@ -81,13 +76,22 @@ def get_file_ep():
     if not valid:
         return make_response("Invalid Session", STATUS.FORBIDDEN)
 
-    image_content = get_image(session['UserID'], image_id)
+    image = get_image(session['UserID'], image_id)
 
-    if image_content is None:
+    if image is None:
         response = make_response("Does Not Exist", STATUS.OK)
         return response
 
-    return send_file(BytesIO(image_content), mimetype='image/png')
+    # An image's content never changes, so its hash is a strong validator
+    if request.if_none_match.contains(image['hash']):
+        response = Response(status=STATUS.NOT_MODIFIED)
+    else:
+        response = Response(stream_blob(image['BlobID'], image['chunkSize'], 0, image['size']), mimetype='image/png',
+                            direct_passthrough=True)
+        response.content_length = image['size']
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.set_etag(image['hash'])
+    return response
 
 
 @images_bp.route('/image', methods=['delete'])
@@ -101,11 +105,13 @@ def delete_file_ep():
     if not valid:
         return make_response("Invalid Session", STATUS.FORBIDDEN)
 
-    image_content = get_image(session['UserID'], image_id)
+    image = get_image(session['UserID'], image_id)
 
-    if image_content is None:
+    if image is None:
         response = make_response("Does Not Exist", STATUS.OK)
         return response
 
+    delete_image(session['UserID'], image_id)
+
     response = make_response({"status": "success"}, STATUS.OK)
     return response
@@ -0,0 +1,428 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, jsonify, request, make_response
+from http import HTTPStatus as STATUS
+from psycopg2.extras import Json
+
+imports_bp = Blueprint('imports', __name__, url_prefix='/import')
+from .configuration import load_config
+from .db import get_db_connection
+from .sessions import verify_session_for_access
+from .blobs import store_blob
+from .tables import Table, fetch_row
+from .export import archive_format, export_sections
+
+config = load_config()
+logger = logging.getLogger(__name__)
+
+# Imports an archive written by /export as new projects of the session user, in one transaction. Each NDJSON file is
+# COPYed into a jsonb staging table, new IDs are drawn from the sequences for every projects, pages, images and tags
+# row at once, and each table is then filled by a single INSERT ... SELECT joining its rows to their parents' new IDs.
+# Image links in page, recipe and translation content and the image IDs in canvases are rewritten by the same
+# statements.
+# Jobs run on a small per-worker thread pool; their progress is written to importJobs as they go.
+
+import_job_fields = ['JobID', 'state', 'stage', 'processed', 'total', 'message', 'result', 'timeCreated', 'lastUpdate']
+import_job_table = Table('importJobs', import_job_fields, timestamps=['timeCreated', 'lastUpdate'])
+
+staged_sections = [section for section, _, _ in export_sections] + ['images']
+
+
+def text(field):
+    return f"data->>'{field}'"
+
+
+def typed(field, cast):
+    return f"(data->>'{field}')::{cast}"
+
+
+def timestamp(field):
+    # Exported as seconds since the epoch of the column read as UTC
+    return f"to_timestamp((data->>'{field}')::float8) AT TIME ZONE 'UTC'"
+
+
+blob_join = "inner join import_blobs on import_blobs.hash = data->>'hash'"
+
+# For each section, in insert order: the table, the ID column given a new value (None to let the table number the
+# rows), the columns holding a parent's ID and the parent's section, the other columns with the expression each is
+# read from, and any join those need. Rows whose parent is not in the archive are skipped.
+import_sections = [
+    ('projects', 'projects', 'ProjectID', {}, {
+        'UserID': "%(user_id)s", 'name': text('name'), 'description': text('description'),
+        'timeCreated': timestamp('timeCreated'), 'lastUpdate': timestamp('lastUpdate')}, ""),
+    ('tags', 'tags', 'TagID', {}, {'UserID': "%(user_id)s", 'tag': text('tag'), 'options': text('options')}, ""),
+    ('tagmappings', 'tagmappings', None, {'ProjectID': 'projects', 'TagID': 'tags'}, {}, ""),
+    ('todo', 'todo', None, {'ProjectID': 'projects'}, {
+        'name': text('name'), 'description': text('description'), 'timeCreated': timestamp('timeCreated'),
+        'dueTime': timestamp('dueTime'), 'completed': typed('completed', 'boolean'),
+        'timeCompleted': timestamp('timeCompleted'), 'recurring': typed('recurring', 'boolean'),
+        'recurrenceInterval': typed('interval', 'float8'), 'lastUpdate': timestamp('lastUpdate')}, ""),
+    ('events', 'events', None, {'ProjectID': 'projects'}, {
+        'name': text('name'), 'description': text('description'), 'timeCreated': timestamp('timeCreated'),
+        'startTime': timestamp('startTime'), 'endTime': timestamp('endTime'),
+        'lastUpdate': timestamp('lastUpdate')}, ""),
+    ('pages', 'pages', 'PageID', {'ProjectID': 'projects'}, {
+        'name': text('name'), 'content': f"pg_temp.remap_image_links({text('content')}, %(origin)s)",
+        'timeCreated': timestamp('timeCreated'), 'lastEditTime': timestamp('lastEditTime'),
+        'timeInvestment': typed('timeInvestment', 'float8')}, ""),
+    ('equations', 'equations', None, {'PageID': 'pages'}, {
+        'name': text('name'), 'description': text('description'), 'content': text('content'),
+        'timeCreated': timestamp('timeCreated'), 'lastEditTime': timestamp('lastEditTime')}, ""),
+    ('recipes', 'recipes', None, {'PageID': 'pages'}, {
+        'name': text('name'), 'description': text('description'),
+        'content': f"pg_temp.remap_image_links({text('content')}, %(origin)s)",
+        'timeCreated': timestamp('timeCreated'), 'lastEditTime': timestamp('lastEditTime')}, ""),
+    ('codesnippets', 'codesnippets', None, {'PageID': 'pages'}, {
+        'name': text('name'), 'description': text('description'), 'language': text('language'),
+        'content': text('content'), 'timeCreated': timestamp('timeCreated'),
+        'lastEditTime': timestamp('lastEditTime')}, ""),
+    ('translations', 'translations', None, {'PageID': 'pages'}, {
+        'language': text('language'), 'content': f"pg_temp.remap_image_links({text('content')}, %(origin)s)",
+        'timeCreated': timestamp('timeCreated'), 'lastEditTime': timestamp('lastEditTime')}, ""),
+    ('canvas', 'canvas', None, {'PageID': 'pages'}, {
+        'name': text('name'), 'description': text('description'),
+        'content': f"pg_temp.remap_canvas_images({text('content')})",
+        'timeCreated': timestamp('timeCreated'), 'lastEditTime': timestamp('lastEditTime')}, ""),
+    ('files', 'files', None, {'PageID': 'pages'}, {
+        'name': text('name'), 'hash': text('hash'), 'filename': text('filename'),
+        'description': text('description'), 'timeCreated': timestamp('upload_date'),
+        'BlobID': "import_blobs.BlobID"}, blob_join),
+    ('images', 'images', 'ImageID', {}, {
+        'UserID': "%(user_id)s", 'timeCreated': timestamp('timeCreated'), 'BlobID': "import_blobs.BlobID"}, blob_join),
+]
+
+# Replaces the image IDs in links to /api/images/image?id= with the imported images' IDs, pointing the links at
+# origin. Links to images that were not imported keep their ID.
+remap_image_links = r"""
+    CREATE OR REPLACE FUNCTION pg_temp.remap_image_links(content text, origin text) RETURNS text LANGUAGE sql AS $$
+        SELECT CASE WHEN strpos(content, '/api/images/image?id=') = 0 THEN content ELSE (
+            SELECT string_agg(CASE WHEN ids.newID IS NULL THEN part.text
+                                   ELSE ids.newID::text || substring(part.text from '^\d+(.*)$') END,
+                              '/api/images/image?id=' ORDER BY part.n)
+            FROM unnest(string_to_array(
+                regexp_replace(content, 'https?://[^\s()\[\]]*/api/images/image\?id=',
+                               origin || '/api/images/image?id=', 'g'),
+                '/api/images/image?id=')) WITH ORDINALITY AS part(text, n)
+            left join import_ids_images ids on part.n > 1 AND ids.oldID::text = substring(part.text from '^(\d+)')
+        ) END
+    $$;
+"""
+
+# The same for the images list of a canvas. Content that is not a JSON object with such a list is kept as it is.
+remap_canvas_images = r"""
+    CREATE OR REPLACE FUNCTION pg_temp.remap_canvas_images(content text) RETURNS text LANGUAGE plpgsql AS $$
+    BEGIN
+        IF content IS NULL OR jsonb_typeof(content::jsonb -> 'images') IS DISTINCT FROM 'array' THEN
+            RETURN content;
+        END IF;
+        RETURN jsonb_set(content::jsonb, '{images}', (
+            SELECT coalesce(jsonb_agg(
+                CASE WHEN ids.newID IS NULL OR jsonb_typeof(image.value) != 'object' THEN image.value
+                     WHEN jsonb_typeof(image.value -> 'id') = 'string'
+                         THEN jsonb_set(image.value, '{id}', to_jsonb(ids.newID::text))
+                     ELSE jsonb_set(image.value, '{id}', to_jsonb(ids.newID)) END
+                ORDER BY image.n), '[]'::jsonb)
+            FROM jsonb_array_elements(content::jsonb -> 'images') WITH ORDINALITY AS image(value, n)
+            left join import_ids_images ids on ids.oldID::text = image.value ->> 'id'
+        ))::text;
+    EXCEPTION WHEN invalid_text_representation THEN
+        RETURN content;
+    END;
+    $$;
+"""
+
+
+class CopyReader:
+    """
+    An NDJSON entry read as COPY text format with a single jsonb column. JSON escapes the tabs and newlines within a
+    line, so backslashes are all COPY would interpret.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size=-1):
+        return self.stream.read(size).replace(b'\\', b'\\\\')
+
+
+class ImportProgress:
+    """
+    Records how far a job has got, writing to importJobs at most every progress_interval_ms unless the stage changes.
+    """
+
+    def __init__(self, job_id, total):
+        self.job_id = job_id
+        self.total = total
+        self.processed = 0
+        self.stage = None
+        self.written = 0
+
+    def advance(self, stage, steps=1):
+        self.processed += steps
+        now = time.monotonic()
+        if stage != self.stage or now - self.written >= config['imports']['progress_interval_ms'] / 1000:
+            update_job(self.job_id, stage=stage, processed=self.processed, total=self.total)
+            self.stage, self.written = stage, now
+
+
+def create_job(user_id):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("INSERT INTO importJobs (UserID) VALUES (%s) RETURNING JobID;", (user_id,))
+        return cursor.fetchone()[0]
+
+
+def update_job(job_id, **fields):
+    # Committed straight away on its own connection, so the job's progress shows while its import is still running
+    assignments = ', '.join(f"{column} = %({column})s" for column in fields)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"UPDATE importJobs SET {assignments}, lastUpdate = CURRENT_TIMESTAMP WHERE JobID = %(job_id)s;",
+                       {**fields, 'job_id': job_id})
+
+
+def get_job(user_id, job_id):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {import_job_table.select()} FROM importJobs WHERE JobID = %s AND UserID = %s;",
+                       (job_id, user_id))
+        return fetch_row(cursor)
+
+
+def read_manifest(path):
+    try:
+        with zipfile.ZipFile(path) as archive:
+            manifest = json.loads(archive.read("manifest.json"))
+    except (zipfile.BadZipFile, KeyError, ValueError):
+        raise ValueError("Invalid Archive")
+    if not isinstance(manifest, dict) or manifest.get('format') != archive_format:
+        raise ValueError("Unsupported Archive Format")
+    return manifest
+
+
+def stage_section(cursor, archive, section):
+    cursor.execute(f"CREATE TEMP TABLE import_{section} (data jsonb NOT NULL) ON COMMIT DROP;")
+    if f"{section}.ndjson" in archive.namelist():
+        with archive.open(f"{section}.ndjson") as entry:
+            cursor.copy_expert(f"COPY import_{section} (data) FROM STDIN;", CopyReader(entry),
+                               size=config['uploads']['chunk_size'])
+    # Temporary tables are never analysed automatically
+    cursor.execute(f"ANALYZE import_{section};")
+
+
+def store_blobs(cursor, archive, progress):
+    """
+    Writes the content of every file and image in the archive that is not stored already, recording the BlobID of
+    each hash in import_blobs. import_archive deletes those no imported row ends up referencing.
+    """
+    cursor.execute("CREATE TEMP TABLE import_blobs (hash VARCHAR(128) PRIMARY KEY, BlobID INTEGER NOT NULL) "
+                   "ON COMMIT DROP;")
+    cursor.execute("""
+        SELECT data->>'hash' FROM import_files UNION SELECT data->>'hash' FROM import_images;
+    """)
+    hashes = [row[0] for row in cursor.fetchall()]
+    names = set(archive.namelist())
+    for blob_hash in hashes:
+        if f"blobs/{blob_hash}" not in names:
+            raise ValueError(f"Missing Blob {blob_hash}")
+        with archive.open(f"blobs/{blob_hash}") as entry:
+            blob_id, content_hash = store_blob(cursor, entry)
+        if content_hash != blob_hash:
+            raise ValueError(f"Corrupt Blob {blob_hash}")
+        cursor.execute("INSERT INTO import_blobs (hash, BlobID) VALUES (%s, %s);", (blob_hash, blob_id))
+        progress.advance("blobs")
+    cursor.execute("ANALYZE import_blobs;")
+
+
+def allocate_ids(cursor, section, table, id_column, params):
+    """
+    Draws a new ID for every staged row of section, as import_ids_<section> (oldID, newID, created). Tags reuse the
+    user's tag of the same name when there is one, and only the rest are created.
+    """
+    sequence = f"nextval(pg_get_serial_sequence('{table}', '{id_column.lower()}'))::integer"
+    if section == 'tags':
+        cursor.execute(f"""
+            CREATE TEMP TABLE import_ids_tags ON COMMIT DROP AS
+            SELECT (data->>'TagID')::integer AS oldID, coalesce(existing.TagID, {sequence}) AS newID,
+              existing.TagID IS NULL AS created
+            FROM import_tags
+            left join lateral (
+              SELECT tags.TagID FROM tags WHERE tags.UserID = %(user_id)s AND tags.tag = import_tags.data->>'tag'
+              ORDER BY tags.TagID LIMIT 1
+            ) existing on true;
+        """, params)
+    else:
+        cursor.execute(f"""
+            CREATE TEMP TABLE import_ids_{section} ON COMMIT DROP AS
+            SELECT (data->>'{id_column}')::integer AS oldID, {sequence} AS newID, true AS created
+            FROM import_{section};
+        """)
+    cursor.execute(f"ALTER TABLE import_ids_{section} ADD PRIMARY KEY (oldID);")
+
+
+def insert_section(cursor, section, table, id_column, parents, columns, joins, params):
+    """
+    Inserts the staged rows of section with one statement, returning how many were written.
+    """
+    names, values, sources, where = [], [], [f"import_{section}"], ""
+    if id_column is not None:
+        names.append(id_column)
+        values.append("ids.newID")
+        sources.append(f"inner join import_ids_{section} ids on ids.oldID = (data->>'{id_column}')::integer")
+        where = "WHERE ids.created"
+    for column, parent in parents.items():
+        names.append(column)
+        values.append(f"{parent}_ids.newID")
+        sources.append(f"inner join import_ids_{parent} {parent}_ids "
+                       f"on {parent}_ids.oldID = (data->>'{column}')::integer")
+    names += columns.keys()
+    values += columns.values()
+    if joins:
+        sources.append(joins)
+    cursor.execute(f"INSERT INTO {table} ({', '.join(names)}) SELECT {', '.join(values)} "
+                   f"FROM {' '.join(sources)} {where};", params)
+    return cursor.rowcount
+
+
+def import_archive(job_id, user_id, session_id, path, origin):
+    """
+    Imports the archive at path for the user, returning the number of rows written to each table and the new ID of
+    each project. The projects are logged as created by session_id. Nothing is written unless the whole archive
+    imports.
+    """
+    params = {'user_id': user_id, 'session_id': session_id, 'origin': origin}
+    with zipfile.ZipFile(path) as archive:
+        blob_count = sum(1 for name in archive.namelist() if name.startswith("blobs/"))
+        progress = ImportProgress(job_id, len(staged_sections) + blob_count + len(import_sections))
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            for section in staged_sections:
+                stage_section(cursor, archive, section)
+                progress.advance(f"staging {section}")
+
+            store_blobs(cursor, archive, progress)
+
+            for section, table, id_column, _, _, _ in import_sections:
+                if id_column is not None:
+                    allocate_ids(cursor, section, table, id_column, params)
+            # The functions read import_ids_images, so they can only be created once it exists
+            cursor.execute(remap_image_links)
+            cursor.execute(remap_canvas_images)
+
+            counts = {}
+            for section, table, id_column, parents, columns, joins in import_sections:
+                counts[section] = insert_section(cursor, section, table, id_column, parents, columns, joins, params)
+                progress.advance(f"importing {section}")
+
+            # A blob is only referenced once a file or image row points at it, and the rows skipped for a missing
+            # parent leave theirs unreferenced. The refCount triggers only collect a blob when a reference goes.
+            cursor.execute("""
+                DELETE FROM blobs WHERE BlobID IN (SELECT BlobID FROM import_blobs) AND refCount = 0;
+            """)
+
+            # The project list is built from the request log, so each project is logged as created, as
+            # /projects/create does, or it would never be listed
+            cursor.execute("""
+                INSERT INTO projectRequests (ProjectID, SessionID, accessGranted, notes)
+                SELECT newID, %(session_id)s, TRUE, 'CREATE' FROM import_ids_projects;
+            """, params)
+
+            cursor.execute("SELECT oldID, newID FROM import_ids_projects ORDER BY oldID;")
+            projects = {old_id: new_id for old_id, new_id in cursor.fetchall()}
+
+    return {'counts': counts, 'projects': projects}
+
+
+def run_import(job_id, user_id, session_id, path, origin):
+    try:
+        update_job(job_id, state='running')
+        result = import_archive(job_id, user_id, session_id, path, origin)
+        update_job(job_id, state='done', stage=None, result=Json(result))
+    except ValueError as e:
+        update_job(job_id, state='failed', message=str(e))
+    except Exception:
+        logger.exception("Import %s failed", job_id)
+        update_job(job_id, state='failed', message="Import Failed")
+    finally:
+        os.remove(path)
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_import_executor():
+    """
+    Returns this process's pool of import threads, starting it on first use.
+    """
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=config['imports']['workers'], thread_name_prefix="import")
+                _executor_pid = os.getpid()
+    return _executor
+
+
+@imports_bp.route('/test', methods=['GET'])
+def test_ep():
+    return jsonify({"test": "Import Endpoint Reached."})
+
+
+@imports_bp.route('', methods=['POST'])
+def import_ep():
+    """
+    Starts importing the uploaded archive (form field file) and returns the job's id for /import/status. Image links
+    are pointed at the optional origin field, by default this server as the request reached it.
+    """
+    file = request.files.get("file")
+    token = request.cookies.get("token")
+
+    valid, session = verify_session_for_access(token)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if file is None:
+        return make_response({'status': 'error', 'message': "Missing File"}, STATUS.BAD_REQUEST)
+
+    origin = request.form.get("origin", f"http://{request.host}").rstrip("/")
+
+    # The job reads the archive after this request has finished, so it gets its own copy of the upload
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=".zip")
+    with os.fdopen(fd, 'wb') as spool:
+        file.save(spool, buffer_size=config['uploads']['chunk_size'])
+
+    try:
+        read_manifest(path)
+    except ValueError as e:
+        os.remove(path)
+        return make_response({'status': 'error', 'message': str(e)}, STATUS.BAD_REQUEST)
+
+    job_id = create_job(session['UserID'])
+    get_import_executor().submit(run_import, job_id, session['UserID'], session['SessionID'], path, origin)
+
+    return make_response({'status': 'success', 'id': job_id}, STATUS.ACCEPTED)
+
+
+@imports_bp.route('/status', methods=['GET'])
+def status_ep():
+    job_id = int(request.args.get("id"))
+    token = request.cookies.get("token")
+
+    valid, session = verify_session_for_access(token)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    job = get_job(session['UserID'], job_id)
+
+    if job is None:
+        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.NOT_FOUND)
+
+    return make_response({'status': 'success', 'message': job}, STATUS.OK)
@@ -1,4 +1,7 @@
-from flask import Blueprint
+from flask import Blueprint, make_response
+from http import HTTPStatus as STATUS
+
+from .db import pool_health
 
 main_bp = Blueprint('main', __name__)
 
@@ -6,3 +9,10 @@ main_bp = Blueprint('main', __name__)
 @main_bp.route('/',  methods=['GET'])
 def home():
     return "Welcome to the modular Flask API"
+
+
+@main_bp.route('/health', methods=['GET'])
+def health():
+    # Unauthenticated, so it only says whether the worker can reach the database
+    healthy = pool_health()
+    return make_response({'healthy': healthy}, STATUS.OK if healthy else STATUS.SERVICE_UNAVAILABLE)
@@ -0,0 +1,66 @@
+import os
+import re
+
+from .db import get_db_connection
+
+migrations_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+migration_file_pattern = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# Held while migrating so that gunicorn workers starting together apply each migration once
+migration_lock_id = 7300001
+
+
+def get_migrations():
+    """
+    Returns (version, name, path) for every migrations/<version>_<name>.sql file, in version order.
+    """
+    migrations = []
+    for filename in os.listdir(migrations_dir):
+        match = migration_file_pattern.match(filename)
+        if match is not None:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(migrations_dir, filename)))
+    return sorted(migrations)
+
+
+def get_applied_versions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            appliedTime TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def run_migrations():
+    """
+    Brings the schema created by db/init.sql up to date. Each pending migration runs in its own transaction and is
+    recorded in schema_migrations, so a failed migration leaves the ones before it applied.
+    """
+    applied = []
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s);", (migration_lock_id,))
+        try:
+            done = get_applied_versions(cursor)
+            conn.commit()
+            for version, name, path in get_migrations():
+                if version in done:
+                    continue
+                with open(path) as migration:
+                    cursor.execute(migration.read())
+                cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (version, name))
+                conn.commit()
+                applied.append(f"{version:04d}_{name}")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s);", (migration_lock_id,))
+    return applied
+
+
+if __name__ == '__main__':
+    for migration in run_migrations():
+        print(f"Applied {migration}")
@@ -0,0 +1,92 @@
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+from .db import DB_CONFIG
+
+_listener = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+class NotificationListener(threading.Thread):
+    """
+    Background thread holding one dedicated connection per worker process that LISTENs on every subscribed channel
+    and hands each NOTIFY payload to the channel's callbacks. Notifications sent while the connection is down are
+    lost, so subscribers can register an on_reconnect callback to resynchronise.
+    """
+
+    def __init__(self):
+        super().__init__(name="pg-notification-listener", daemon=True)
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._reconnect_callbacks = []
+        self._pending_channels = set()
+        self._listening = {}
+
+    def subscribe(self, channel, callback, on_reconnect=None):
+        with self._lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+            self._pending_channels.add(channel)
+            if on_reconnect is not None:
+                self._reconnect_callbacks.append(on_reconnect)
+            return self._listening.setdefault(channel, threading.Event())
+
+    def run(self):
+        connected_before = False
+        while True:
+            try:
+                conn = psycopg2.connect(**DB_CONFIG)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with self._lock:
+                    self._pending_channels = set(self._callbacks)
+                    reconnect_callbacks = list(self._reconnect_callbacks) if connected_before else []
+                for callback in reconnect_callbacks:
+                    callback()
+                connected_before = True
+                self._listen(conn)
+            except psycopg2.Error:
+                time.sleep(5)
+
+    def _listen(self, conn):
+        cursor = conn.cursor()
+        while True:
+            with self._lock:
+                channels, self._pending_channels = self._pending_channels, set()
+            for channel in channels:
+                cursor.execute(f'LISTEN "{channel}";')
+                with self._lock:
+                    listening = self._listening.get(channel)
+                if listening is not None:
+                    listening.set()
+
+            if select.select([conn], [], [], 1.0) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notification = conn.notifies.pop(0)
+                with self._lock:
+                    callbacks = list(self._callbacks.get(notification.channel, []))
+                for callback in callbacks:
+                    try:
+                        callback(notification.payload)
+                    except Exception:
+                        # A failing subscriber must not take the listener down for every other channel
+                        pass
+
+
+def listen(channel, callback, on_reconnect=None):
+    """
+    Calls callback(payload) for every NOTIFY on channel received by this worker process. Returns a threading.Event
+    that is set once the worker is listening on channel; notifications sent before then are not received.
+    """
+    global _listener, _listener_pid
+    with _listener_lock:
+        if _listener is None or _listener_pid != os.getpid():
+            _listener = NotificationListener()
+            _listener_pid = os.getpid()
+            _listener.start()
+        return _listener.subscribe(channel, callback, on_reconnect)
@@ -5,10 +5,19 @@ from datetime import datetime, timezone
 pages_bp = Blueprint('pages', __name__, url_prefix='/pages')
 from .db import get_db_connection
 from .sessions import verify_session_for_access
-from .projects import authorized_project_access
+from .authorization import verify_resource_access
 from .logging import create_page_access_request
+from .audit import flush_audit_log
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .projection import get_fields_arg
+from .tables import Table, fetch_row, fetch_rows
+from .patches import patch_content
+from .revisions import record_revision
+from .conditional import get_content_validators, content_validators, not_modified, not_modified_response, set_validators
 
-page_fields = ['PageID', 'ProjectID', 'name', 'content', 'timeCreated', 'lastEditTime', 'timeInvestment']
+page_fields = ['PageID', 'ProjectID', 'name', 'content', 'timeCreated', 'lastEditTime', 'timeInvestment', 'revision']
+page_table = Table('pages', page_fields, timestamps=['timeCreated', 'lastEditTime'])
+page_list_fields = [field for field in page_fields if field != 'content']
 
 
 @pages_bp.route('/test', methods=['GET'])
@@ -16,29 +25,23 @@ def test_ep():
     return jsonify({"test": "Pages  Endpoint Reached."})
 
 
-def convert_time(object):
-    object['timeCreated'] = object['timeCreated'].timestamp()
-    object['lastEditTime'] = object['lastEditTime'].timestamp()
-    return object
+def last_review_by_user_query(user_id):
+    return ("""
+        SELECT %s - lastReview, pages.pageID, pages.name, pages.projectID, reviewCount FROM pageRequestRollup
+        inner join pages on pages.pageid = pageRequestRollup.pageid
+        inner join projects on projects.projectID = pages.projectID
+        where lastReview IS NOT NULL AND projects.UserID = %s
+    """, (datetime.now().astimezone(), user_id))
 
 
 def get_last_review_by_user_id(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT %s - max(accessTime), pagerequests.pageID, pages.name, pages.projectID FROM pagerequests
-        inner join pages on pages.pageid = pagerequests.pageid
-        inner join projects on projects.projectID = pages.projectID
-        where accessGranted = TRUE AND pagerequests.notes = 'REVIEW' AND projects.UserID = %s
-        group by pagerequests.pageID, pages.name, pages.projectID
-    """, (datetime.now().astimezone(), user_id))
-    review_deltas = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(*last_review_by_user_query(user_id))
+        review_deltas = cursor.fetchall()
     if review_deltas is not None:
         review_deltas_list = []
         for review_delta in review_deltas:
-            review_delta = {k: v for k, v in zip(['days', 'page_id', 'name', 'project_id'], review_delta)}
+            review_delta = {k: v for k, v in zip(['days', 'page_id', 'name', 'project_id', 'review_count'], review_delta)}
             review_delta['days'] = review_delta['days'].days
             review_deltas_list.append(review_delta)
         return review_deltas_list
@@ -46,170 +49,132 @@ def get_last_review_by_user_id(user_id):
 
 
 def get_last_edit_by_user_id(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT max(accessTime), pagerequests.pageID, pages.name, pages.projectID FROM pagerequests
-        inner join pages on pages.pageid = pagerequests.pageid
-        inner join projects on projects.projectID = pages.projectID
-        where accessGranted = TRUE AND pagerequests.notes = 'UPDATE' AND projects.UserID = %s
-        group by pagerequests.pageID, pages.name, pages.projectID
-    """, (user_id,))
-    review_deltas = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT extract(epoch from pageRequestRollup.lastUpdate)::float8, pages.pageID, pages.name, pages.projectID FROM pageRequestRollup
+            inner join pages on pages.pageid = pageRequestRollup.pageid
+            inner join projects on projects.projectID = pages.projectID
+            where pageRequestRollup.lastUpdate IS NOT NULL AND projects.UserID = %s
+        """, (user_id,))
+        review_deltas = cursor.fetchall()
     if review_deltas is not None:
         review_deltas_list = []
         for review_delta in review_deltas:
             review_delta = {k: v for k, v in zip(['lastEditTime', 'page_id', 'name', 'project_id'], review_delta)}
-            review_delta['lastEditTime'] = str(review_delta['lastEditTime'].timestamp())
+            review_delta['lastEditTime'] = str(review_delta['lastEditTime'])
             review_deltas_list.append(review_delta)
         return review_deltas_list
     return review_deltas
 
 
-def get_last_review_by_project_id(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT %s - max(accessTime), pagerequests.pageID, pages.name FROM pagerequests
-        inner join pages on pages.pageid = pagerequests.pageid
-        where accessGranted = TRUE AND pages.projectID = %s AND pagerequests.notes = 'REVIEW'
-        group by pagerequests.pageID, pages.name
+def last_review_by_project_query(project_id):
+    return ("""
+        SELECT %s - lastReview, pages.pageID, pages.name, reviewCount FROM pageRequestRollup
+        inner join pages on pages.pageid = pageRequestRollup.pageid
+        where lastReview IS NOT NULL AND pages.projectID = %s
     """, (datetime.now().astimezone(), project_id,))
+
+
+def fetch_last_review_by_project_id(cursor, project_id):
+    cursor.execute(*last_review_by_project_query(project_id))
     review_deltas = cursor.fetchall()
-    cursor.close()
-    conn.close()
     if review_deltas is not None:
         review_deltas_list = []
         for review_delta in review_deltas:
-            review_delta = {k: v for k, v in zip(['days', 'page_id', 'name'], review_delta)}
+            review_delta = {k: v for k, v in zip(['days', 'page_id', 'name', 'review_count'], review_delta)}
             review_delta['days'] = review_delta['days'].days
             review_deltas_list.append(review_delta)
         return review_deltas_list
     return review_deltas
 
 
+def get_last_review_by_project_id(project_id):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_last_review_by_project_id(cursor, project_id)
+
+
 def get_last_update(page_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT lastEditTime FROM pages where PageID = %s;", (page_id,))
-    last_update = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {page_table.column('lastEditTime')} FROM pages where PageID = %s;", (page_id,))
+        last_update = cursor.fetchone()
     if last_update is not None:
-        return last_update[0].timestamp()
+        return last_update[0]
     return None
 
 
-def authorized_page_access(token, page_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    SELECT endTime, isActive, token  FROM sessions
-    inner join projects
-    on projects.UserID = sessions.UserID
-    inner join pages
-    on pages.projectID = projects.projectID
-    where token = %s and pages.PageID = %s
-    """, (token, page_id))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-
-    if result is not None:
-        result = {k: v for k, v in zip(['endTime', 'isActive', 'token'], result)}
-        if (result['endTime'] >= datetime.now()) and (result['isActive']):
-            return True
-    return False
-
-
 def create_page(project_id, name, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO pages (ProjectID, name, content, lastEditTime)
-        VALUES (%s, %s, %s, %s)
-        RETURNING *;
-    """, (project_id, name, content, datetime.now()))
-    new_page = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if new_page is not None:
-        new_page = {k: v for k, v in zip(page_fields, new_page)}
-        new_page = convert_time(new_page)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO pages (ProjectID, name, content, lastEditTime)
+            VALUES (%s, %s, %s, %s)
+            RETURNING {page_table.select()};
+        """, (project_id, name, content, datetime.now()))
+        new_page = fetch_row(cursor)
     return new_page
 
 
 def get_page_by_id(page_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM pages where pageID = %s;", (page_id,))
-    page = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if page is not None:
-        page = {k: v for k, v in zip(page_fields, page)}
-        page = convert_time(page)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {page_table.select()} FROM pages where pageID = %s;", (page_id,))
+        page = fetch_row(cursor)
     return page
 
 
-def get_pages_by_project(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM pages where projectID = %s;", (project_id,))
-    pages = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if pages is not None:
-        page_list = []
-        for page in pages:
-            page = {k: v for k, v in zip(page_fields, page)}
-            page = convert_time(page)
-            del page['content']
-            page_list.append(page)
-        return page_list
-    return None
+def pages_by_project_query(project_id, limit=None, after=None, fields=page_list_fields):
+    condition, order_by = keyset(['PageID'], after)
+    columns = page_table.select(fields)
+    return (f"""
+        SELECT {columns} FROM pages where projectID = %s{condition}
+        {order_by} LIMIT %s;
+    """, (project_id, *(after or []), fetch_limit(limit)))
+
+
+def fetch_pages_by_project(cursor, project_id, limit=None, after=None, fields=page_list_fields):
+    cursor.execute(*pages_by_project_query(project_id, limit, after, fields))
+    pages = fetch_rows(cursor)
+    return page_of(pages, limit, lambda page: [page['PageID']])
+
+
+def get_pages_by_project(project_id, limit=None, after=None, fields=page_list_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_pages_by_project(cursor, project_id, limit, after, fields)
 
 
 def update_page(page_id, name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE pages SET name = %s
-        WHERE PageID = %s
-        RETURNING *;
-    """, (name, page_id,))
-    updated_page = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if updated_page is not None:
-        updated_page = {k: v for k, v in zip(page_fields, updated_page)}
-        updated_page = convert_time(updated_page)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE pages SET name = %s
+            WHERE PageID = %s
+            RETURNING {page_table.select()};
+        """, (name, page_id,))
+        updated_page = fetch_row(cursor)
     return updated_page
 
 
 def delete_page(page_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM pages where PageID = %s;", (page_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-
-def update_content(page_id, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE pages SET content = %s, lastEditTime = %s
-        WHERE PageID = %s;
-    """, (content, datetime.now(), page_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM pages where PageID = %s;", (page_id,))
+
+
+def update_content(page_id, content, base_revision=None):
+    """
+    Replaces the content of a page, only if it is still at base_revision when one is given. Returns the new revision,
+    or None if the save was refused.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT content, revision, lastEditTime FROM pages where PageID = %s FOR UPDATE;", (page_id,))
+        page = cursor.fetchone()
+        if page is None or (base_revision is not None and page[1] != base_revision):
+            return None
+
+        record_revision(cursor, page_id, page[1], page[2], page[0], content)
+        cursor.execute("""
+            UPDATE pages SET content = %s, lastEditTime = %s, revision = revision + 1
+            WHERE PageID = %s
+            RETURNING revision;
+        """, (content, datetime.now(), page_id))
+        revision = cursor.fetchone()[0]
+    return revision
 
 
 @pages_bp.route('/create', methods=['POST'])
@@ -221,12 +186,12 @@ def create_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Page"}, STATUS.FORBIDDEN)
 
     new_page = create_page(project_id, name, content)
@@ -248,15 +213,12 @@ def update_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
-        create_page_access_request(session['SessionID'], page_id, valid, "UPDATE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    page = get_page_by_id(page_id)
-
-    if not authorized_project_access(token, page['ProjectID']):
+    if not authorized:
         create_page_access_request(session['SessionID'], page_id, False, "UPDATE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Page"}, STATUS.FORBIDDEN)
 
@@ -276,25 +238,76 @@ def content_ep():
     data = request.get_json()
     page_id = data.get("page_id")
     content = data.get("content")
+    base_revision = data.get("base_revision")
+
+    # base_revision is optional here, saving over whatever revision the page is at when it is left out
+    if base_revision is not None and type(base_revision) is not int:
+        return make_response({'status': 'error', 'message': "Invalid base_revision"}, STATUS.BAD_REQUEST)
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
-        create_page_access_request(session['SessionID'], page_id, valid, "UPDATE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
+    if not authorized:
+        create_page_access_request(session['SessionID'], page_id, False, "UPDATE")
+        return make_response({'status': 'error', 'message': "Not Authorized To Access Page"}, STATUS.FORBIDDEN)
+
     page = get_page_by_id(page_id)
 
-    if not authorized_project_access(token, page['ProjectID']):
+    revision = update_content(page_id, content, base_revision)
+
+    if revision is None:
+        # Either the page is gone or it has moved on from base_revision
+        current = get_page_by_id(page_id)
+        if current is None:
+            return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.NOT_FOUND)
+        return make_response({'status': 'error', 'message': "Page Has Changed", 'revision': current['revision']},
+                             STATUS.CONFLICT)
+
+    create_page_access_request(session['SessionID'], page_id, valid, "UPDATE")
+
+    response = make_response({'status': 'success', 'message': f'Updated {page["name"]}', 'revision': revision}, STATUS.OK)
+    return response
+
+
+@pages_bp.route('/content', methods=['PATCH'])
+def patch_content_ep():
+    data = request.get_json()
+    page_id = data.get("page_id")
+    base_revision = data.get("base_revision")
+    ops = data.get("ops")
+
+    if type(base_revision) is not int or not isinstance(ops, list):
+        return make_response({'status': 'error', 'message': "Missing base_revision or ops"}, STATUS.BAD_REQUEST)
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
         create_page_access_request(session['SessionID'], page_id, False, "UPDATE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Page"}, STATUS.FORBIDDEN)
 
-    update_content(page_id, content)
+    try:
+        revision, saved = patch_content('pages', 'PageID', page_id, base_revision, ops, record_revision)
+    except ValueError as e:
+        return make_response({'status': 'error', 'message': str(e)}, STATUS.BAD_REQUEST)
+
+    if revision is None:
+        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.NOT_FOUND)
+
+    if not saved:
+        return make_response({'status': 'error', 'message': "Page Has Changed", 'revision': revision}, STATUS.CONFLICT)
+
     create_page_access_request(session['SessionID'], page_id, valid, "UPDATE")
 
-    response = make_response({'status': 'success', 'message': f'Updated {page["name"]}'}, STATUS.OK)
+    response = make_response({'status': 'success', 'message': "Patched Page", 'revision': revision}, STATUS.OK)
     return response
 
 
@@ -305,18 +318,17 @@ def delete_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
-        create_page_access_request(session['SessionID'], page_id, valid, "DELETE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    page = get_page_by_id(page_id)
-
-    if not authorized_project_access(token, page['ProjectID']):
+    if not authorized:
         create_page_access_request(session['SessionID'], page_id, False, "DELETE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Page"}, STATUS.FORBIDDEN)
 
+    page = get_page_by_id(page_id)
+
     create_page_access_request(session['SessionID'], page['PageID'], valid, "DELETE")
     delete_page(page_id)
 
@@ -330,25 +342,32 @@ def get_page_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
-        create_page_access_request(session['SessionID'], page_id, valid, "GET")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    page = get_page_by_id(page_id)
-
-    if not authorized_project_access(token, page['ProjectID']):
+    if not authorized:
         create_page_access_request(session['SessionID'], page_id, False, "GET")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Page"}, STATUS.FORBIDDEN)
 
-    if page is None:
+    validators = get_content_validators(page_table, 'PageID', page_id)
+
+    if validators is None:
         return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
 
-    create_page_access_request(session['SessionID'], page['PageID'], valid, "GET")
+    create_page_access_request(session['SessionID'], page_id, valid, "GET")
+
+    if not_modified(*validators):
+        return not_modified_response(*validators)
+
+    page = get_page_by_id(page_id)
+
+    if page is None:
+        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
 
     response = make_response({'status': 'success', 'message': page}, STATUS.OK)
-    return response
+    return set_validators(response, *content_validators(page, page_fields))
 
 
 @pages_bp.route('/review', methods=['POST'])
@@ -357,22 +376,23 @@ def update_page_review():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
-        create_page_access_request(session['SessionID'], page_id, valid, "REVIEW")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    page = get_page_by_id(page_id)
-
-    if not authorized_project_access(token, page['ProjectID']):
+    if not authorized:
         create_page_access_request(session['SessionID'], page_id, False, "REVIEW")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Page"}, STATUS.FORBIDDEN)
 
+    page = get_page_by_id(page_id)
+
     if page is None:
         return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
 
     create_page_access_request(session['SessionID'], page['PageID'], valid, "REVIEW")
+    # Review times are read back from the request log
+    flush_audit_log()
 
     response = make_response({'status': 'success', 'message': f"Reviewed: {page['name']}"}, STATUS.OK)
     return response
@@ -384,21 +404,22 @@ def get_pages_by_project_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Page"}, STATUS.FORBIDDEN)
 
-    pages = get_pages_by_project(project_id)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(page_list_fields)
+        pages, next_page = get_pages_by_project(project_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    if pages is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
-
-    response = make_response({'status': 'success', 'message': pages}, STATUS.OK)
-    return response
+    return page_response(pages, next_page)
 
 
 @pages_bp.route('/get_project_pages_review_list', methods=['GET'])
@@ -407,12 +428,12 @@ def get_pages_review_by_project_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Page"}, STATUS.FORBIDDEN)
 
     pages = get_last_review_by_project_id(project_id)
@@ -460,6 +481,17 @@ def get_pages_update_by_user_ep():
 @pages_bp.route('/last_update', methods=['GET'])
 def last_update():
     page_ip = int(request.args.get("id"))
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'page', page_ip)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        return make_response({'status': 'error', 'message': "Not Authorized To Access"}, STATUS.FORBIDDEN)
+
     time = get_last_update(page_ip)
     if time is None:
         return make_response({"page_ip": page_ip, "last_update": "Null"}, STATUS.OK)
@@ -0,0 +1,120 @@
+from flask import request, make_response
+from http import HTTPStatus as STATUS
+from datetime import datetime
+import base64
+import json
+
+from .configuration import load_config
+
+config = load_config()
+
+# Keyset pagination for list endpoints. A list is ordered on some columns, the last of which is unique, and a page
+# continues after the values of the last row of the previous page. Those values travel as an opaque cursor token:
+# ?limit=&cursor= in, 'next' out.
+
+
+def encode_cursor(values):
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, key=(int,)):
+    """
+    The values of a cursor for a keyset whose columns hold the types in key, int (an ID) or datetime. Timestamps come
+    back from their ISO strings. Raises ValueError for a cursor that doesn't match the keyset, as one that reached
+    Postgres would fail there instead.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        raise ValueError("Invalid Cursor")
+    if not isinstance(values, list) or len(values) != len(key):
+        raise ValueError("Invalid Cursor")
+    decoded = []
+    for value, kind in zip(values, key):
+        if kind is datetime and isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError("Invalid Cursor")
+        elif type(value) is not kind:
+            # type() rather than isinstance() so that true and false aren't taken for IDs
+            raise ValueError("Invalid Cursor")
+        decoded.append(value)
+    return decoded
+
+
+def streaming_requested():
+    # ?stream=true asks a list endpoint that supports it for a streamed response, see streaming.py
+    return request.args.get("stream", "").lower() in ("1", "true")
+
+
+def get_page_args(streamable=False, key=(int,)):
+    """
+    Returns (limit, after) from ?limit= and ?cursor=, for a list ordered on columns of the types in key (see
+    decode_cursor). Raises ValueError for a malformed cursor. A streamed list (of an endpoint that is streamable) is
+    read to the end unless a limit is given, and that limit isn't capped, as the length of a stream doesn't matter to
+    the worker.
+    """
+    if streamable and streaming_requested():
+        limit = request.args.get("limit", type=int)
+        if limit is not None:
+            limit = max(1, limit)
+    else:
+        limit = request.args.get("limit", config['pagination']['default_limit'], type=int)
+        limit = max(1, min(limit, config['pagination']['max_limit']))
+    after = request.args.get("cursor")
+    if after is not None:
+        after = decode_cursor(after, key)
+    return limit, after
+
+
+def keyset(columns, after, descending=False):
+    """
+    Returns (condition, order_by) for a page ordered on columns. condition is empty for the first page and otherwise
+    ' AND (columns) > (%s, ...)', to be appended to the WHERE clause with the values of after as its parameters.
+    """
+    direction = " DESC" if descending else ""
+    order_by = "ORDER BY " + ", ".join(column + direction for column in columns)
+    condition = ""
+    if after is not None:
+        if len(after) != len(columns):
+            raise ValueError("Invalid Cursor")
+        comparison = "<" if descending else ">"
+        condition = f" AND ({', '.join(columns)}) {comparison} ({', '.join(['%s'] * len(columns))})"
+    return condition, order_by
+
+
+def fetch_limit(limit):
+    # One extra row tells whether there is another page. LIMIT NULL reads everything.
+    if limit is None:
+        return None
+    return limit + 1
+
+
+def page_of(rows, limit, key):
+    """
+    Trims rows fetched with fetch_limit to the page. Returns (rows, next), where next is the cursor of the following
+    page, made from key(last row), or None when this is the last page.
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
+
+
+def next_cursor(key):
+    # For a streamed list, the function giving its next cursor from the last row sent
+    return lambda row: encode_cursor(key(row))
+
+
+def page_response(items, next_page):
+    message = {'status': 'success', 'message': items}
+    if next_page is not None:
+        message['next'] = next_page
+    return make_response(message, STATUS.OK)
+
+
+def invalid_request_response(error):
+    # For the ValueError of a malformed cursor, fields, limit or offset argument
+    return make_response({'status': 'error', 'message': str(error)}, STATUS.BAD_REQUEST)
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from .db import get_db_connection
+
+# Content saves as patches against a known revision. A patch is a list of splice ops [start, delete_count, insert],
+# sorted by start and non-overlapping, with offsets into the unpatched content. Offsets count UTF-16 code units so
+# that they match JavaScript string indices.
+
+
+def apply_patch(content, ops):
+    """
+    Returns content with ops applied. Raises ValueError if the patch is malformed, out of range or would split a
+    surrogate pair.
+    """
+    base = content.encode('utf-16-le', 'surrogatepass')
+    length = len(base) // 2
+    parts, position = [], 0
+    for op in ops:
+        if not isinstance(op, list) or len(op) != 3:
+            raise ValueError("Patch Ops Must Be [start, delete_count, insert]")
+        start, delete_count, insert = op
+        if type(start) is not int or type(delete_count) is not int or not isinstance(insert, str):
+            raise ValueError("Patch Ops Must Be [start, delete_count, insert]")
+        if start < position or delete_count < 0 or start + delete_count > length:
+            raise ValueError("Patch Out Of Range")
+        parts.append(base[2 * position:2 * start])
+        parts.append(insert.encode('utf-16-le', 'surrogatepass'))
+        position = start + delete_count
+    parts.append(base[2 * position:])
+    try:
+        return b''.join(parts).decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise ValueError("Patch Splits A Character")
+
+
+def patch_content(table, id_column, resource_id, base_revision, ops, on_save=None):
+    """
+    Applies a patch to the content of one row if the row is still at base_revision. The row is locked while patching
+    so concurrent saves are serialised. on_save(cursor, resource_id, revision, last_edit_time, content, new_content)
+    is called in the same transaction before the new content is written.
+
+    Returns (revision, saved): the revision after the save, or the current revision if the save was refused. revision
+    is None if the row doesn't exist. Raises ValueError for a bad patch.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT content, revision, lastEditTime FROM {table} where {id_column} = %s FOR UPDATE;",
+                       (resource_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None, False
+        content, revision, last_edit_time = row
+        if revision != base_revision:
+            return revision, False
+
+        new_content = apply_patch(content or '', ops)
+        if on_save is not None:
+            on_save(cursor, resource_id, revision, last_edit_time, content, new_content)
+
+        cursor.execute(f"""
+            UPDATE {table} SET content = %s, revision = revision + 1, lastEditTime = %s
+            WHERE {id_column} = %s
+            RETURNING revision;
+        """, (new_content, datetime.now(), resource_id))
+        return cursor.fetchone()[0], True
@@ -0,0 +1,20 @@
+from flask import request
+
+# Sparse fieldsets for list endpoints. Each list declares the fields it can return, and ?fields=a,b,... narrows the
+# SELECT to those columns (see Table.select in tables.py), so a listing only reads what it sends back.
+
+
+def get_fields_arg(available):
+    """
+    Returns the fields named by ?fields=, in the order of available, or all of available if it is absent. The first
+    field, the ID that results are keyed and paged on, is always included. Raises ValueError for an unknown field.
+    """
+    requested = request.args.get("fields")
+    if requested is None:
+        return list(available)
+    requested = {field.strip() for field in requested.split(",") if field.strip()}
+    unknown = requested.difference(available)
+    if unknown:
+        raise ValueError(f"Unknown Fields: {', '.join(sorted(unknown))}")
+    return [field for field in available if field == available[0] or field in requested]
+
@@ -4,10 +4,24 @@ from datetime import datetime, timedelta
 from collections import defaultdict
 from .db import get_db_connection
 from .sessions import verify_session_for_access
+from .authorization import verify_resource_access
 from .logging import create_access_request
+from .audit import flush_audit_log
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .conditional import metadata_fields
+from .pages import fetch_pages_by_project, fetch_last_review_by_project_id, page_list_fields
+from .todo import fetch_all_todo, todo_fields
+from .events import fetch_all_events, event_fields
+from .canvas import fetch_canvas_by_project, canvas_list_fields
+from .recipes import fetch_recipes_by_project, recipe_fields
+from .code_snippets import fetch_snippets_by_project, code_fields
+from .equations import fetch_equations_by_project, equations_fields
+from .files import fetch_files_by_project, file_metadata_fields
 
 projects_bp = Blueprint('projects', __name__, url_prefix='/projects')
 projects_fields = ['ProjectID', 'UserID', 'name', 'description', 'TimeCreated', 'lastUpdate']
+# Named rather than *, so a column added to projects doesn't shift the rows zipped with projects_fields
+projects_columns = ', '.join(projects_fields)
 tag_fields = ['TagID', 'UserID', 'tag', 'options']
 
 
@@ -15,21 +29,17 @@ def get_tags_for_projects(project_ids):
     if not project_ids:
         return {}
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        # Use SQL's IN clause to fetch all tags at once
+        cursor.execute("""
+            SELECT DISTINCT tagmappings.projectID, tags.TagID, tags.UserID, tags.tag, tags.options
+            FROM tags
+            JOIN tagmappings ON tags.TagID = tagmappings.TagID
+            WHERE tagmappings.projectID = ANY(%s)
+            ORDER BY tags.tag;
+        """, (project_ids,))
 
-    # Use SQL's IN clause to fetch all tags at once
-    cursor.execute("""
-        SELECT DISTINCT tagmappings.projectID, tags.TagID, tags.UserID, tags.tag, tags.options
-        FROM tags
-        JOIN tagmappings ON tags.TagID = tagmappings.TagID
-        WHERE tagmappings.projectID = ANY(%s)
-        ORDER BY tags.tag;
-    """, (project_ids,))
-
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+        rows = cursor.fetchall()
 
     tags_by_project = defaultdict(list)
     for row in rows:
@@ -40,17 +50,13 @@ def get_tags_for_projects(project_ids):
     return tags_by_project
 
 
-def get_tags_by_project(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def fetch_tags_by_project(cursor, project_id):
     cursor.execute("""
     SELECT tags.TagID, UserID, tag, options FROM tags 
     join tagmappings on tags.tagid = tagmappings.tagid
     where projectID = %s order by Tag;
     """, (project_id,))
     tags = cursor.fetchall()
-    cursor.close()
-    conn.close()
     if tags is not None:
         tag_list = []
         for tag in tags:
@@ -60,74 +66,62 @@ def get_tags_by_project(project_id):
     return None
 
 
+def get_tags_by_project(project_id):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_tags_by_project(cursor, project_id)
+
+
 def get_last_update(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT lastUpdate FROM projects where projectID = %s;", (project_id,))
-    last_update = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT extract(epoch from lastUpdate)::float8 FROM projects where projectID = %s;",
+                       (project_id,))
+        last_update = cursor.fetchone()
     if last_update is not None:
         return last_update[0]
     return None
 
 
 def create_project(user_id, name, description):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO projects (UserID, name, description)
-        VALUES (%s, %s, %s)
-        RETURNING *;
-    """, (user_id, name, description))
-
-    new_project = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO projects (UserID, name, description)
+            VALUES (%s, %s, %s)
+            RETURNING {projects_columns};
+        """, (user_id, name, description))
+
+        new_project = cursor.fetchone()
     if new_project is not None:
         new_project = {k: v for k, v in zip(projects_fields, new_project)}
     return new_project
 
 
 def update_project(project_id, new_name, new_description):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        UPDATE projects SET name = %s, description = %s, lastUpdate = %s
-        WHERE projectID = %s
-        RETURNING *;
-    """, (new_name, new_description, datetime.now(), project_id))
-
-    updated_project = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE projects SET name = %s, description = %s, lastUpdate = %s
+            WHERE projectID = %s
+            RETURNING {projects_columns};
+        """, (new_name, new_description, datetime.now(), project_id))
+
+        updated_project = cursor.fetchone()
     if updated_project is not None:
         updated_project = {k: v for k, v in zip(projects_fields, updated_project)}
     return updated_project
 
 
 def delete_project(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM projects where ProjectID = (%s)", (project_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM projects where ProjectID = (%s)", (project_id,))
 
 
-def get_projects_with_token(token):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+def projects_with_token_query(token, limit=None, after=None):
+    condition, order_by = keyset(['projects.ProjectID'], after)
+    return (f"""
     SELECT
       projects.ProjectID,
       projects.name,
       projects.description,
-      MAX(projectrequests.accessTime) AS lastAccessed
+      extract(epoch from MAX(projectrequests.accessTime))::float8 AS lastAccessed
     FROM sessions
     INNER JOIN projects ON projects.UserID = sessions.UserID
     INNER JOIN projectrequests ON projectrequests.projectID = projects.ProjectID
@@ -135,57 +129,98 @@ def get_projects_with_token(token):
       sessions.token = %s
       AND sessions.endTime > %s
       AND sessions.isActive = TRUE
-      AND projectrequests.notes IN ('GET', 'CREATE')
+      AND projectrequests.notes IN ('GET', 'CREATE'){condition}
     GROUP BY
       projects.ProjectID,
       projects.name,
       projects.description
-    ORDER BY
-      lastAccessed DESC;
-    """, (token, datetime.now()))
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    if results is not None:
-        result_list = []
-        for result in results:
-            result = {k: v for k, v in zip(['ProjectID', 'name', 'description', 'timeCreated'], result)}
-            result['timeCreated'] = result['timeCreated'].timestamp()
-            result_list.append(result)
-        return result_list
-    return None
+    {order_by}
+    LIMIT %s;
+    """, (token, datetime.now(), *(after or []), fetch_limit(limit)))
 
 
-def get_project_by_id(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM projects where projectID = %s;", (project_id,))
+def get_projects_with_token(token, limit=None, after=None):
+    """
+    The session user's projects with the time each was last accessed, by ProjectID. The order doesn't change as
+    projects are opened, so a page never repeats or skips a project listed on another.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(*projects_with_token_query(token, limit, after))
+        results = cursor.fetchall()
+
+    results, next_page = page_of(results, limit, lambda result: [result[0]])
+    result_list = [{k: v for k, v in zip(['ProjectID', 'name', 'description', 'timeCreated'], result)}
+                   for result in results]
+    return result_list, next_page
+
+
+def fetch_project_by_id(cursor, project_id):
+    cursor.execute(f"SELECT {projects_columns} FROM projects where projectID = %s;", (project_id,))
     project = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    project = {k: v for k, v in zip(projects_fields, project)}
+    if project is not None:
+        project = {k: v for k, v in zip(projects_fields, project)}
     return project
 
 
-def authorized_project_access(token, project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    SELECT endTime, isActive, token  FROM sessions
-    inner join projects
-    on projects.UserID = sessions.UserID
-    where token = %s and ProjectID = %s
-    """, (token, project_id))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-
-    if result is not None:
-        result = {k: v for k, v in zip(['endTime', 'isActive', 'token'], result)}
-        if (result['endTime'] >= datetime.now()) and (result['isActive']):
-            return True
-    return False
+def get_project_by_id(project_id):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_project_by_id(cursor, project_id)
+
+
+# Each dashboard panel: the function listing it for a project and the fields it is listed with
+dashboard_panels = {
+    'pages': (fetch_pages_by_project, page_list_fields),
+    'todos': (fetch_all_todo, todo_fields),
+    'events': (fetch_all_events, event_fields),
+    'canvases': (fetch_canvas_by_project, canvas_list_fields),
+    'recipes': (fetch_recipes_by_project, metadata_fields(recipe_fields)),
+    'snippets': (fetch_snippets_by_project, metadata_fields(code_fields)),
+    'equations': (fetch_equations_by_project, metadata_fields(equations_fields)),
+    'files': (fetch_files_by_project, file_metadata_fields),
+}
+# What ?panels= can select: the page review list and the listed panels. The project itself is always returned.
+dashboard_panel_names = ['reviews'] + list(dashboard_panels)
+
+
+def get_panels_arg():
+    """
+    Returns the dashboard panels named by ?panels=, or all of them if it is absent. Raises ValueError for an unknown
+    panel.
+    """
+    requested = request.args.get("panels")
+    if requested is None:
+        return list(dashboard_panel_names)
+    requested = {panel.strip() for panel in requested.split(",") if panel.strip()}
+    unknown = requested.difference(dashboard_panel_names)
+    if unknown:
+        raise ValueError(f"Unknown Panels: {', '.join(sorted(unknown))}")
+    return [panel for panel in dashboard_panel_names if panel in requested]
+
+
+def get_dashboard(project_id, limit, panels=dashboard_panel_names):
+    """
+    Returns (dashboard, next) for a project: the project with its tags, and of panels its page review list and up to
+    limit items of each listed panel, in the shapes of their own endpoints but without content. Everything is read in
+    one snapshot, so the panels agree with each other. next maps each truncated panel to the cursor that continues it
+    from its own endpoint. Returns (None, None) if the project doesn't exist.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+        project = fetch_project_by_id(cursor, project_id)
+        if project is None:
+            return None, None
+        project['tags'] = fetch_tags_by_project(cursor, project_id)
+        dashboard = {'project': project}
+        if 'reviews' in panels:
+            dashboard['reviews'] = fetch_last_review_by_project_id(cursor, project_id)
+        next_pages = {}
+        for panel, (fetch_panel, fields) in dashboard_panels.items():
+            if panel not in panels:
+                continue
+            dashboard[panel], next_page = fetch_panel(cursor, project_id, limit, None, fields)
+            if next_page is not None:
+                next_pages[panel] = next_page
+    return dashboard, next_pages
 
 
 @projects_bp.route('/test', methods=['GET'])
@@ -207,6 +242,8 @@ def create_project_ep():
 
     new_project = create_project(session['UserID'], project_name, description)
     create_access_request(session['SessionID'], new_project['ProjectID'], valid, f"CREATE")
+    # The project list is built from its request log, so the new project only shows up once this row is written
+    flush_audit_log()
 
     if new_project is None:
         return make_response({'status': 'error', 'message': "Failed To Create Project"}, STATUS.INTERNAL_SERVER_ERROR)
@@ -224,14 +261,13 @@ def update_project_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
-        create_access_request(session['SessionID'], project_id, valid, f"UPDATE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
-        create_access_request(session['SessionID'], project_id, valid, f"UPDATE")
+    if not authorized:
+        create_access_request(session['SessionID'], project_id, False, f"UPDATE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     updated_project = update_project(project_id, new_project_name, new_description)
@@ -251,14 +287,13 @@ def delete_project_ep():
     project_id = int(data.get("project_id"))
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
-        create_access_request(session['SessionID'], project_id, valid, "DELETE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
-        create_access_request(session['SessionID'], project_id, valid, "DELETE")
+    if not authorized:
+        create_access_request(session['SessionID'], project_id, False, "DELETE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     create_access_request(session['SessionID'], project_id, valid, "DELETE")
@@ -273,14 +308,13 @@ def get_projects_ep():
     project_id = int(request.args.get("id"))
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
-        create_access_request(session['SessionID'], project_id, valid, "GET")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
-        create_access_request(session['SessionID'], project_id, valid, "GET")
+    if not authorized:
+        create_access_request(session['SessionID'], project_id, False, "GET")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     project = get_project_by_id(project_id)
@@ -304,10 +338,11 @@ def get_all_projects_ep():
     if not valid:
         return make_response("Not Authorized", STATUS.FORBIDDEN)
 
-    projects = get_projects_with_token(token)
-
-    if projects is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
+    try:
+        limit, after = get_page_args()
+        projects, next_page = get_projects_with_token(token, limit, after)
+    except ValueError as e:
+        return invalid_request_response(e)
 
     project_ids = [project['ProjectID'] for project in projects]
     tags_by_project = get_tags_for_projects(project_ids)
@@ -315,13 +350,52 @@ def get_all_projects_ep():
     for project in projects:
         project['tags'] = tags_by_project.get(project['ProjectID'], [])
 
-    response = make_response({'status': 'success', 'message': projects}, STATUS.OK)
-    return response
+    return page_response(projects, next_page)
+
+
+@projects_bp.route('/dashboard', methods=['GET'])
+def get_dashboard_ep():
+    project_id = int(request.args.get("id"))
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        create_access_request(session['SessionID'], project_id, False, "GET")
+        return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
+
+    try:
+        limit, _ = get_page_args()
+        panels = get_panels_arg()
+    except ValueError as e:
+        return invalid_request_response(e)
+
+    dashboard, next_pages = get_dashboard(project_id, limit, panels)
+
+    if dashboard is None:
+        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.NOT_FOUND)
+
+    create_access_request(session['SessionID'], project_id, True, "GET")
+    return page_response(dashboard, next_pages or None)
 
 
 @projects_bp.route('/last_update', methods=['GET'])
 def last_update():
     project_id = int(request.args.get("id"))
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        return make_response({'status': 'error', 'message': "Not Authorized To Access"}, STATUS.FORBIDDEN)
+
     time = get_last_update(project_id)
     if time is None:
         return make_response({"project_id": project_id, "last_update": "Null"}, STATUS.OK)
@@ -4,136 +4,88 @@ from datetime import datetime
 
 recipe_bp = Blueprint('recipes', __name__, url_prefix='/recipes')
 from .db import get_db_connection
-from .sessions import verify_session_for_access
-from .pages import authorized_page_access
-from .projects import authorized_project_access
+from .authorization import verify_resource_access
+from .audit import log_request
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .projection import get_fields_arg
+from .tables import Table, fetch_row, fetch_rows
 
 recipe_fields = ['RecipeID', 'PageID', 'name', 'description', 'content', 'timeCreated', 'lastEditTime']
+recipe_table = Table('recipes', recipe_fields, timestamps=['timeCreated', 'lastEditTime'])
 
 
 def log_access(recipe_id, allowed, notes):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO reciperequests (RecipeID, accessGranted, notes)
-        VALUES (%s, %s, %s);
-    """, (recipe_id, allowed, notes))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-
-def convert_time(object):
-    object['timeCreated'] = object['timeCreated'].timestamp()
-    object['lastEditTime'] = object['lastEditTime'].timestamp()
-    return object
+    log_request('reciperequests', recipe_id, allowed, notes)
 
 
 def get_last_update(recipe_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT lastEditTime FROM recipes where RecipeID = %s;", (recipe_id,))
-    last_update = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {recipe_table.column('lastEditTime')} FROM recipes where RecipeID = %s;", (recipe_id,))
+        last_update = cursor.fetchone()
     if last_update is not None:
-        return last_update[0].timestamp()
+        return last_update[0]
     return None
 
 
 def delete_recipe(recipe_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM recipes where RecipeID = %s;", (recipe_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM recipes where RecipeID = %s;", (recipe_id,))
 
 
 def update_recipe(recipe_id, name, description, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE recipes SET name = %s, description = %s, content = %s, lastEditTime = %s
-        WHERE RecipeID = %s
-        RETURNING *;
-    """, (name, description, content, datetime.now(), recipe_id,))
-    recipe = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if recipe is not None:
-        recipe = {k: v for k, v in zip(recipe_fields, recipe)}
-        recipe = convert_time(recipe)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE recipes SET name = %s, description = %s, content = %s, lastEditTime = %s
+            WHERE RecipeID = %s
+            RETURNING {recipe_table.select()};
+        """, (name, description, content, datetime.now(), recipe_id,))
+        recipe = fetch_row(cursor)
     return recipe
 
 
 def get_recipe_by_id(recipe_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM recipes where RecipeID = %s;", (recipe_id,))
-    recipe = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if recipe is not None:
-        recipe = {k: v for k, v in zip(recipe_fields, recipe)}
-        recipe = convert_time(recipe)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {recipe_table.select()} FROM recipes where RecipeID = %s;", (recipe_id,))
+        recipe = fetch_row(cursor)
     return recipe
 
 
-def get_recipes_by_page(page_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM recipes where PageID = %s;", (page_id,))
-    recipes = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if recipes is not None:
-        recipe_list = []
-        for recipe in recipes:
-            recipe = {k: v for k, v in zip(recipe_fields, recipe)}
-            recipe = convert_time(recipe)
-            recipe_list.append(recipe)
-        return recipe_list
-    return None
+def get_recipes_by_page(page_id, limit=None, after=None, fields=recipe_fields):
+    condition, order_by = keyset(['recipes.RecipeID'], after)
+    columns = recipe_table.select(fields)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {columns} FROM recipes where PageID = %s{condition} {order_by} LIMIT %s;",
+                       (page_id, *(after or []), fetch_limit(limit)))
+        recipes = fetch_rows(cursor)
+    return page_of(recipes, limit, lambda recipe: [recipe['RecipeID']])
 
 
-def get_recipes_by_project(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    SELECT recipes.*, pages.pageID FROM recipes 
+def fetch_recipes_by_project(cursor, project_id, limit=None, after=None, fields=recipe_fields):
+    condition, order_by = keyset(['recipes.RecipeID'], after)
+    columns = recipe_table.select(fields)
+    cursor.execute(f"""
+    SELECT {columns}, pages.PageID AS "pageID" FROM recipes
     inner join pages on pages.pageID = recipes.pageID
-    where pages.projectID = %s;
-    """, (project_id,))
-    recipes = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if recipes is not None:
-        recipe_list = []
-        for recipe in recipes:
-            recipe = {k: v for k, v in zip(recipe_fields + ['pageID'], recipe)}
-            recipe = convert_time(recipe)
-            recipe_list.append(recipe)
-        return recipe_list
-    return None
+    where pages.projectID = %s{condition}
+    {order_by} LIMIT %s;
+    """, (project_id, *(after or []), fetch_limit(limit)))
+    recipes = fetch_rows(cursor)
+    return page_of(recipes, limit, lambda recipe: [recipe['RecipeID']])
+
+
+def get_recipes_by_project(project_id, limit=None, after=None, fields=recipe_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_recipes_by_project(cursor, project_id, limit, after, fields)
 
 
 def create_recipe(page_id, name, description, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO recipes (PageID, name, description, content, lastEditTime)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING *;
-    """, (page_id, name, description, content, datetime.now()))
-    new_recipe = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if new_recipe is not None:
-        new_recipe = {k: v for k, v in zip(recipe_fields, new_recipe)}
-        new_recipe = convert_time(new_recipe)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO recipes (PageID, name, description, content, lastEditTime)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING {recipe_table.select()};
+        """, (page_id, name, description, content, datetime.now()))
+        new_recipe = fetch_row(cursor)
     return new_recipe
 
 
@@ -152,12 +104,12 @@ def create_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     new_recipe = create_recipe(page_id, name, description, content)
@@ -176,18 +128,18 @@ def get_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'recipe', recipe_id)
 
     if not valid:
         log_access(recipe_id, valid, "GET")
         return make_response("Invalid Session", STATUS.FORBIDDEN)
 
-    recipe = get_recipe_by_id(recipe_id)
-
-    if not authorized_page_access(token, recipe['PageID']):
+    if not authorized:
         log_access(recipe_id, False, "GET")
         return make_response("Not Authorized To Access Recipe", STATUS.FORBIDDEN)
 
+    recipe = get_recipe_by_id(recipe_id)
+
     if recipe is None:
         return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
 
@@ -202,21 +154,22 @@ def get_all_by_page_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response("Invalid Session", STATUS.FORBIDDEN)
 
-    recipes = get_recipes_by_page(page_id)
-
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response("Not Authorized To Access Recipe", STATUS.FORBIDDEN)
 
-    if recipes is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(recipe_fields)
+        recipes, next_page = get_recipes_by_page(page_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    response = make_response({'status': 'success', 'message': recipes}, STATUS.OK)
-    return response
+    return page_response(recipes, next_page)
 
 
 @recipe_bp.route('/get_all_by_project', methods=['GET'])
@@ -225,21 +178,22 @@ def get_all_by_project_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Cannot Access Project"}, STATUS.FORBIDDEN)
 
-    recipes = get_recipes_by_project(project_id)
-
-    if recipes is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(recipe_fields)
+        recipes, next_page = get_recipes_by_project(project_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    response = make_response({'status': 'success', 'message': recipes}, STATUS.OK)
-    return response
+    return page_response(recipes, next_page)
 
 
 @recipe_bp.route('/update', methods=['PATCH'])
@@ -252,15 +206,13 @@ def update_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'recipe', recipe_id)
 
     if not valid:
         log_access(recipe_id, valid, "UPDATE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    recipe = get_recipe_by_id(recipe_id)
-
-    if not authorized_page_access(token, recipe['PageID']):
+    if not authorized:
         log_access(recipe_id, False, "UPDATE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
@@ -281,18 +233,18 @@ def delete_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'recipe', recipe_id)
 
     if not valid:
         log_access(recipe_id, valid, "DELETE")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    recipe = get_recipe_by_id(recipe_id)
-
-    if not authorized_page_access(token, recipe['PageID']):
+    if not authorized:
         log_access(recipe_id, False, "DELETE")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    recipe = get_recipe_by_id(recipe_id)
+
     log_access(recipe_id, valid, "DELETE")
     delete_recipe(recipe_id)
 
@@ -303,6 +255,17 @@ def delete_ep():
 @recipe_bp.route('/last_update', methods=['GET'])
 def last_update():
     recipe_id = int(request.args.get("id"))
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'recipe', recipe_id)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        return make_response({'status': 'error', 'message': "Not Authorized To Access"}, STATUS.FORBIDDEN)
+
     time = get_last_update(recipe_id)
     if time is None:
         return make_response({"recipe_id": recipe_id, "last_update": "Null"}, STATUS.OK)
@@ -0,0 +1,301 @@
+from flask import Blueprint, jsonify, request, make_response
+from http import HTTPStatus as STATUS
+from datetime import datetime, timedelta
+from difflib import SequenceMatcher, unified_diff
+import argparse
+import json
+import sys
+import time
+import zlib
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+revisions_bp = Blueprint('revisions', __name__, url_prefix='/revisions')
+from .configuration import load_config
+from .db import get_db_connection
+from .authorization import verify_resource_access
+from .logging import create_page_access_request
+
+config = load_config()
+
+revision_fields = ['revision', 'snapshot', 'savedTime']
+
+
+def make_delta(new_content, old_content):
+    """
+    Line splices [start, delete_count, lines] that turn new_content back into old_content.
+    """
+    new_lines = new_content.splitlines(keepends=True)
+    old_lines = old_content.splitlines(keepends=True)
+    delta = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, new_lines, old_lines).get_opcodes():
+        if tag != 'equal':
+            delta.append([i1, i2 - i1, old_lines[j1:j2]])
+    return delta
+
+
+def apply_delta(content, delta):
+    lines = content.splitlines(keepends=True)
+    result, position = [], 0
+    for start, delete_count, insert in delta:
+        result.extend(lines[position:start])
+        result.extend(insert)
+        position = start + delete_count
+    result.extend(lines[position:])
+    return ''.join(result)
+
+
+def encode_revision(content, newer_content, snapshot):
+    if snapshot:
+        return zlib.compress(content.encode())
+    return zlib.compress(json.dumps(make_delta(newer_content, content)).encode())
+
+
+def decode_revision(data, snapshot, newer_content):
+    data = zlib.decompress(bytes(data)).decode()
+    if snapshot:
+        return data
+    return apply_delta(newer_content, json.loads(data))
+
+
+def record_revision(cursor, page_id, revision, saved_time, content, new_content):
+    """
+    Stores revision of a page, last saved at saved_time, as it is replaced by new_content. Must run in the
+    transaction that saves new_content, with the page row locked. Stored revisions are thinned later, by
+    compact_all_revisions.
+    """
+    cursor.execute("""
+        SELECT count(*) FROM pageRevisions
+        WHERE PageID = %s AND revision > (SELECT coalesce(max(revision), -1) FROM pageRevisions
+                                          WHERE PageID = %s AND snapshot)
+    """, (page_id, page_id))
+    snapshot = cursor.fetchone()[0] + 1 >= config['revisions']['snapshot_interval']
+
+    cursor.execute("""
+        INSERT INTO pageRevisions (PageID, revision, snapshot, data, savedTime)
+        VALUES (%s, %s, %s, %s, %s);
+    """, (page_id, revision, snapshot, encode_revision(content, new_content, snapshot), saved_time))
+
+
+def revision_bucket(saved_time, now):
+    # Revisions sharing a bucket are merged into the newest of them; None means the revision is always kept
+    if saved_time >= now - timedelta(hours=config['revisions']['keep_all_hours']):
+        return None
+    if saved_time >= now - timedelta(days=config['revisions']['hourly_days']):
+        return saved_time.replace(minute=0, second=0, microsecond=0)
+    return saved_time.date()
+
+
+def compact_page_revisions(cursor, page_id, current_content):
+    """
+    Thins the stored revisions of a page to the checkpoints given by revision_bucket and re-encodes the ones kept
+    against their new neighbours. Returns the number of revisions dropped.
+    """
+    cursor.execute("""
+        SELECT revision, snapshot, data, savedTime FROM pageRevisions
+        WHERE PageID = %s ORDER BY revision DESC;
+    """, (page_id,))
+    stored = cursor.fetchall()
+
+    now = datetime.now()
+    kept, dropped = [], 0
+    newer_content = kept_content = current_content
+    last_bucket = None
+    since_snapshot = 0
+    for revision, snapshot, data, saved_time in stored:
+        content = decode_revision(data, snapshot, newer_content)
+        newer_content = content
+
+        bucket = revision_bucket(saved_time, now)
+        if bucket is not None and bucket == last_bucket:
+            dropped += 1
+            continue
+        last_bucket = bucket
+
+        since_snapshot += 1
+        snapshot = since_snapshot >= config['revisions']['snapshot_interval']
+        if snapshot:
+            since_snapshot = 0
+        kept.append((page_id, revision, snapshot, encode_revision(content, kept_content, snapshot), saved_time))
+        kept_content = content
+
+    if dropped:
+        cursor.execute("DELETE FROM pageRevisions WHERE PageID = %s;", (page_id,))
+        execute_values(cursor, """
+            INSERT INTO pageRevisions (PageID, revision, snapshot, data, savedTime) VALUES %s;
+        """, kept)
+    return dropped
+
+
+def compactable_pages_query(now):
+    """
+    The pages with two or more revisions in one of revision_bucket's hours or days, which are the ones compacting
+    would drop revisions of, and its parameters.
+    """
+    keep_all_after = now - timedelta(hours=config['revisions']['keep_all_hours'])
+    hourly_after = now - timedelta(days=config['revisions']['hourly_days'])
+    return """
+        SELECT PageID FROM pageRevisions
+        WHERE savedTime < %s
+        GROUP BY PageID
+        HAVING count(*) > count(DISTINCT CASE WHEN savedTime >= %s THEN date_trunc('hour', savedTime)
+                                              ELSE date_trunc('day', savedTime) END);
+    """, (keep_all_after, hourly_after)
+
+
+def compact_all_revisions():
+    """
+    Compacts the revisions of every page that has revisions to drop, returning how many were dropped. Saves don't
+    compact, so this runs periodically, see compact_revisions_every.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(*compactable_pages_query(datetime.now()))
+        page_ids = [row[0] for row in cursor.fetchall()]
+
+    dropped = 0
+    for page_id in page_ids:
+        # One transaction per page, holding the page lock so no save interleaves with the rewrite
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT content FROM pages where PageID = %s FOR UPDATE;", (page_id,))
+            page = cursor.fetchone()
+            if page is not None:
+                dropped += compact_page_revisions(cursor, page_id, page[0])
+    return dropped
+
+
+def compact_revisions_every(minutes):
+    # Runs compact_all_revisions forever, every minutes minutes. A failed pass, as when the database is down or not
+    # migrated yet, is retried at the next one.
+    while True:
+        try:
+            print(f"Dropped {compact_all_revisions()} revisions", flush=True)
+        except psycopg2.Error as e:
+            print(f"Compaction failed: {e}", file=sys.stderr, flush=True)
+        time.sleep(minutes * 60)
+
+
+def get_revisions(page_id):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT revision, extract(epoch from lastEditTime)::float8 FROM pages where PageID = %s;",
+                       (page_id,))
+        current = cursor.fetchone()
+        cursor.execute("""
+            SELECT revision, snapshot, extract(epoch from savedTime)::float8 FROM pageRevisions
+            WHERE PageID = %s ORDER BY revision DESC;
+        """, (page_id,))
+        stored = cursor.fetchall()
+    if current is None:
+        return None
+    revisions = [{'revision': current[0], 'snapshot': True, 'savedTime': current[1]}]
+    revisions += [{k: v for k, v in zip(revision_fields, row)} for row in stored]
+    return revisions
+
+
+def get_revision(page_id, revision):
+    """
+    Rebuilds a revision of a page from the nearest snapshot at or after it, or from the current content. Returns
+    {'revision', 'content', 'savedTime'}, or None if the page has no such revision (or it has been compacted away).
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT content, revision, extract(epoch from lastEditTime)::float8 FROM pages where PageID = %s;
+        """, (page_id,))
+        current = cursor.fetchone()
+        if current is None:
+            return None
+        content, current_revision, saved_time = current
+        if revision == current_revision:
+            return {'revision': revision, 'content': content, 'savedTime': saved_time}
+
+        cursor.execute("""
+            SELECT revision, snapshot, data, extract(epoch from savedTime)::float8 FROM pageRevisions
+            WHERE PageID = %s AND revision >= %s
+              AND revision <= coalesce((SELECT min(revision) FROM pageRevisions
+                                        WHERE PageID = %s AND revision >= %s AND snapshot), %s)
+            ORDER BY revision DESC;
+        """, (page_id, revision, page_id, revision, current_revision))
+        chain = cursor.fetchall()
+
+    if not chain or chain[-1][0] != revision:
+        return None
+    for _, snapshot, data, saved_time in chain:
+        content = decode_revision(data, snapshot, content)
+    return {'revision': revision, 'content': content, 'savedTime': saved_time}
+
+
+def get_revision_args():
+    page_id = int(request.args.get("page_id"))
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
+
+    if not valid:
+        return page_id, make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        create_page_access_request(session['SessionID'], page_id, False, "GET")
+        return page_id, make_response({'status': 'error', 'message': "Not Authorized To Access Page"}, STATUS.FORBIDDEN)
+
+    create_page_access_request(session['SessionID'], page_id, True, "GET")
+    return page_id, None
+
+
+@revisions_bp.route('/test', methods=['GET'])
+def test_ep():
+    return jsonify({"test": "Revisions Endpoint Reached."})
+
+
+@revisions_bp.route('/list', methods=['GET'])
+def list_ep():
+    page_id, error = get_revision_args()
+    if error is not None:
+        return error
+
+    revisions = get_revisions(page_id)
+
+    if revisions is None:
+        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.NOT_FOUND)
+
+    return make_response({'status': 'success', 'message': revisions}, STATUS.OK)
+
+
+@revisions_bp.route('/get', methods=['GET'])
+def get_ep():
+    page_id, error = get_revision_args()
+    if error is not None:
+        return error
+
+    revision = get_revision(page_id, int(request.args.get("revision")))
+
+    if revision is None:
+        return make_response({'status': 'error', 'message': "Revision Does Not Exist"}, STATUS.NOT_FOUND)
+
+    return make_response({'status': 'success', 'message': revision}, STATUS.OK)
+
+
+@revisions_bp.route('/diff', methods=['GET'])
+def diff_ep():
+    page_id, error = get_revision_args()
+    if error is not None:
+        return error
+
+    old = get_revision(page_id, int(request.args.get("from")))
+    new = get_revision(page_id, int(request.args.get("to")))
+
+    if old is None or new is None:
+        return make_response({'status': 'error', 'message': "Revision Does Not Exist"}, STATUS.NOT_FOUND)
+
+    diff = unified_diff(old['content'].splitlines(keepends=True), new['content'].splitlines(keepends=True),
+                        fromfile=f"revision {old['revision']}", tofile=f"revision {new['revision']}")
+    return make_response({'status': 'success', 'message': ''.join(diff)}, STATUS.OK)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compacts the stored revisions of every page.")
+    parser.add_argument("--periodic", action="store_true",
+                        help="keep running, compacting every [revisions] compact_interval_minutes")
+    if parser.parse_args().periodic:
+        compact_revisions_every(config['revisions']['compact_interval_minutes'])
+    else:
+        print(f"Dropped {compact_all_revisions()} revisions")
@@ -0,0 +1,258 @@
+from flask import Blueprint, jsonify, request, make_response
+from http import HTTPStatus as STATUS
+
+search_bp = Blueprint('search', __name__, url_prefix='/search')
+from .configuration import load_config
+from .db import get_db_connection
+from .sessions import verify_session_for_access
+from .pagination import invalid_request_response
+
+config = load_config()
+
+search_fields = ['type', 'id', 'name', 'page_id', 'project_id', 'rank', 'headline']
+
+# For each searchable type: the table, its ID column, the column shown as the result name, the text the highlighted
+# fragments are taken from, the text search configuration of its searchVector (see migrations/0010_search_vectors.sql)
+# and whether it hangs off a page or a project.
+search_sources = {
+    'page': ('pages', 'PageID', 'name', 'left(pages.content, 500000)', 'english', 'project'),
+    'snippet': ('codesnippets', 'CodeID', 'name',
+                "codesnippets.description || E'\\n' || left(codesnippets.content, 500000)", 'english', 'page'),
+    'recipe': ('recipes', 'RecipeID', 'name',
+               "recipes.description || E'\\n' || left(recipes.content, 500000)", 'english', 'page'),
+    'equation': ('equations', 'EquationID', 'name',
+                 "equations.description || E'\\n' || left(equations.content, 500000)", 'english', 'page'),
+    'translation': ('translations', 'TranslationID', 'language',
+                    "left(coalesce(translations.content, ''), 500000)", 'simple', 'page'),
+    'canvas': ('canvas', 'CanvasID', 'name', 'canvas.description', 'english', 'page'),
+}
+
+typeahead_fields = ['type', 'id', 'name', 'project_id', 'page_id', 'score']
+
+# For each type with a looked-up name: the table, its ID column, its name column (trigram indexed in
+# migrations/0011_name_trigram_indexes.sql), the columns giving its project and page, and whether it hangs off a page
+# or a project or belongs to the user directly.
+typeahead_sources = {
+    'project': ('projects', 'ProjectID', 'name', 'projects.ProjectID', 'NULL::integer', None),
+    'page': ('pages', 'PageID', 'name', 'pages.ProjectID', 'pages.PageID', 'project'),
+    'tag': ('tags', 'TagID', 'tag', 'NULL::integer', 'NULL::integer', None),
+    'snippet': ('codesnippets', 'CodeID', 'name', 'pages.ProjectID', 'codesnippets.PageID', 'page'),
+    'file': ('files', 'FileID', 'filename', 'pages.ProjectID', 'files.PageID', 'page'),
+}
+
+
+def search_branch(resource):
+    """
+    SELECT of the matches of one type, with the columns of search_fields but the headline, which is only computed for
+    the rows that make it onto the requested page of results.
+    """
+    table, id_column, name_column, _, language, parent = search_sources[resource]
+    if parent == 'page':
+        joins = f"""
+            inner join pages on pages.PageID = {table}.PageID
+            inner join projects on projects.ProjectID = pages.ProjectID"""
+    else:
+        joins = f"""
+            inner join projects on projects.ProjectID = {table}.ProjectID"""
+    return f"""
+        SELECT '{resource}' AS type, {table}.{id_column} AS id, {table}.{name_column}::text AS name,
+          {table}.PageID AS page_id, projects.ProjectID AS project_id,
+          ts_rank_cd({table}.searchVector, search_query.{language}) AS rank
+        FROM search_query, {table}{joins}
+        WHERE {table}.searchVector @@ search_query.{language} AND projects.UserID = %(user_id)s
+          AND (%(project_id)s::integer IS NULL OR projects.ProjectID = %(project_id)s)"""
+
+
+def headline_expression():
+    # Looks up the text of each result type by ID, so content is only read for the rows being returned
+    cases = []
+    for resource, (table, id_column, _, text, language, _) in search_sources.items():
+        cases.append(f"""
+            WHEN '{resource}' THEN ts_headline('{language}', (SELECT {text} FROM {table}
+                                                              WHERE {table}.{id_column} = hits.id),
+                                               search_query.{language}, %(headline_options)s)""")
+    return f"CASE hits.type {''.join(cases)} END"
+
+
+def search_query(user_id, terms, types, project_id, limit, offset):
+    query = f"""
+        WITH search_query AS (
+          SELECT websearch_to_tsquery('english', %(terms)s) AS english,
+                 websearch_to_tsquery('simple', %(terms)s) AS simple
+        ),
+        hits AS (
+          SELECT * FROM ({' UNION ALL '.join(search_branch(resource) for resource in types)}) matches
+          ORDER BY rank DESC, type, id
+          LIMIT %(limit)s OFFSET %(offset)s
+        )
+        SELECT hits.type, hits.id, hits.name, hits.page_id, hits.project_id, hits.rank, {headline_expression()}
+        FROM hits, search_query
+        ORDER BY hits.rank DESC, hits.type, hits.id;
+    """
+    params = {
+        'terms': terms,
+        'user_id': user_id,
+        'project_id': project_id,
+        # One extra row tells whether there is another page
+        'limit': limit + 1,
+        'offset': offset,
+        'headline_options': config['search']['headline_options'],
+    }
+    return query, params
+
+
+def search(user_id, terms, types, project_id, limit, offset):
+    """
+    Returns (results, next) for a web-search style query (quoted phrases, OR, -excluded) over the user's projects,
+    best match first. next is the offset of the following page, or None when there are no more results.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(*search_query(user_id, terms, types, project_id, limit, offset))
+        results = [{k: v for k, v in zip(search_fields, row)} for row in cursor.fetchall()]
+
+    next_offset = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_offset = offset + limit
+    return results, next_offset
+
+
+def typeahead_branch(resource):
+    """
+    The best matches of one type, as a parenthesised SELECT with the columns of typeahead_fields. Names starting with
+    the term score 1, others their word similarity to it.
+    """
+    table, id_column, name_column, project_column, page_column, parent = typeahead_sources[resource]
+    owner = f"{table}.UserID"
+    joins = ""
+    if parent == 'page':
+        owner = "projects.UserID"
+        joins = f"""
+            inner join pages on pages.PageID = {table}.PageID
+            inner join projects on projects.ProjectID = pages.ProjectID"""
+    elif parent == 'project':
+        owner = "projects.UserID"
+        joins = f"""
+            inner join projects on projects.ProjectID = {table}.ProjectID"""
+    name = f"{table}.{name_column}"
+    return f"""
+        (SELECT '{resource}' AS type, {table}.{id_column} AS id, {name}::text AS name,
+           {project_column} AS project_id, {page_column} AS page_id,
+           CASE WHEN {name} ILIKE %(prefix)s THEN 1.0 ELSE word_similarity(%(term)s, {name}) END AS score
+         FROM {table}{joins}
+         WHERE ({name} ILIKE %(prefix)s OR %(term)s <%% {name}) AND {owner} = %(user_id)s
+         ORDER BY score DESC, length({name}), {name}
+         LIMIT %(limit)s)"""
+
+
+def typeahead_query(user_id, term, types, limit):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    query = f"""
+        SELECT * FROM ({' UNION ALL '.join(typeahead_branch(resource) for resource in types)}) matches
+        ORDER BY score DESC, length(name), name
+        LIMIT %(limit)s;
+    """
+    params = {'term': term, 'prefix': escaped + '%', 'user_id': user_id, 'limit': limit}
+    return query, params
+
+
+def typeahead(user_id, term, types, limit):
+    """
+    Returns the limit names of the user's projects, pages, tags, snippets and files that best match term, in one
+    query. Each type contributes at most limit candidates, found through its trigram index.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true);",
+                       (str(config['search']['word_similarity_threshold']),))
+        cursor.execute(*typeahead_query(user_id, term, types, limit))
+        matches = [{k: v for k, v in zip(typeahead_fields, row)} for row in cursor.fetchall()]
+    for match in matches:
+        match['score'] = float(match['score'])
+    return matches
+
+
+def get_result_args(default_limit, max_limit):
+    """
+    Returns (limit, offset) from ?limit= and ?offset=, the limit kept between 1 and max_limit. Raises ValueError for
+    an argument that is not an integer.
+    """
+    try:
+        limit = int(request.args.get("limit", default_limit))
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        raise ValueError("Invalid limit or offset")
+    return max(1, min(limit, max_limit)), max(offset, 0)
+
+
+@search_bp.route('/test', methods=['GET'])
+def test_ep():
+    return jsonify({"test": "Search Endpoint Reached."})
+
+
+@search_bp.route('/query', methods=['GET'])
+def query_ep():
+    """
+    ?q=terms, optionally &types=page,snippet,... &project_id= &limit= &offset=. Headlines mark matches with the
+    configured selectors and are not HTML-escaped.
+    """
+    terms = request.args.get("q", "").strip()
+    if not terms:
+        return make_response({'status': 'error', 'message': "Missing q"}, STATUS.BAD_REQUEST)
+
+    types = list(search_sources)
+    if request.args.get("types") is not None:
+        types = [t.strip() for t in request.args.get("types").split(",") if t.strip()]
+        if not types or any(t not in search_sources for t in types):
+            return make_response({'status': 'error', 'message': "Unknown Type"}, STATUS.BAD_REQUEST)
+
+    project_id = request.args.get("project_id")
+    if project_id is not None:
+        project_id = int(project_id)
+    try:
+        limit, offset = get_result_args(config['search']['default_limit'], config['search']['max_limit'])
+    except ValueError as e:
+        return invalid_request_response(e)
+
+    token = request.cookies.get("token")
+
+    valid, session = verify_session_for_access(token)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    results, next_offset = search(session['UserID'], terms, types, project_id, limit, offset)
+
+    message = {'status': 'success', 'message': results}
+    if next_offset is not None:
+        message['next'] = {'offset': next_offset}
+    return make_response(message, STATUS.OK)
+
+
+@search_bp.route('/typeahead', methods=['GET'])
+def typeahead_ep():
+    """
+    ?q=partial name, optionally &types=project,page,tag,snippet,file &limit=
+    """
+    term = request.args.get("q", "").strip()
+    if not term:
+        return make_response({'status': 'error', 'message': "Missing q"}, STATUS.BAD_REQUEST)
+
+    types = list(typeahead_sources)
+    if request.args.get("types") is not None:
+        types = [t.strip() for t in request.args.get("types").split(",") if t.strip()]
+        if not types or any(t not in typeahead_sources for t in types):
+            return make_response({'status': 'error', 'message': "Unknown Type"}, STATUS.BAD_REQUEST)
+
+    try:
+        limit, _ = get_result_args(config['search']['typeahead_limit'], config['search']['typeahead_max_limit'])
+    except ValueError as e:
+        return invalid_request_response(e)
+
+    token = request.cookies.get("token")
+
+    valid, session = verify_session_for_access(token)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    return make_response({'status': 'success', 'message': typeahead(session['UserID'], term, types, limit)}, STATUS.OK)
@@ -1,14 +1,88 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, g
 import secrets
 import base64
+import threading
+import time
 
 from .configuration import load_config
 from .db import get_db_connection
+from .notifications import listen
 
 config = load_config()
 sessions_bp = Blueprint('sessions', __name__, url_prefix='/sessions')
 sessions_fields = ['SessionID', 'UserID', 'startTime', 'endTime', 'token', 'ipAddress', 'isActive']
+# Named rather than *, so a column added to sessions doesn't shift the rows zipped with sessions_fields
+sessions_columns = ', '.join(f'sessions.{field}' for field in sessions_fields)
+invalidation_channel = 'session_invalidations'
+
+
+class SessionCache:
+    """
+    Bounded LRU cache of validated sessions keyed by token. An entry lives for at most ttl_seconds and never past the
+    session's endTime, so a missed invalidation can only extend a revoked session by the TTL.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            session, expires = entry
+            if expires < time.monotonic() or session['endTime'] < datetime.now():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return session
+
+    def put(self, session):
+        with self._lock:
+            self._entries[session['token']] = (session, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(session['token'])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in [t for t, (session, _) in self._entries.items() if session['UserID'] == user_id]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+session_cache = SessionCache(config['sessions']['cache_size'], config['sessions']['cache_ttl_seconds'])
+_listening = False
+
+
+def handle_invalidation(payload):
+    """
+    Payloads are either a token or 'user:<UserID>' when every session of a user is revoked.
+    """
+    if payload.startswith('user:'):
+        session_cache.invalidate_user(int(payload[len('user:'):]))
+    else:
+        session_cache.invalidate(payload)
+
+
+def listen_for_invalidations():
+    global _listening
+    if _listening or not config['sessions']['listen_for_invalidations']:
+        return
+    _listening = True
+    listen(invalidation_channel, handle_invalidation, on_reconnect=session_cache.clear)
 
 
 def generate_token():
@@ -22,15 +96,11 @@ def create_session(user_id, ip):
     token = generate_token()
     start_time = datetime.now()
     end_time = start_time + timedelta(seconds=config['app']['session_life_seconds'])
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO sessions (UserID, startTime, endTime, token, ipAddress, isActive)
-        VALUES (%s, %s, %s, %s, %s, %s);
-    """, (user_id, start_time, end_time, token, ip, True))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO sessions (UserID, startTime, endTime, token, ipAddress, isActive)
+            VALUES (%s, %s, %s, %s, %s, %s);
+        """, (user_id, start_time, end_time, token, ip, True))
 
     if verify_session(token, user_id):
         return token
@@ -38,55 +108,75 @@ def create_session(user_id, ip):
         return None
 
 
-def verify_session(token, user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM sessions where token = %s;", (token,))
-    session = cursor.fetchone()
-    cursor.close()
-    conn.close()
+def get_active_session(token):
+    """
+    Returns the session for token if it is active and unexpired, from the cache when possible.
+    """
+    if token is None:
+        return None
+
+    session = session_cache.get(token)
+    if session is not None:
+        return session
+
+    listen_for_invalidations()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {sessions_columns} FROM sessions where token = %s;", (token,))
+        session = cursor.fetchone()
     if session is None:
-        return False
+        return None
 
     session = {k: v for k, v in zip(sessions_fields, session)}
+    return cache_session(session)
 
-    if session['UserID'] != user_id:
-        return False
 
+def cache_session(session):
+    """
+    Caches session if it is still valid. Returns the session, or None if it is inactive or expired.
+    """
     if (session['endTime'] >= datetime.now()) and (session['isActive']):
-        return True
-    else:
+        session_cache.put(session)
+        return session
+    return None
+
+
+def verify_session(token, user_id):
+    session = get_active_session(token)
+    if session is None:
         return False
 
+    if session['UserID'] != user_id:
+        return False
+
+    return True
+
 
 def verify_session_for_access(token):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM sessions where token = %s;", (token,))
-    session = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    session = get_active_session(token)
     if session is None:
         return False, None
 
-    session = {k: v for k, v in zip(sessions_fields, session)}
-
-    if (session['endTime'] >= datetime.now()) and (session['isActive']):
-        return True, session
-    else:
-        return False, None
+    g.session = session
+    return True, session
 
 
 def deactivate_session(token):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE sessions SET isActive = FALSE where token = %s;", (token,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("UPDATE sessions SET isActive = FALSE where token = %s;", (token,))
+        cursor.execute("SELECT pg_notify(%s, %s);", (invalidation_channel, token))
+    session_cache.invalidate(token)
     return
 
 
+def invalidate_user_sessions(user_id):
+    """
+    Drops every cached session of user_id in this and all other worker processes, e.g. after the user is deleted.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s);", (invalidation_channel, f'user:{user_id}'))
+    session_cache.invalidate_user(user_id)
+
+
 @sessions_bp.route('/test', methods=['GET'])
 def test_ep():
     return jsonify({"test": "Sessions  Endpoint Reached."})
@@ -0,0 +1,52 @@
+from flask import Response, current_app, stream_with_context
+from http import HTTPStatus as STATUS
+
+from .configuration import load_config
+from .db import get_db_connection
+
+config = load_config()
+
+# Streamed lists. The body is the usual {"status", "message", "next"} envelope, but the rows of message are read from
+# a server-side cursor and encoded as they arrive, so the worker holds one batch of rows at a time however long the
+# list is. Once the body has started the status can no longer change: a failure part way ends the response early,
+# leaving invalid JSON that the client sees as an error.
+
+
+def stream_page(query, params, limit, next_page, item=None):
+    """
+    Response streaming the rows of query, which selects at most limit + 1 rows as fetch_limit does (or all of them
+    when limit is None), as dicts keyed by column name. item(row) gives what is sent for a row, the row itself by
+    default. When there is a row past limit, next is next_page(last row sent).
+    """
+    json = current_app.json
+
+    def rows():
+        sent, last, more = 0, None, False
+        buffer = [b'{"status":"success","message":[']
+        buffered = 0
+        with get_db_connection() as conn, conn.cursor(name="stream") as cursor:
+            cursor.itersize = config['streaming']['fetch_size']
+            cursor.execute(query, params)
+            names = None
+            for row in cursor:
+                if names is None:
+                    # A named cursor only has a description once it has fetched
+                    names = [column.name for column in cursor.description]
+                if limit is not None and sent == limit:
+                    more = True
+                    break
+                row = dict(zip(names, row))
+                encoded = json.dump_bytes(row if item is None else item(row))
+                buffer.append(encoded if sent == 0 else b',' + encoded)
+                buffered += len(encoded) + 1
+                sent, last = sent + 1, row
+                if buffered >= config['streaming']['chunk_bytes']:
+                    yield b''.join(buffer)
+                    buffer, buffered = [], 0
+        buffer.append(b']')
+        if more:
+            buffer.append(b',"next":' + json.dump_bytes(next_page(last)))
+        buffer.append(b'}')
+        yield b''.join(buffer)
+
+    return Response(stream_with_context(rows()), status=STATUS.OK, mimetype=json.mimetype)
@@ -0,0 +1,98 @@
+from flask import Blueprint, jsonify, request, make_response
+from http import HTTPStatus as STATUS
+
+sync_bp = Blueprint('sync', __name__, url_prefix='/sync')
+from .db import get_db_connection
+from .sessions import verify_session_for_access
+
+# For each resource type: the table, its ID and last-modified columns, and whether it hangs off a page or a project.
+# The type names match the resources in authorization.py.
+last_update_sources = {
+    'project': ('projects', 'ProjectID', 'lastUpdate', None),
+    'todo': ('todo', 'TodoID', 'lastUpdate', 'project'),
+    'event': ('events', 'EventID', 'lastUpdate', 'project'),
+    'page': ('pages', 'PageID', 'lastEditTime', 'project'),
+    'canvas': ('canvas', 'CanvasID', 'lastEditTime', 'page'),
+    'equation': ('equations', 'EquationID', 'lastEditTime', 'page'),
+    'recipe': ('recipes', 'RecipeID', 'lastEditTime', 'page'),
+    'snippet': ('codesnippets', 'CodeID', 'lastEditTime', 'page'),
+    'translation': ('translations', 'TranslationID', 'lastEditTime', 'page'),
+}
+
+
+def last_update_query(resource):
+    """
+    SELECT of (type, id, last update) for the resources of one type among a list of IDs that the user owns. Takes
+    the user ID and the array of IDs as parameters.
+    """
+    table, id_column, time_column, parent = last_update_sources[resource]
+    joins = ""
+    if parent == 'page':
+        joins = f"""
+            inner join pages on pages.PageID = {table}.PageID
+            inner join projects on projects.ProjectID = pages.ProjectID"""
+    elif parent == 'project':
+        joins = f"""
+            inner join projects on projects.ProjectID = {table}.ProjectID"""
+    return f"""
+        SELECT '{resource}', {table}.{id_column}, extract(epoch from {table}.{time_column})::float8
+        FROM {table}{joins}
+        WHERE projects.UserID = %s AND {table}.{id_column} = ANY(%s)"""
+
+
+def get_last_updates(user_id, requested):
+    """
+    Answers {type: [ids]} with one query. Returns {type: {id: timestamp}}; IDs that don't exist or that the user
+    doesn't own map to None, so the two cannot be told apart.
+    """
+    last_updates = {resource: {str(i): None for i in ids} for resource, ids in requested.items()}
+    if not requested:
+        return last_updates
+
+    queries, params = [], []
+    for resource, ids in requested.items():
+        queries.append(last_update_query(resource))
+        params.extend([user_id, list(ids)])
+
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("\nUNION ALL".join(queries) + ";", params)
+        rows = cursor.fetchall()
+
+    for resource, resource_id, last_update in rows:
+        last_updates[resource][str(resource_id)] = last_update
+    return last_updates
+
+
+@sync_bp.route('/test', methods=['GET'])
+def test_ep():
+    return jsonify({"test": "Sync Endpoint Reached."})
+
+
+@sync_bp.route('/last_updates', methods=['GET'])
+def last_updates_ep():
+    """
+    Query arguments are resource types with one or more IDs, e.g. ?page=3&translation=7&translation=8. Responses
+    carry an ETag so an unchanged poll sent with If-None-Match gets an empty 304.
+    """
+    requested = {}
+    for resource in request.args:
+        if resource not in last_update_sources:
+            return make_response({'status': 'error', 'message': f"Unknown Resource: {resource}"}, STATUS.BAD_REQUEST)
+        try:
+            requested[resource] = sorted({int(i) for i in request.args.getlist(resource)})
+        except ValueError:
+            return make_response({'status': 'error', 'message': "IDs Must Be Integers"}, STATUS.BAD_REQUEST)
+
+    token = request.cookies.get("token")
+
+    valid, session = verify_session_for_access(token)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    last_updates = get_last_updates(session['UserID'], requested)
+
+    response = make_response({'status': 'success', 'message': last_updates}, STATUS.OK)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
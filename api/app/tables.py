@@ -0,0 +1,44 @@
+# Declarative descriptions of the tables the API sends rows of. A Table knows the fields a row is sent with, in order,
+# the column each is read from and which are timestamps. Timestamps are converted to seconds since the epoch in the
+# query itself, so rows come out of the cursor ready to send and no per-field conversion runs in Python.
+
+
+class Table:
+    __slots__ = ('name', 'fields', 'timestamps', 'renamed')
+
+    def __init__(self, name, fields, timestamps=(), renamed=None):
+        self.name = name
+        self.fields = fields
+        self.timestamps = frozenset(timestamps)
+        # Fields sent under another name than their column's
+        self.renamed = renamed or {}
+
+    def column(self, field):
+        column = f"{self.name}.{self.renamed.get(field, field)}"
+        if field in self.timestamps:
+            # extract() returns numeric, which would reach the client as a string
+            column = f"extract(epoch from {column})::float8"
+        # Quoted so the field keeps its case in the cursor description
+        return f'{column} AS "{field}"'
+
+    def select(self, fields=None):
+        """
+        The SELECT (or RETURNING) list for fields, by default all of the table's.
+        """
+        return ', '.join(self.column(field) for field in (fields or self.fields))
+
+
+def fetch_rows(cursor):
+    """
+    The remaining rows of cursor as dicts keyed by the names in its description.
+    """
+    names = [column.name for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def fetch_row(cursor):
+    # The next row of cursor as a dict, or None if there is none
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column.name for column in cursor.description], row))
@@ -5,119 +5,84 @@ from datetime import datetime
 tags_bp = Blueprint('tags', __name__, url_prefix='/tags')
 from .db import get_db_connection
 from .sessions import verify_session_for_access
-from .projects import authorized_project_access
+from .authorization import verify_resource_access
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .projection import get_fields_arg
+from .tables import Table, fetch_row, fetch_rows
 
 tag_fields = ['TagID', 'UserID', 'tag', 'options']
+tag_table = Table('tags', tag_fields)
 
 
 def create_tag(user_id, tag, options):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO tags (UserID, tag, options)
-        VALUES (%s, %s, %s)
-        RETURNING *;
-    """, (user_id, tag, options,))
-    new_tag = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if new_tag is not None:
-        new_tag = {k: v for k, v in zip(tag_fields, new_tag)}
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO tags (UserID, tag, options)
+            VALUES (%s, %s, %s)
+            RETURNING {tag_table.select()};
+        """, (user_id, tag, options,))
+        new_tag = fetch_row(cursor)
     return new_tag
 
 
-def get_tags_by_user(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tags where UserID = %s;", (user_id,))
-    tags = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if tags is not None:
-        tag_list = []
-        for tag in tags:
-            tag = {k: v for k, v in zip(tag_fields, tag)}
-            tag_list.append(tag)
-        return tag_list
-    return None
+def get_tags_by_user(user_id, limit=None, after=None, fields=tag_fields):
+    condition, order_by = keyset(['TagID'], after)
+    columns = tag_table.select(fields)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {columns} FROM tags where UserID = %s{condition} {order_by} LIMIT %s;",
+                       (user_id, *(after or []), fetch_limit(limit)))
+        tags = fetch_rows(cursor)
+    return page_of(tags, limit, lambda tag: [tag['TagID']])
 
 
-def get_tags_by_project(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-    SELECT DISTINCT tags.TagID, tags.UserID, tags.tag, tags.options
-    FROM tags 
+def project_tags_query(project_id):
+    return (f"""
+    SELECT DISTINCT {tag_table.select()}
+    FROM tags
     JOIN tagmappings ON tags.TagID = tagmappings.TagID
     WHERE tagmappings.projectID = %s
     ORDER BY tags.tag;
     """, (project_id,))
-    tags = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if tags is not None:
-        tag_list = []
-        for tag in tags:
-            tag = {k: v for k, v in zip(tag_fields, tag)}
-            tag_list.append(tag)
-        return tag_list
-    return None
+
+
+def get_tags_by_project(project_id):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(*project_tags_query(project_id))
+        tags = fetch_rows(cursor)
+    return tags
 
 
 def get_tag_by_id(tag_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tags where TagID = %s", (tag_id,))
-    tag = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if tag is not None:
-        tag = {k: v for k, v in zip(tag_fields, tag)}
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {tag_table.select()} FROM tags where TagID = %s", (tag_id,))
+        tag = fetch_row(cursor)
     return tag
 
 
 def update_tag(tag_id, tag, options):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE tags SET tag = %s, options = %s WHERE TagID = %s RETURNING *;", (tag, options, tag_id,))
-    tag = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if tag is not None:
-        tag = {k: v for k, v in zip(tag_fields, tag)}
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"UPDATE tags SET tag = %s, options = %s WHERE TagID = %s RETURNING {tag_table.select()};",
+                       (tag, options, tag_id,))
+        tag = fetch_row(cursor)
     return tag
 
 
 def delete_tag(tag_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM tags where TagID = %s;", (tag_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM tags where TagID = %s;", (tag_id,))
 
 
 def create_mapping(tag_id, project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO tagmappings (tagID, projectID)
-        VALUES (%s, %s);
-    """, (tag_id, project_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO tagmappings (tagID, projectID)
+            VALUES (%s, %s);
+        """, (tag_id, project_id))
 
 
 def delete_mapping(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM tagmappings where projectID = %s;", (project_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM tagmappings where projectID = %s;", (project_id,))
 
 
 @tags_bp.route('/test', methods=['GET'])
@@ -156,13 +121,14 @@ def get_all_by_user_ep():
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    tags = get_tags_by_user(session['UserID'])
-
-    if tags is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.FORBIDDEN)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(tag_fields)
+        tags, next_page = get_tags_by_user(session['UserID'], limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    response = make_response({'status': 'success', 'message': tags}, STATUS.OK)
-    return response
+    return page_response(tags, next_page)
 
 
 @tags_bp.route('/get_by_project', methods=['GET'])
@@ -171,11 +137,14 @@ def get_all_by_project_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
+    if not authorized:
+        return make_response({'status': 'error', 'message': "Not Authorized"}, STATUS.FORBIDDEN)
+
     tags = get_tags_by_project(project_id)
 
     if tags is None:
@@ -221,12 +190,12 @@ def assign_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized"}, STATUS.FORBIDDEN)
 
     tag = get_tag_by_id(tag_id)
@@ -246,12 +215,12 @@ def unassign_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized"}, STATUS.FORBIDDEN)
 
     delete_mapping(project_id)
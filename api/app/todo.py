@@ -7,158 +7,118 @@ todo_bp = Blueprint('todo', __name__, url_prefix='/todo')
 
 from .db import get_db_connection
 from .sessions import verify_session_for_access
-from .projects import authorized_project_access
+from .authorization import verify_resource_access
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .pagination import streaming_requested, next_cursor
+from .streaming import stream_page
+from .projection import get_fields_arg
+from .tables import Table, fetch_row, fetch_rows
 
 todo_fields = ['TodoID', 'ProjectID', 'name', 'description', 'timeCreated', 'dueTime', 'completed', 'timeCompleted',
                'recurring', 'interval', 'lastUpdate']
-
-
-def convert_time(object):
-    object['timeCreated'] = object['timeCreated'].timestamp()
-    if object['dueTime'] is not None:
-        object['dueTime'] = object['dueTime'].timestamp()
-    if object['timeCompleted'] is not None:
-        object['timeCompleted'] = object['timeCompleted'].timestamp()
-    object['lastUpdate'] = object['lastUpdate'].timestamp()
-    return object
+todo_table = Table('todo', todo_fields, timestamps=['timeCreated', 'dueTime', 'timeCompleted', 'lastUpdate'],
+                   renamed={'interval': 'recurrenceInterval'})
 
 
 def get_last_update(todo_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT lastUpdate FROM todo where TodoID = %s;", (todo_id,))
-    last_update = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {todo_table.column('lastUpdate')} FROM todo where TodoID = %s;", (todo_id,))
+        last_update = cursor.fetchone()
     if last_update is not None:
-        return last_update[0].timestamp()
+        return last_update[0]
     return None
 
 
 def create_todo(project_id, name, description, due=None, recurring=False, recurrence=None):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO todo (ProjectID, name, description, dueTime, recurring, recurrenceInterval)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        RETURNING *;
-    """, (project_id, name, description, due, recurring, recurrence))
-    new_todo = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if new_todo is not None:
-        new_todo = {k: v for k, v in zip(todo_fields, new_todo)}
-        new_todo = convert_time(new_todo)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO todo (ProjectID, name, description, dueTime, recurring, recurrenceInterval)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING {todo_table.select()};
+        """, (project_id, name, description, due, recurring, recurrence))
+        new_todo = fetch_row(cursor)
     return new_todo
 
 
-def get_all_todo(project_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM todo where projectID = %s", (project_id,))
-    todos = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if todos is not None:
-        todo_list = []
-        for todo in todos:
-            todo = {k: v for k, v in zip(todo_fields, todo)}
-            todo = convert_time(todo)
-            todo_list.append(todo)
-        return todo_list
-    return None
+def todo_key(todo):
+    return [todo['TodoID']]
 
 
-def get_all_user_todo(user_id, start_time, end_time):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""SELECT todo.* FROM todo
-    inner join projects on
-    projects.projectID = todo.projectID
-    where projects.UserID = %s
-    AND (dueTime BETWEEN %s AND %s OR timeCompleted BETWEEN %s AND %s)
-    """, (user_id, start_time, end_time, start_time, end_time))
-    todos = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if todos is not None:
-        todo_list = []
-        for todo in todos:
-            todo = {k: v for k, v in zip(todo_fields, todo)}
-            todo = convert_time(todo)
-            todo_list.append(todo)
-        return todo_list
-    return None
+def all_todo_query(project_id, limit=None, after=None, fields=todo_fields):
+    condition, order_by = keyset(['todo.TodoID'], after)
+    columns = todo_table.select(fields)
+    return (f"SELECT {columns} FROM todo where projectID = %s{condition} {order_by} LIMIT %s;",
+            (project_id, *(after or []), fetch_limit(limit)))
+
+
+def fetch_all_todo(cursor, project_id, limit=None, after=None, fields=todo_fields):
+    cursor.execute(*all_todo_query(project_id, limit, after, fields))
+    todos = fetch_rows(cursor)
+    return page_of(todos, limit, todo_key)
+
+
+def get_all_todo(project_id, limit=None, after=None, fields=todo_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        return fetch_all_todo(cursor, project_id, limit, after, fields)
+
+
+def user_todo_query(user_id, start_time, end_time, limit=None, after=None, fields=todo_fields):
+    condition, order_by = keyset(['todo.TodoID'], after)
+    columns = todo_table.select(fields)
+    return (f"""SELECT {columns} FROM todo
+        inner join projects on
+        projects.projectID = todo.projectID
+        where projects.UserID = %s
+        AND (dueTime BETWEEN %s AND %s OR timeCompleted BETWEEN %s AND %s){condition}
+        {order_by} LIMIT %s;
+        """, (user_id, start_time, end_time, start_time, end_time, *(after or []), fetch_limit(limit)))
+
+
+def get_all_user_todo(user_id, start_time, end_time, limit=None, after=None, fields=todo_fields):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(*user_todo_query(user_id, start_time, end_time, limit, after, fields))
+        todos = fetch_rows(cursor)
+    return page_of(todos, limit, todo_key)
 
 
 def get_todo_by_id(todo_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM todo where TodoID = %s", (todo_id,))
-    todo = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if todo is not None:
-        todo = {k: v for k, v in zip(todo_fields, todo)}
-        todo = convert_time(todo)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {todo_table.select()} FROM todo where TodoID = %s", (todo_id,))
+        todo = fetch_row(cursor)
     return todo
 
 
 def complete_todo_with_back_date(todo_id, completion_time):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE todo SET completed = TRUE, timeCompleted = %s where TodoID = %s RETURNING *;",
-                   (completion_time, todo_id,))
-    completed_todo = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if completed_todo is not None:
-        completed_todo = {k: v for k, v in zip(todo_fields, completed_todo)}
-        completed_todo = convert_time(completed_todo)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"UPDATE todo SET completed = TRUE, timeCompleted = %s where TodoID = %s "
+                       f"RETURNING {todo_table.select()};",
+                       (completion_time, todo_id,))
+        completed_todo = fetch_row(cursor)
     return completed_todo
 
 
 def complete_todo(todo_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE todo SET completed = TRUE, timeCompleted = %s where TodoID = %s RETURNING *;",
-                   (datetime.now(), todo_id,))
-    completed_todo = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if completed_todo is not None:
-        completed_todo = {k: v for k, v in zip(todo_fields, completed_todo)}
-        completed_todo = convert_time(completed_todo)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"UPDATE todo SET completed = TRUE, timeCompleted = %s where TodoID = %s "
+                       f"RETURNING {todo_table.select()};",
+                       (datetime.now(), todo_id,))
+        completed_todo = fetch_row(cursor)
     return completed_todo
 
 
 def delete_todo(todo_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM todo where TodoID = %s;", (todo_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM todo where TodoID = %s;", (todo_id,))
 
 
 def update_todo(todo_id, name, description, due=None, recurring=False, recurrence=None):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE todo SET name = %s, description = %s, dueTime = %s, recurring=%s, recurrenceInterval=%s
-        WHERE todoID = %s
-        RETURNING *;
-    """, (name, description, due, recurring, recurrence, todo_id))
-    updated_todo = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if updated_todo is not None:
-        updated_todo = {k: v for k, v in zip(todo_fields, updated_todo)}
-        updated_todo = convert_time(updated_todo)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE todo SET name = %s, description = %s, dueTime = %s, recurring=%s, recurrenceInterval=%s
+            WHERE todoID = %s
+            RETURNING {todo_table.select()};
+        """, (name, description, due, recurring, recurrence, todo_id))
+        updated_todo = fetch_row(cursor)
     return updated_todo
 
 
@@ -183,12 +143,12 @@ def create_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     new_todo = create_todo(project_id, todo_name, todo_description, todo_due, recurring, recurrence_interval)
@@ -205,16 +165,16 @@ def get_ep():
     todo_id = int(request.args.get("id"))
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'todo', todo_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    todo = get_todo_by_id(todo_id)
-
-    if not authorized_project_access(token, todo['ProjectID']):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    todo = get_todo_by_id(todo_id)
+
     if todo is None:
         return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
 
@@ -227,21 +187,24 @@ def get_all_ep():
     project_id = int(request.args.get("project_id"))
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'project', project_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_project_access(token, project_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
-    todo_list = get_all_todo(project_id)
-
-    if todo_list is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
+    try:
+        limit, after = get_page_args(streamable=True)
+        fields = get_fields_arg(todo_fields)
+        if streaming_requested():
+            return stream_page(*all_todo_query(project_id, limit, after, fields), limit, next_cursor(todo_key))
+        todo_list, next_page = get_all_todo(project_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    response = make_response({'status': 'success', 'message': todo_list}, STATUS.OK)
-    return response
+    return page_response(todo_list, next_page)
 
 
 @todo_bp.route('/get_user_todo', methods=['GET'])
@@ -258,13 +221,17 @@ def get_all_user_ep():
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    todo_list = get_all_user_todo(session['UserID'], start_time, end_time)
+    try:
+        limit, after = get_page_args(streamable=True)
+        fields = get_fields_arg(todo_fields)
+        if streaming_requested():
+            query, params = user_todo_query(session['UserID'], start_time, end_time, limit, after, fields)
+            return stream_page(query, params, limit, next_cursor(todo_key))
+        todo_list, next_page = get_all_user_todo(session['UserID'], start_time, end_time, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    if todo_list is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
-
-    response = make_response({'status': 'success', 'message': todo_list}, STATUS.OK)
-    return response
+    return page_response(todo_list, next_page)
 
 
 @todo_bp.route('/update', methods=['PATCH'])
@@ -283,14 +250,12 @@ def update_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'todo', todo_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    todo = get_todo_by_id(todo_id)
-
-    if not authorized_project_access(token, todo['ProjectID']):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     updated_todo = update_todo(todo_id, todo_name, todo_description, todo_due, recurring, recurrence_interval)
@@ -310,14 +275,12 @@ def completed_previously_ep():
     todo_completed_time = datetime.fromtimestamp(todo_completed_time)
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'todo', todo_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    todo = get_todo_by_id(todo_id)
-
-    if not authorized_project_access(token, todo['ProjectID']):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     completed_todo = complete_todo_with_back_date(todo_id, todo_completed_time)
@@ -336,14 +299,12 @@ def complete_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'todo', todo_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    todo = get_todo_by_id(todo_id)
-
-    if not authorized_project_access(token, todo['ProjectID']):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     completed_todo = complete_todo(todo_id)
@@ -379,16 +340,16 @@ def delete_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'todo', todo_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    todo = get_todo_by_id(todo_id)
-
-    if not authorized_project_access(token, todo['ProjectID']):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
+    todo = get_todo_by_id(todo_id)
+
     delete_todo(todo_id)
 
     response = make_response({'status': 'success', 'message': f'Updated {todo["name"]}'}, STATUS.OK)
@@ -398,6 +359,17 @@ def delete_ep():
 @todo_bp.route('/last_update', methods=['GET'])
 def last_update():
     todo_id = int(request.args.get("id"))
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'todo', todo_id)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        return make_response({'status': 'error', 'message': "Not Authorized To Access"}, STATUS.FORBIDDEN)
+
     time = get_last_update(todo_id)
     if time is None:
         return make_response({"todo_id": todo_id, "last_update": "Null"}, STATUS.OK)
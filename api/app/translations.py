@@ -4,114 +4,77 @@ from datetime import datetime
 
 translations_bp = Blueprint('translations', __name__, url_prefix='/translations')
 from .db import get_db_connection
-from .sessions import verify_session_for_access
-from .pages import authorized_page_access
+from .authorization import verify_resource_access
+from .audit import log_request
+from .pagination import get_page_args, keyset, fetch_limit, page_of, page_response, invalid_request_response
+from .projection import get_fields_arg
+from .tables import Table, fetch_row, fetch_rows
+from .patches import patch_content
+from .conditional import get_content_validators, content_validators, not_modified, not_modified_response, set_validators
 
-translation_fields = ['TranslationID', 'PageID', 'language', 'content', 'timeCreated', 'lastEditTime']
+translation_fields = ['TranslationID', 'PageID', 'language', 'content', 'timeCreated', 'lastEditTime', 'revision']
+translation_table = Table('Translations', translation_fields, timestamps=['timeCreated', 'lastEditTime'])
 
 
 def log_access(translation_id, allowed, notes):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO translationrequests (TranslationID, accessGranted, notes)
-        VALUES (%s, %s, %s);
-    """, (translation_id, allowed, notes))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-
-def convert_time(object):
-    object['timeCreated'] = object['timeCreated'].timestamp()
-    object['lastEditTime'] = object['lastEditTime'].timestamp()
-    return object
+    log_request('translationrequests', translation_id, allowed, notes)
 
 
 def get_last_update(translation_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT lastEditTime FROM Translations where TranslationID = %s;", (translation_id,))
-    last_update = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {translation_table.column('lastEditTime')} FROM Translations where TranslationID = %s;",
+                       (translation_id,))
+        last_update = cursor.fetchone()
     if last_update is not None:
-        return last_update[0].timestamp()
+        return last_update[0]
     return None
 
 
 def delete_translation(translation_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM Translations where TranslationID = %s;", (translation_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-
-def update_translation(translation_id, content):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE Translations SET content = %s, lastEditTime = %s
-        WHERE TranslationID = %s
-        RETURNING *;
-    """, (content, datetime.now(), translation_id,))
-    translation = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if translation is not None:
-        translation = {k: v for k, v in zip(translation_fields, translation)}
-        translation = convert_time(translation)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM Translations where TranslationID = %s;", (translation_id,))
+
+
+def update_translation(translation_id, content, base_revision=None):
+    # Returns None if base_revision is given and the translation has moved on from it
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE Translations SET content = %s, lastEditTime = %s, revision = revision + 1
+            WHERE TranslationID = %s AND (%s::integer IS NULL OR revision = %s)
+            RETURNING {translation_table.select()};
+        """, (content, datetime.now(), translation_id, base_revision, base_revision))
+        translation = fetch_row(cursor)
     return translation
 
 
 def get_translation_by_id(translation_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM Translations where TranslationID = %s;", (translation_id,))
-    translation = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if translation is not None:
-        translation = {k: v for k, v in zip(translation_fields, translation)}
-        translation = convert_time(translation)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {translation_table.select()} FROM Translations where TranslationID = %s;",
+                       (translation_id,))
+        translation = fetch_row(cursor)
     return translation
 
 
-def get_translations_by_page(page_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM Translations where PageID = %s;", (page_id,))
-    translations = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    if translations is not None:
-        translation_list = []
-        for translation in translations:
-            translation = {k: v for k, v in zip(translation_fields, translation)}
-            translation = convert_time(translation)
-            translation_list.append(translation)
-        return translation_list
-    return None
+def get_translations_by_page(page_id, limit=None, after=None, fields=translation_fields):
+    condition, order_by = keyset(['TranslationID'], after)
+    columns = translation_table.select(fields)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT {columns} FROM Translations where PageID = %s{condition}
+            {order_by} LIMIT %s;
+        """, (page_id, *(after or []), fetch_limit(limit)))
+        translations = fetch_rows(cursor)
+    return page_of(translations, limit, lambda translation: [translation['TranslationID']])
 
 
 def create_translation(page_id, language):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO Translations (PageID, language, lastEditTime)
-        VALUES (%s, %s, %s)
-        RETURNING *;
-    """, (page_id, language, datetime.now()))
-    translation = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if translation is not None:
-        translation = {k: v for k, v in zip(translation_fields, translation)}
-        translation = convert_time(translation)
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO Translations (PageID, language, lastEditTime)
+            VALUES (%s, %s, %s)
+            RETURNING {translation_table.select()};
+        """, (page_id, language, datetime.now()))
+        translation = fetch_row(cursor)
     return translation
 
 
@@ -128,12 +91,12 @@ def create_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
     new_translation = create_translation(page_id, language)
@@ -152,24 +115,33 @@ def get_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'translation', translation_id)
 
     if not valid:
         log_access(translation_id, False, "GET")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    translation = get_translation_by_id(translation_id)
-
-    if not authorized_page_access(token, translation['PageID']):
+    if not authorized:
         log_access(translation_id, False, "GET")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
-    if translation is None:
+    validators = get_content_validators(translation_table, 'TranslationID', translation_id)
+
+    if validators is None:
         return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
 
     log_access(translation_id, True, "GET")
+
+    if not_modified(*validators):
+        return not_modified_response(*validators)
+
+    translation = get_translation_by_id(translation_id)
+
+    if translation is None:
+        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
+
     response = make_response({'status': 'success', 'message': translation}, STATUS.OK)
-    return response
+    return set_validators(response, *content_validators(translation, translation_fields))
 
 
 @translations_bp.route('/get_all_by_page', methods=['GET'])
@@ -178,21 +150,22 @@ def get_all_by_page_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'page', page_id)
 
     if not valid:
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    translations = get_translations_by_page(page_id)
-
-    if not authorized_page_access(token, page_id):
+    if not authorized:
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
-    if translations is None:
-        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.OK)
+    try:
+        limit, after = get_page_args()
+        fields = get_fields_arg(translation_fields)
+        translations, next_page = get_translations_by_page(page_id, limit, after, fields)
+    except ValueError as e:
+        return invalid_request_response(e)
 
-    response = make_response({'status': 'success', 'message': translations}, STATUS.OK)
-    return response
+    return page_response(translations, next_page)
 
 
 @translations_bp.route('/update', methods=['PUT'])
@@ -200,29 +173,76 @@ def update_ep():
     data = request.get_json()
     translation_id = data.get("translation_id")
     content = data.get("new_content")
+    base_revision = data.get("base_revision")
+
+    # base_revision is optional here, saving over whatever revision the translation is at when it is left out
+    if base_revision is not None and type(base_revision) is not int:
+        return make_response({'status': 'error', 'message': "Invalid base_revision"}, STATUS.BAD_REQUEST)
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'translation', translation_id)
 
     if not valid:
         log_access(translation_id, False, "GET")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    translation = get_translation_by_id(translation_id)
-
-    if not authorized_page_access(token, translation['PageID']):
+    if not authorized:
         log_access(translation_id, False, "GET")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
-    updated_translation = update_translation(translation_id, content)
+    updated_translation = update_translation(translation_id, content, base_revision)
 
     if updated_translation is None:
-        return make_response({'status': 'error', 'message': "Error updating translation"}, STATUS.INTERNAL_SERVER_ERROR)
+        # Either the translation is gone or it has moved on from base_revision
+        current = get_translation_by_id(translation_id)
+        if current is None:
+            return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.NOT_FOUND)
+        return make_response({'status': 'error', 'message': "Translation Has Changed", 'revision': current['revision']},
+                             STATUS.CONFLICT)
 
     log_access(translation_id, True, "GET")
-    response = make_response({'status': 'success', 'message': f"Updated {updated_translation['language']} Translation"},
-                             STATUS.OK)
+    response = make_response({'status': 'success', 'message': f"Updated {updated_translation['language']} Translation",
+                              'revision': updated_translation['revision']}, STATUS.OK)
+    return response
+
+
+@translations_bp.route('/update', methods=['PATCH'])
+def patch_ep():
+    data = request.get_json()
+    translation_id = data.get("translation_id")
+    base_revision = data.get("base_revision")
+    ops = data.get("ops")
+
+    if type(base_revision) is not int or not isinstance(ops, list):
+        return make_response({'status': 'error', 'message': "Missing base_revision or ops"}, STATUS.BAD_REQUEST)
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'translation', translation_id)
+
+    if not valid:
+        log_access(translation_id, False, "UPDATE")
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        log_access(translation_id, False, "UPDATE")
+        return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
+
+    try:
+        revision, saved = patch_content('Translations', 'TranslationID', translation_id, base_revision, ops)
+    except ValueError as e:
+        return make_response({'status': 'error', 'message': str(e)}, STATUS.BAD_REQUEST)
+
+    if revision is None:
+        return make_response({'status': 'error', 'message': "Does Not Exist"}, STATUS.NOT_FOUND)
+
+    if not saved:
+        return make_response({'status': 'error', 'message': "Translation Has Changed", 'revision': revision},
+                             STATUS.CONFLICT)
+
+    log_access(translation_id, True, "UPDATE")
+    response = make_response({'status': 'success', 'message': "Patched Translation", 'revision': revision}, STATUS.OK)
     return response
 
 
@@ -233,15 +253,13 @@ def delete_ep():
 
     token = request.cookies.get("token")
 
-    valid, session = verify_session_for_access(token)
+    valid, authorized, session = verify_resource_access(token, 'translation', translation_id)
 
     if not valid:
         log_access(translation_id, False, "GET")
         return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
 
-    translation = get_translation_by_id(translation_id)
-
-    if not authorized_page_access(token, translation['PageID']):
+    if not authorized:
         log_access(translation_id, False, "GET")
         return make_response({'status': 'error', 'message': "Not Authorized To Access Project"}, STATUS.FORBIDDEN)
 
@@ -254,6 +272,17 @@ def delete_ep():
 @translations_bp.route('/last_update', methods=['GET'])
 def last_update():
     translation_id = int(request.args.get("id"))
+
+    token = request.cookies.get("token")
+
+    valid, authorized, session = verify_resource_access(token, 'translation', translation_id)
+
+    if not valid:
+        return make_response({'status': 'error', 'message': "Session is Invalid"}, STATUS.FORBIDDEN)
+
+    if not authorized:
+        return make_response({'status': 'error', 'message': "Not Authorized To Access"}, STATUS.FORBIDDEN)
+
     time = get_last_update(translation_id)
     if time is None:
         return make_response({"translation_id": translation_id, "last_update": "Null"}, STATUS.OK)
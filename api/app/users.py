@@ -6,11 +6,14 @@ import json
 
 from .configuration import load_config
 from .db import get_db_connection
-from .sessions import create_session, verify_session, deactivate_session, verify_session_for_access, deactivate_session
+from .sessions import create_session, verify_session, deactivate_session, verify_session_for_access, deactivate_session, \
+    invalidate_user_sessions
 
 config = load_config()
 users_bp = Blueprint('users', __name__, url_prefix='/users')
 users_fields = ['UserID', 'name', 'hash', 'salt', 'lastFailedLogin', 'timeCreated', 'preferences']
+# Named rather than *, so a column added to users doesn't shift the rows zipped with users_fields
+users_columns = ', '.join(users_fields)
 
 
 def generate_salt():
@@ -33,37 +36,27 @@ def get_hash(password, salt):
 
 
 def get_user_by_name(user_name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users where name = %s", (user_name,))
-    user = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {users_columns} FROM users where name = %s", (user_name,))
+        user = cursor.fetchone()
     if user is not None:
         user = {k: v for k, v in zip(users_fields, user)}
     return user
 
 
 def get_user_by_id(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users where UserID = %s", (user_id,))
-    user = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT {users_columns} FROM users where UserID = %s", (user_id,))
+        user = cursor.fetchone()
     if user is not None:
         user = {k: v for k, v in zip(users_fields, user)}
     return user
 
 
 def update_user_name(user_id, new_username):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET name = %s where UserID = %s RETURNING *", (new_username, user_id,))
-    modified_user = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"UPDATE users SET name = %s where UserID = %s RETURNING {users_columns}", (new_username, user_id,))
+        modified_user = cursor.fetchone()
     if modified_user is not None:
         modified_user = {k: v for k, v in zip(users_fields, modified_user)}
     return modified_user
@@ -72,13 +65,9 @@ def update_user_name(user_id, new_username):
 def update_user_preferences(user_id, preferences):
     if type(preferences) == dict:
         preferences = json.dumps(preferences)
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET preferences = %s where UserID = %s RETURNING *", (preferences, user_id,))
-    modified_user = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"UPDATE users SET preferences = %s where UserID = %s RETURNING {users_columns}", (preferences, user_id,))
+        modified_user = cursor.fetchone()
     if modified_user is not None:
         modified_user = {k: v for k, v in zip(users_fields, modified_user)}
     return modified_user
@@ -88,13 +77,9 @@ def update_user_password(user_id, new_password):
     account = get_user_by_id(user_id)
     new_hash = get_hash(new_password, account['salt'])
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET hash = %s where UserID = %s RETURNING *", (new_hash, user_id,))
-    modified_user = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"UPDATE users SET hash = %s where UserID = %s RETURNING {users_columns}", (new_hash, user_id,))
+        modified_user = cursor.fetchone()
     if modified_user is not None:
         modified_user = {k: v for k, v in zip(users_fields, modified_user)}
     return modified_user
@@ -107,18 +92,14 @@ def create_user(name, password, prefs):
     salt = generate_salt()
     pwd_hash = get_hash(password, salt)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO users (name, hash, salt, preferences)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT (name) DO NOTHING
-        RETURNING *;
-    """, (name, pwd_hash, salt, prefs))
-    new_user = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO users (name, hash, salt, preferences)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (name) DO NOTHING
+            RETURNING {users_columns};
+        """, (name, pwd_hash, salt, prefs))
+        new_user = cursor.fetchone()
     if new_user is not None:
         new_user = {k: v for k, v in zip(users_fields, new_user)}
     return new_user
@@ -135,12 +116,8 @@ def authenticate_user(name, password):
 
 
 def delete_user_by_id(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM users where UserID = (%s)", (user_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM users where UserID = (%s)", (user_id,))
 
 
 @users_bp.route('/test', methods=['GET'])
@@ -338,6 +315,7 @@ def delete_user_ep():
     if get_user_by_id(user_id) is not None:
         return make_response({'status': 'error', 'message': "Failed To Delete Account"}, STATUS.INTERNAL_SERVER_ERROR)
 
+    invalidate_user_sessions(user_id)
     deactivate_session(token)
 
     response = make_response({'status': 'success', 'message': f'Deleted: {username}'}, STATUS.OK)
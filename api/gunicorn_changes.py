@@ -0,0 +1,14 @@
+# Gunicorn settings of the changes service, which serves /changes/stream alone (see app/changes.py and nginx.conf).
+# An open stream spends its life waiting for changes, so streams are greenlets on gevent workers instead of threads
+# of the API's workers, and each worker holds up to worker_connections of them. psycopg2 is made cooperative so the
+# queries run here (access checks, the LISTEN connection) yield to the other streams instead of blocking them.
+from psycogreen.gevent import patch_psycopg
+
+bind = "0.0.0.0:3002"
+workers = 2
+worker_class = "gevent"
+worker_connections = 2000
+
+
+def post_fork(server, worker):
+    patch_psycopg()
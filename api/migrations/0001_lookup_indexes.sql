@@ -0,0 +1,40 @@
+-- Secondary indexes for the lookups made by pages.py, logging.py, projects.py, todo.py, events.py and the
+-- ownership checks in authorization.py. Every foreign key column gets an index as well so that cascading deletes
+-- of users, projects, pages and sessions don't scan the child tables.
+
+-- Ownership
+CREATE INDEX IF NOT EXISTS projects_userid_idx ON projects (UserID);
+CREATE INDEX IF NOT EXISTS sessions_userid_idx ON sessions (UserID);
+CREATE INDEX IF NOT EXISTS images_userid_idx ON images (UserID);
+CREATE INDEX IF NOT EXISTS tags_userid_idx ON tags (UserID);
+
+-- Project children, ordered the way the project views read them
+CREATE INDEX IF NOT EXISTS pages_projectid_idx ON pages (ProjectID);
+CREATE INDEX IF NOT EXISTS todo_projectid_duetime_idx ON todo (ProjectID, dueTime);
+CREATE INDEX IF NOT EXISTS events_projectid_starttime_idx ON events (ProjectID, startTime);
+CREATE INDEX IF NOT EXISTS tagmappings_projectid_idx ON tagmappings (ProjectID);
+CREATE INDEX IF NOT EXISTS tagmappings_tagid_idx ON tagmappings (TagID);
+
+-- Page children
+CREATE INDEX IF NOT EXISTS files_pageid_idx ON files (PageID);
+CREATE INDEX IF NOT EXISTS canvas_pageid_idx ON canvas (PageID);
+CREATE INDEX IF NOT EXISTS equations_pageid_idx ON equations (PageID);
+CREATE INDEX IF NOT EXISTS recipes_pageid_idx ON recipes (PageID);
+CREATE INDEX IF NOT EXISTS codesnippets_pageid_idx ON codesnippets (PageID);
+CREATE INDEX IF NOT EXISTS translations_pageid_idx ON translations (PageID);
+
+-- Request logs. The project list groups projectRequests by project for GET/CREATE regardless of accessGranted,
+-- while every pageRequests query only reads granted rows, so that index is partial.
+CREATE INDEX IF NOT EXISTS projectrequests_projectid_notes_accesstime_idx
+    ON projectRequests (ProjectID, notes, accessTime);
+CREATE INDEX IF NOT EXISTS pagerequests_pageid_notes_accesstime_idx
+    ON pageRequests (PageID, notes, accessTime) WHERE accessGranted;
+CREATE INDEX IF NOT EXISTS projectrequests_sessionid_idx ON projectRequests (SessionID);
+CREATE INDEX IF NOT EXISTS pagerequests_sessionid_idx ON pageRequests (SessionID);
+
+CREATE INDEX IF NOT EXISTS canvasrequests_canvasid_accesstime_idx ON canvasrequests (CanvasID, accessTime);
+CREATE INDEX IF NOT EXISTS equationsrequests_equationid_accesstime_idx ON equationsrequests (EquationID, accessTime);
+CREATE INDEX IF NOT EXISTS reciperequests_recipeid_accesstime_idx ON reciperequests (RecipeID, accessTime);
+CREATE INDEX IF NOT EXISTS codesnippetsrequests_codeid_accesstime_idx ON codesnippetsrequests (CodeID, accessTime);
+CREATE INDEX IF NOT EXISTS translationrequests_translationid_accesstime_idx
+    ON translationrequests (TranslationID, accessTime);
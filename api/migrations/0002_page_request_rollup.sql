@@ -0,0 +1,43 @@
+-- Last REVIEW, last UPDATE and number of reviews of each page, so the review lists don't aggregate the whole
+-- pageRequests history. Only granted requests count, matching the queries it replaces.
+CREATE TABLE pageRequestRollup (
+    PageID INTEGER PRIMARY KEY,
+    lastReview TIMESTAMP,
+    lastUpdate TIMESTAMP,
+    reviewCount INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (PageID) REFERENCES pages(PageID) ON DELETE CASCADE
+);
+
+-- Statement level so that a batch written by the audit log updates each page once. Rows can arrive out of order,
+-- so the latest times are merged with GREATEST (which ignores NULLs) rather than overwritten.
+CREATE FUNCTION roll_up_page_requests() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO pageRequestRollup (PageID, lastReview, lastUpdate, reviewCount)
+    SELECT PageID,
+        max(accessTime) FILTER (WHERE notes = 'REVIEW'),
+        max(accessTime) FILTER (WHERE notes = 'UPDATE'),
+        count(*) FILTER (WHERE notes = 'REVIEW')
+    FROM new_requests
+    WHERE accessGranted AND notes IN ('REVIEW', 'UPDATE')
+    GROUP BY PageID
+    ON CONFLICT (PageID) DO UPDATE SET
+        lastReview = GREATEST(pageRequestRollup.lastReview, EXCLUDED.lastReview),
+        lastUpdate = GREATEST(pageRequestRollup.lastUpdate, EXCLUDED.lastUpdate),
+        reviewCount = pageRequestRollup.reviewCount + EXCLUDED.reviewCount;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER page_requests_rollup
+    AFTER INSERT ON pageRequests
+    REFERENCING NEW TABLE AS new_requests
+    FOR EACH STATEMENT EXECUTE FUNCTION roll_up_page_requests();
+
+INSERT INTO pageRequestRollup (PageID, lastReview, lastUpdate, reviewCount)
+SELECT PageID,
+    max(accessTime) FILTER (WHERE notes = 'REVIEW'),
+    max(accessTime) FILTER (WHERE notes = 'UPDATE'),
+    count(*) FILTER (WHERE notes = 'REVIEW')
+FROM pageRequests
+WHERE accessGranted AND notes IN ('REVIEW', 'UPDATE')
+GROUP BY PageID;
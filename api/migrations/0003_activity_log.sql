@@ -0,0 +1,193 @@
+-- Append-only log of every granted, non-GET request and file upload, which the history views read instead of
+-- combining the per-resource request tables. Names are captured when the event is logged. Partitioned by month on
+-- accessTime; rows outside the created partitions land in activityLog_default.
+CREATE TABLE activityLog (
+    ActivityID BIGSERIAL,
+    UserID INTEGER NOT NULL,
+    ProjectID INTEGER NOT NULL,
+    type VARCHAR(16) NOT NULL,
+    ResourceID INTEGER NOT NULL,
+    name VARCHAR(64) NOT NULL,
+    event TEXT,
+    accessTime TIMESTAMP NOT NULL,
+    PRIMARY KEY (accessTime, ActivityID),
+    FOREIGN KEY (ProjectID) REFERENCES projects(ProjectID) ON DELETE CASCADE
+) PARTITION BY RANGE (accessTime);
+
+CREATE TABLE activityLog_default PARTITION OF activityLog DEFAULT;
+
+CREATE INDEX activitylog_userid_accesstime_idx ON activityLog (UserID, accessTime, ActivityID);
+CREATE INDEX activitylog_projectid_accesstime_idx ON activityLog (ProjectID, accessTime, ActivityID);
+
+-- Creates the monthly partitions covering [from_time, to_time]. A month whose rows are already in the default
+-- partition is left there.
+CREATE FUNCTION ensure_activity_partitions(from_time TIMESTAMP, to_time TIMESTAMP) RETURNS VOID AS $$
+DECLARE
+    month TIMESTAMP;
+BEGIN
+    FOR month IN SELECT generate_series(date_trunc('month', from_time), to_time, interval '1 month') LOOP
+        BEGIN
+            EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF activityLog FOR VALUES FROM (%L) TO (%L)',
+                           'activitylog_' || to_char(month, 'YYYY_MM'), month, month + interval '1 month');
+        EXCEPTION WHEN check_violation THEN
+            RAISE NOTICE 'activityLog rows for % are in the default partition', to_char(month, 'YYYY-MM');
+        END;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement level, reading the inserted rows from the new_rows transition table of whichever table fired it.
+CREATE FUNCTION log_activity() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'projectrequests' THEN
+        INSERT INTO activityLog (UserID, ProjectID, type, ResourceID, name, event, accessTime)
+        SELECT projects.UserID, projects.ProjectID, 'project', projects.ProjectID, projects.name, new_rows.notes,
+            COALESCE(new_rows.accessTime, now())
+        FROM new_rows
+        inner join projects on projects.ProjectID = new_rows.ProjectID
+        WHERE new_rows.accessGranted AND new_rows.notes != 'GET';
+    ELSIF TG_TABLE_NAME = 'pagerequests' THEN
+        INSERT INTO activityLog (UserID, ProjectID, type, ResourceID, name, event, accessTime)
+        SELECT projects.UserID, projects.ProjectID, 'page', pages.PageID, pages.name, new_rows.notes,
+            COALESCE(new_rows.accessTime, now())
+        FROM new_rows
+        inner join pages on pages.PageID = new_rows.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE new_rows.accessGranted AND new_rows.notes != 'GET';
+    ELSIF TG_TABLE_NAME = 'codesnippetsrequests' THEN
+        INSERT INTO activityLog (UserID, ProjectID, type, ResourceID, name, event, accessTime)
+        SELECT projects.UserID, projects.ProjectID, 'code', codesnippets.CodeID, codesnippets.name, new_rows.notes,
+            COALESCE(new_rows.accessTime, now())
+        FROM new_rows
+        inner join codesnippets on codesnippets.CodeID = new_rows.CodeID
+        inner join pages on pages.PageID = codesnippets.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE new_rows.accessGranted AND new_rows.notes != 'GET';
+    ELSIF TG_TABLE_NAME = 'translationrequests' THEN
+        INSERT INTO activityLog (UserID, ProjectID, type, ResourceID, name, event, accessTime)
+        SELECT projects.UserID, projects.ProjectID, 'translation', translations.TranslationID, translations.language,
+            new_rows.notes, COALESCE(new_rows.accessTime, now())
+        FROM new_rows
+        inner join translations on translations.TranslationID = new_rows.TranslationID
+        inner join pages on pages.PageID = translations.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE new_rows.accessGranted AND new_rows.notes != 'GET';
+    ELSIF TG_TABLE_NAME = 'equationsrequests' THEN
+        INSERT INTO activityLog (UserID, ProjectID, type, ResourceID, name, event, accessTime)
+        SELECT projects.UserID, projects.ProjectID, 'equation', equations.EquationID, equations.name, new_rows.notes,
+            COALESCE(new_rows.accessTime, now())
+        FROM new_rows
+        inner join equations on equations.EquationID = new_rows.EquationID
+        inner join pages on pages.PageID = equations.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE new_rows.accessGranted AND new_rows.notes != 'GET';
+    ELSIF TG_TABLE_NAME = 'reciperequests' THEN
+        INSERT INTO activityLog (UserID, ProjectID, type, ResourceID, name, event, accessTime)
+        SELECT projects.UserID, projects.ProjectID, 'recipe', recipes.RecipeID, recipes.name, new_rows.notes,
+            COALESCE(new_rows.accessTime, now())
+        FROM new_rows
+        inner join recipes on recipes.RecipeID = new_rows.RecipeID
+        inner join pages on pages.PageID = recipes.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE new_rows.accessGranted AND new_rows.notes != 'GET';
+    ELSIF TG_TABLE_NAME = 'canvasrequests' THEN
+        INSERT INTO activityLog (UserID, ProjectID, type, ResourceID, name, event, accessTime)
+        SELECT projects.UserID, projects.ProjectID, 'canvas', canvas.CanvasID, canvas.name, new_rows.notes,
+            COALESCE(new_rows.accessTime, now())
+        FROM new_rows
+        inner join canvas on canvas.CanvasID = new_rows.CanvasID
+        inner join pages on pages.PageID = canvas.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID
+        WHERE new_rows.accessGranted AND new_rows.notes != 'GET';
+    ELSIF TG_TABLE_NAME = 'files' THEN
+        INSERT INTO activityLog (UserID, ProjectID, type, ResourceID, name, event, accessTime)
+        SELECT projects.UserID, projects.ProjectID, 'file', new_rows.FileID, new_rows.name, 'UPLOAD',
+            COALESCE(new_rows.timeCreated, now())
+        FROM new_rows
+        inner join pages on pages.PageID = new_rows.PageID
+        inner join projects on projects.ProjectID = pages.ProjectID;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER project_requests_activity AFTER INSERT ON projectRequests
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION log_activity();
+CREATE TRIGGER page_requests_activity AFTER INSERT ON pageRequests
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION log_activity();
+CREATE TRIGGER codesnippets_requests_activity AFTER INSERT ON codesnippetsrequests
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION log_activity();
+CREATE TRIGGER translation_requests_activity AFTER INSERT ON translationrequests
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION log_activity();
+CREATE TRIGGER equations_requests_activity AFTER INSERT ON equationsrequests
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION log_activity();
+CREATE TRIGGER recipe_requests_activity AFTER INSERT ON reciperequests
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION log_activity();
+CREATE TRIGGER canvas_requests_activity AFTER INSERT ON canvasrequests
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION log_activity();
+CREATE TRIGGER files_activity AFTER INSERT ON files
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION log_activity();
+
+-- Backfill from the existing request history
+SELECT ensure_activity_partitions(
+    COALESCE(LEAST(
+        (SELECT min(accessTime) FROM projectRequests),
+        (SELECT min(accessTime) FROM pageRequests),
+        (SELECT min(timeCreated) FROM files)
+    ), now()::TIMESTAMP),
+    (now() + interval '3 months')::TIMESTAMP
+);
+
+INSERT INTO activityLog (UserID, ProjectID, type, ResourceID, name, event, accessTime)
+SELECT projects.UserID, projects.ProjectID, 'project', projects.ProjectID, projects.name, r.notes, r.accessTime
+FROM projectRequests r
+inner join projects on projects.ProjectID = r.ProjectID
+WHERE r.accessGranted AND r.notes != 'GET' AND r.accessTime IS NOT NULL
+UNION ALL
+SELECT projects.UserID, projects.ProjectID, 'page', pages.PageID, pages.name, r.notes, r.accessTime
+FROM pageRequests r
+inner join pages on pages.PageID = r.PageID
+inner join projects on projects.ProjectID = pages.ProjectID
+WHERE r.accessGranted AND r.notes != 'GET' AND r.accessTime IS NOT NULL
+UNION ALL
+SELECT projects.UserID, projects.ProjectID, 'code', codesnippets.CodeID, codesnippets.name, r.notes, r.accessTime
+FROM codesnippetsrequests r
+inner join codesnippets on codesnippets.CodeID = r.CodeID
+inner join pages on pages.PageID = codesnippets.PageID
+inner join projects on projects.ProjectID = pages.ProjectID
+WHERE r.accessGranted AND r.notes != 'GET' AND r.accessTime IS NOT NULL
+UNION ALL
+SELECT projects.UserID, projects.ProjectID, 'translation', translations.TranslationID, translations.language, r.notes,
+    r.accessTime
+FROM translationrequests r
+inner join translations on translations.TranslationID = r.TranslationID
+inner join pages on pages.PageID = translations.PageID
+inner join projects on projects.ProjectID = pages.ProjectID
+WHERE r.accessGranted AND r.notes != 'GET' AND r.accessTime IS NOT NULL
+UNION ALL
+SELECT projects.UserID, projects.ProjectID, 'equation', equations.EquationID, equations.name, r.notes, r.accessTime
+FROM equationsrequests r
+inner join equations on equations.EquationID = r.EquationID
+inner join pages on pages.PageID = equations.PageID
+inner join projects on projects.ProjectID = pages.ProjectID
+WHERE r.accessGranted AND r.notes != 'GET' AND r.accessTime IS NOT NULL
+UNION ALL
+SELECT projects.UserID, projects.ProjectID, 'recipe', recipes.RecipeID, recipes.name, r.notes, r.accessTime
+FROM reciperequests r
+inner join recipes on recipes.RecipeID = r.RecipeID
+inner join pages on pages.PageID = recipes.PageID
+inner join projects on projects.ProjectID = pages.ProjectID
+WHERE r.accessGranted AND r.notes != 'GET' AND r.accessTime IS NOT NULL
+UNION ALL
+SELECT projects.UserID, projects.ProjectID, 'canvas', canvas.CanvasID, canvas.name, r.notes, r.accessTime
+FROM canvasrequests r
+inner join canvas on canvas.CanvasID = r.CanvasID
+inner join pages on pages.PageID = canvas.PageID
+inner join projects on projects.ProjectID = pages.ProjectID
+WHERE r.accessGranted AND r.notes != 'GET' AND r.accessTime IS NOT NULL
+UNION ALL
+SELECT projects.UserID, projects.ProjectID, 'file', files.FileID, files.name, 'UPLOAD', files.timeCreated
+FROM files
+inner join pages on pages.PageID = files.PageID
+inner join projects on projects.ProjectID = pages.ProjectID
+WHERE files.timeCreated IS NOT NULL;
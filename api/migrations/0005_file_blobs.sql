@@ -0,0 +1,53 @@
+-- File content moves out of files.content into fixed-size chunk rows, so uploads can be written and downloads read
+-- one chunk at a time. Every chunk of a blob is chunkSize bytes except the last.
+CREATE TABLE blobs (
+    BlobID SERIAL PRIMARY KEY,
+    hash VARCHAR(128),
+    size BIGINT NOT NULL DEFAULT 0,
+    chunkSize INTEGER NOT NULL,
+    timeCreated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE blobChunks (
+    BlobID INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (BlobID, seq),
+    FOREIGN KEY (BlobID) REFERENCES blobs(BlobID) ON DELETE CASCADE
+);
+
+-- Chunks are already compressed or binary more often than not
+ALTER TABLE blobChunks ALTER COLUMN data SET STORAGE EXTERNAL;
+
+ALTER TABLE files ADD COLUMN BlobID INTEGER REFERENCES blobs(BlobID);
+CREATE INDEX files_blobid_idx ON files (BlobID);
+
+DO $$
+DECLARE
+    file RECORD;
+    blob_id INTEGER;
+    chunk_size CONSTANT INTEGER := 1048576;
+BEGIN
+    FOR file IN SELECT FileID, hash, octet_length(content) AS size FROM files LOOP
+        INSERT INTO blobs (hash, size, chunkSize) VALUES (file.hash, file.size, chunk_size) RETURNING BlobID INTO blob_id;
+        INSERT INTO blobChunks (BlobID, seq, data)
+        SELECT blob_id, seq, substring(files.content from seq * chunk_size + 1 for chunk_size)
+        FROM files, generate_series(0, (file.size - 1) / chunk_size) AS seq
+        WHERE files.FileID = file.FileID;
+        UPDATE files SET BlobID = blob_id WHERE FileID = file.FileID;
+    END LOOP;
+END;
+$$;
+
+ALTER TABLE files ALTER COLUMN BlobID SET NOT NULL;
+ALTER TABLE files DROP COLUMN content;
+
+-- A blob belongs to the file that wrote it
+CREATE FUNCTION delete_file_blob() RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM blobs WHERE BlobID = OLD.BlobID;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER files_delete_blob AFTER DELETE ON files FOR EACH ROW EXECUTE FUNCTION delete_file_blob();
@@ -0,0 +1,71 @@
+-- Blobs become content addressed and shared: one blob per distinct SHA-512, referenced by any number of files and
+-- images and collected when the last reference is deleted.
+DROP TRIGGER files_delete_blob ON files;
+DROP FUNCTION delete_file_blob();
+
+ALTER TABLE blobs ADD COLUMN refCount INTEGER NOT NULL DEFAULT 0;
+
+-- Merge the blobs of files with identical content
+UPDATE files SET BlobID = keep.BlobID
+FROM blobs, (SELECT hash, min(BlobID) AS BlobID FROM blobs GROUP BY hash) AS keep
+WHERE blobs.BlobID = files.BlobID AND blobs.hash = keep.hash AND files.BlobID != keep.BlobID;
+DELETE FROM blobs WHERE NOT EXISTS (SELECT 1 FROM files WHERE files.BlobID = blobs.BlobID);
+
+-- Unhashed blobs are uploads still being written
+CREATE UNIQUE INDEX blobs_hash_idx ON blobs (hash);
+
+-- Images move into blobs as well
+ALTER TABLE images ADD COLUMN BlobID INTEGER REFERENCES blobs(BlobID);
+CREATE INDEX images_blobid_idx ON images (BlobID);
+
+DO $$
+DECLARE
+    image RECORD;
+    blob_id INTEGER;
+    chunk_size CONSTANT INTEGER := 1048576;
+BEGIN
+    FOR image IN SELECT ImageID, encode(sha512(content), 'hex') AS hash, octet_length(content) AS size FROM images LOOP
+        SELECT BlobID INTO blob_id FROM blobs WHERE hash = image.hash;
+        IF blob_id IS NULL THEN
+            INSERT INTO blobs (hash, size, chunkSize) VALUES (image.hash, image.size, chunk_size)
+            RETURNING BlobID INTO blob_id;
+            INSERT INTO blobChunks (BlobID, seq, data)
+            SELECT blob_id, seq, substring(images.content from seq * chunk_size + 1 for chunk_size)
+            FROM images, generate_series(0, (image.size - 1) / chunk_size) AS seq
+            WHERE images.ImageID = image.ImageID;
+        END IF;
+        UPDATE images SET BlobID = blob_id WHERE ImageID = image.ImageID;
+    END LOOP;
+END;
+$$;
+
+ALTER TABLE images ALTER COLUMN BlobID SET NOT NULL;
+ALTER TABLE images DROP COLUMN content;
+
+UPDATE blobs SET refCount = (SELECT count(*) FROM files WHERE files.BlobID = blobs.BlobID)
+    + (SELECT count(*) FROM images WHERE images.BlobID = blobs.BlobID);
+
+CREATE FUNCTION retain_blob() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE blobs SET refCount = refCount + 1 WHERE BlobID = NEW.BlobID;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Runs for cascaded deletes too, e.g. when a page's files or a user's images go
+CREATE FUNCTION release_blob() RETURNS TRIGGER AS $$
+DECLARE
+    remaining INTEGER;
+BEGIN
+    UPDATE blobs SET refCount = refCount - 1 WHERE BlobID = OLD.BlobID RETURNING refCount INTO remaining;
+    IF remaining <= 0 THEN
+        DELETE FROM blobs WHERE BlobID = OLD.BlobID;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER files_retain_blob AFTER INSERT ON files FOR EACH ROW EXECUTE FUNCTION retain_blob();
+CREATE TRIGGER files_release_blob AFTER DELETE ON files FOR EACH ROW EXECUTE FUNCTION release_blob();
+CREATE TRIGGER images_retain_blob AFTER INSERT ON images FOR EACH ROW EXECUTE FUNCTION retain_blob();
+CREATE TRIGGER images_release_blob AFTER DELETE ON images FOR EACH ROW EXECUTE FUNCTION release_blob();
@@ -0,0 +1,83 @@
+-- NOTIFY 'changes' with {"table", "op", "id", "project_id", "page_id"} whenever content is written, so connected
+-- clients can be told to refetch instead of polling. Trigger arguments are the row's ID column and whether the row
+-- belongs to a 'project' or a 'page'. Columns are read with dynamic field access rather than to_jsonb so large
+-- content columns are never serialised.
+CREATE FUNCTION notify_change() RETURNS TRIGGER AS $$
+DECLARE
+    changed RECORD;
+    row_id INTEGER;
+    project_id INTEGER;
+    page_id INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+
+    EXECUTE format('SELECT ($1).%I', TG_ARGV[0]) INTO row_id USING changed;
+    IF TG_TABLE_NAME = 'pages' THEN
+        page_id := row_id;
+        project_id := changed.ProjectID;
+        -- Saving a page's content only concerns the page: lists of a project's pages don't show content, and would
+        -- otherwise be refetched on every autosave.
+        IF TG_OP = 'UPDATE' AND NEW.name IS NOT DISTINCT FROM OLD.name AND NEW.ProjectID = OLD.ProjectID
+           AND NEW.timeInvestment IS NOT DISTINCT FROM OLD.timeInvestment THEN
+            project_id := NULL;
+        END IF;
+    ELSIF TG_ARGV[1] = 'page' THEN
+        EXECUTE 'SELECT ($1).pageid' INTO page_id USING changed;
+        SELECT pages.ProjectID INTO project_id FROM pages WHERE pages.PageID = page_id;
+        IF NOT FOUND THEN
+            -- Deleted along with its page, which is already gone; see remember_deleted_page
+            project_id := (nullif(current_setting('changes.deleted_pages', true), '')::jsonb
+                           ->> page_id::TEXT)::INTEGER;
+        END IF;
+    ELSE
+        EXECUTE 'SELECT ($1).projectid' INTO project_id USING changed;
+    END IF;
+
+    PERFORM pg_notify('changes', json_build_object(
+        'table', TG_TABLE_NAME, 'op', TG_OP, 'id', row_id, 'project_id', project_id, 'page_id', page_id
+    )::TEXT);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Rows deleted by the cascade from a page (or a project) are notified after the page row is gone, so the page's
+-- project is kept for the rest of the transaction in the changes.deleted_pages setting, as {"<PageID>": ProjectID}.
+CREATE FUNCTION remember_deleted_page() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM set_config('changes.deleted_pages', (
+        coalesce(nullif(current_setting('changes.deleted_pages', true), ''), '{}')::jsonb
+        || jsonb_build_object(OLD.PageID::TEXT, OLD.ProjectID)
+    )::TEXT, true);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER pages_remember_deleted BEFORE DELETE ON pages
+    FOR EACH ROW EXECUTE FUNCTION remember_deleted_page();
+
+CREATE TRIGGER projects_notify_change AFTER INSERT OR UPDATE OR DELETE ON projects
+    FOR EACH ROW EXECUTE FUNCTION notify_change('projectid', 'project');
+CREATE TRIGGER todo_notify_change AFTER INSERT OR UPDATE OR DELETE ON todo
+    FOR EACH ROW EXECUTE FUNCTION notify_change('todoid', 'project');
+CREATE TRIGGER events_notify_change AFTER INSERT OR UPDATE OR DELETE ON events
+    FOR EACH ROW EXECUTE FUNCTION notify_change('eventid', 'project');
+CREATE TRIGGER tagmappings_notify_change AFTER INSERT OR UPDATE OR DELETE ON tagmappings
+    FOR EACH ROW EXECUTE FUNCTION notify_change('mappingid', 'project');
+CREATE TRIGGER pages_notify_change AFTER INSERT OR UPDATE OR DELETE ON pages
+    FOR EACH ROW EXECUTE FUNCTION notify_change('pageid', 'project');
+CREATE TRIGGER canvas_notify_change AFTER INSERT OR UPDATE OR DELETE ON canvas
+    FOR EACH ROW EXECUTE FUNCTION notify_change('canvasid', 'page');
+CREATE TRIGGER equations_notify_change AFTER INSERT OR UPDATE OR DELETE ON equations
+    FOR EACH ROW EXECUTE FUNCTION notify_change('equationid', 'page');
+CREATE TRIGGER recipes_notify_change AFTER INSERT OR UPDATE OR DELETE ON recipes
+    FOR EACH ROW EXECUTE FUNCTION notify_change('recipeid', 'page');
+CREATE TRIGGER codesnippets_notify_change AFTER INSERT OR UPDATE OR DELETE ON codesnippets
+    FOR EACH ROW EXECUTE FUNCTION notify_change('codeid', 'page');
+CREATE TRIGGER translations_notify_change AFTER INSERT OR UPDATE OR DELETE ON translations
+    FOR EACH ROW EXECUTE FUNCTION notify_change('translationid', 'page');
+CREATE TRIGGER files_notify_change AFTER INSERT OR UPDATE OR DELETE ON files
+    FOR EACH ROW EXECUTE FUNCTION notify_change('fileid', 'page');
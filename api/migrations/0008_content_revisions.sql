@@ -0,0 +1,4 @@
+-- Revision counters for optimistic concurrency on page and translation content. Every content write increments
+-- revision; patch saves name the revision they were made against and are refused if it has moved on.
+ALTER TABLE pages ADD COLUMN revision INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE translations ADD COLUMN revision INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,12 @@
+-- Earlier versions of page content. The current version stays in pages.content; each row here holds either a
+-- zlib-compressed snapshot of its revision or a compressed reverse delta that turns the next newer stored revision
+-- (or the current content) back into it. Written by app/revisions.py on every content save.
+CREATE TABLE pageRevisions (
+    PageID INTEGER NOT NULL,
+    revision INTEGER NOT NULL,
+    snapshot BOOLEAN NOT NULL,
+    data BYTEA NOT NULL,
+    savedTime TIMESTAMP NOT NULL,
+    PRIMARY KEY (PageID, revision),
+    FOREIGN KEY (PageID) REFERENCES pages(PageID) ON DELETE CASCADE
+);
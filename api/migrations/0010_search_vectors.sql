@@ -0,0 +1,42 @@
+-- Full-text search. Each searchable table gets a stored generated tsvector, so it is kept current by every write,
+-- and a GIN index on it. Names are weighted A, descriptions B and content C. Translations are in other languages,
+-- so they are parsed with the 'simple' configuration rather than stemmed as English. Content is indexed up to its
+-- first 500000 characters to stay well clear of the 1MB tsvector limit, which would otherwise reject the write.
+ALTER TABLE pages ADD COLUMN searchVector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', name), 'A') ||
+    setweight(to_tsvector('english', left(content, 500000)), 'C')
+) STORED;
+CREATE INDEX pages_search_idx ON pages USING GIN (searchVector);
+
+ALTER TABLE codesnippets ADD COLUMN searchVector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', name), 'A') ||
+    setweight(to_tsvector('english', description), 'B') ||
+    setweight(to_tsvector('english', left(content, 500000)), 'C')
+) STORED;
+CREATE INDEX codesnippets_search_idx ON codesnippets USING GIN (searchVector);
+
+ALTER TABLE recipes ADD COLUMN searchVector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', name), 'A') ||
+    setweight(to_tsvector('english', description), 'B') ||
+    setweight(to_tsvector('english', left(content, 500000)), 'C')
+) STORED;
+CREATE INDEX recipes_search_idx ON recipes USING GIN (searchVector);
+
+ALTER TABLE equations ADD COLUMN searchVector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', name), 'A') ||
+    setweight(to_tsvector('english', description), 'B') ||
+    setweight(to_tsvector('english', left(content, 500000)), 'C')
+) STORED;
+CREATE INDEX equations_search_idx ON equations USING GIN (searchVector);
+
+ALTER TABLE translations ADD COLUMN searchVector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', left(coalesce(content, ''), 500000)), 'C')
+) STORED;
+CREATE INDEX translations_search_idx ON translations USING GIN (searchVector);
+
+-- Canvas content is drawing JSON, so only the name and description are searchable
+ALTER TABLE canvas ADD COLUMN searchVector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', name), 'A') ||
+    setweight(to_tsvector('english', description), 'B')
+) STORED;
+CREATE INDEX canvas_search_idx ON canvas USING GIN (searchVector);
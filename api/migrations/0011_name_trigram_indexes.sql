@@ -0,0 +1,9 @@
+-- Trigram indexes for typeahead lookup of names (/search/typeahead). gin_trgm_ops serves both the word similarity
+-- operator (<%) and ILIKE prefix patterns.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX projects_name_trgm_idx ON projects USING GIN (name gin_trgm_ops);
+CREATE INDEX pages_name_trgm_idx ON pages USING GIN (name gin_trgm_ops);
+CREATE INDEX tags_tag_trgm_idx ON tags USING GIN (tag gin_trgm_ops);
+CREATE INDEX codesnippets_name_trgm_idx ON codesnippets USING GIN (name gin_trgm_ops);
+CREATE INDEX files_filename_trgm_idx ON files USING GIN (filename gin_trgm_ops);
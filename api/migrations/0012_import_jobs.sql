@@ -0,0 +1,17 @@
+-- Archive imports (/import) run in the background of the worker that received the upload. Their progress is kept
+-- here, written outside the import's own transaction, so any worker can report it.
+CREATE TABLE importJobs (
+    JobID SERIAL PRIMARY KEY,
+    UserID INTEGER NOT NULL,
+    state VARCHAR(16) NOT NULL DEFAULT 'queued', -- queued, running, done or failed
+    stage VARCHAR(64),
+    processed INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    result JSONB,
+    timeCreated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    lastUpdate TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (UserID) REFERENCES users(UserID) ON DELETE CASCADE
+);
+
+CREATE INDEX importjobs_userid_idx ON importJobs (UserID);
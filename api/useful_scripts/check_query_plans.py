@@ -0,0 +1,93 @@
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.canvas import page_canvas_query  # noqa: E402
+from app.events import all_events_query  # noqa: E402
+from app.files import page_files_query, project_files_query  # noqa: E402
+from app.history import history_query  # noqa: E402
+from app.logging import page_last_review_query  # noqa: E402
+from app.pages import pages_by_project_query, last_review_by_project_query, last_review_by_user_query  # noqa: E402
+from app.projects import projects_with_token_query  # noqa: E402
+from app.search import search_query, search_sources, typeahead_query, typeahead_sources  # noqa: E402
+from app.tags import project_tags_query  # noqa: E402
+from app.todo import all_todo_query  # noqa: E402
+
+
+def hot_queries():
+    """
+    The hot lookups of the API, built by the same functions the endpoints use, as (name, (query, params), tables).
+    tables are those that must be read through an index. Sequential scans are disabled while planning so that small
+    development databases still show whether a usable index exists.
+    """
+    now = datetime.now().astimezone()
+    return [
+        ("pages.get_pages_by_project", pages_by_project_query(1, 100), ['pages']),
+        ("files.get_files_by_page", page_files_query(1, 100), ['files']),
+        ("files.get_files_by_project", project_files_query(1, 100), ['files', 'pages']),
+        ("canvas.get_canvas_by_page", page_canvas_query(1, 100), ['canvas']),
+        ("todo.get_all_todo", all_todo_query(1, 100), ['todo']),
+        ("events.get_all_events", all_events_query(1, 100), ['events']),
+        ("tags.get_tags_by_project", project_tags_query(1), ['tagmappings']),
+        ("logging.get_page_last_review", page_last_review_query(1), ['pagerequestrollup']),
+        ("pages.get_last_review_by_project_id", last_review_by_project_query(1), ['pages', 'pagerequestrollup']),
+        ("pages.get_last_review_by_user_id", last_review_by_user_query(1),
+         ['projects', 'pages', 'pagerequestrollup']),
+        ("projects.get_projects_with_token", projects_with_token_query('token', 100),
+         ['sessions', 'projects', 'projectrequests']),
+        ("history.get_history", history_query('user', 1, now - timedelta(days=365), now,
+                                              after=(now - timedelta(days=31), 0), limit=100), ['activitylog']),
+        ("search.search", search_query(1, 'notes', list(search_sources), None, 20, 0),
+         sorted({source[0] for source in search_sources.values()})),
+        ("search.typeahead", typeahead_query(1, 'note', list(typeahead_sources), 10),
+         sorted({source[0] for source in typeahead_sources.values()})),
+    ]
+
+
+def seq_scans(plan):
+    """
+    Yields the relation of every Seq Scan node in an EXPLAIN (FORMAT JSON) plan.
+    """
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan['Relation Name'].lower()
+    for child in plan.get('Plans', []):
+        yield from seq_scans(child)
+
+
+def check_plans(conn):
+    failures = []
+    with conn.cursor() as cursor:
+        cursor.execute("SET enable_seqscan = off;")
+        for name, (query, params), tables in hot_queries():
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cursor.fetchone()[0][0]['Plan']
+            # Partitions are scanned under their own name, e.g. activitylog_2025_01
+            scanned = sorted(r for r in set(seq_scans(plan)) if any(r == t or r.startswith(t + '_') for t in tables))
+            if scanned:
+                failures.append(name)
+                print(f"FAIL {name}: sequential scan on {', '.join(scanned)}")
+            else:
+                print(f"ok   {name}")
+    conn.rollback()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a hot API query is planned with a sequential scan.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", default="5432")
+    parser.add_argument("--dbname", default="mydatabase")
+    parser.add_argument("--user", default="myuser")
+    parser.add_argument("--password", default="mypassword")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(host=args.host, port=args.port, dbname=args.dbname, user=args.user,
+                            password=args.password)
+    failed = check_plans(conn)
+    conn.close()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared by the transfer scripts: an API client over a pooled keep-alive session, a checkpoint of the IDs already
+# transferred so an interrupted transfer resumes where it stopped, and a throughput report.
+
+
+def canary(res):
+    if res.status_code not in (200, 201, 202):
+        raise ValueError(f"Canary! {res.request.method} {res.url} -> {res.status_code}: {res.text[:500]}")
+    return res.json()
+
+
+class Throughput:
+    """
+    Counts requests, bytes and items created across all worker threads, and prints a summary every report_seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.requests = 0
+        self.bytes = 0
+        self.created = 0
+        self.skipped = 0
+        self._stopping = threading.Event()
+
+    def record(self, requests=0, size=0, created=0, skipped=0):
+        with self.lock:
+            self.requests += requests
+            self.bytes += size
+            self.created += created
+            self.skipped += skipped
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        megabytes = self.bytes / 1e6
+        return (f"{self.created} created, {self.skipped} already done | {self.requests} requests "
+                f"({self.requests / elapsed:.1f}/s) | {megabytes:.1f} MB ({megabytes / elapsed:.2f} MB/s) "
+                f"| {elapsed:.0f}s")
+
+    def report_every(self, seconds):
+        def report():
+            while not self._stopping.wait(seconds):
+                print(f"[throughput] {self.summary()}", flush=True)
+
+        threading.Thread(target=report, name="throughput", daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+
+
+class Client:
+    """
+    One API server. Requests from every worker go through a single session whose connection pool is sized to the
+    number of workers, so connections are kept alive and reused instead of opened per request.
+    """
+
+    def __init__(self, address, stats, pool_size, timeout=300):
+        self.address = address.rstrip("/")
+        self.stats = stats
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Only failures to connect are retried: a request that reached the server may have created something
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              max_retries=Retry(total=3, connect=3, read=0, status=0, backoff_factor=0.5))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, **kwargs):
+        res = self.session.request(method, f"{self.address}/{path.lstrip('/')}", timeout=self.timeout, **kwargs)
+        body = res.request.body
+        sent = len(body) if isinstance(body, (bytes, str)) else 0
+        self.stats.record(requests=1, size=sent + len(res.content))
+        return res
+
+    def call(self, method, path, **kwargs):
+        return canary(self.request(method, path, **kwargs))
+
+    def get_bytes(self, path, **kwargs):
+        res = self.request("get", path, **kwargs)
+        if res.status_code != 200:
+            raise ValueError(f"Canary! GET {res.url} -> {res.status_code}")
+        return res.content
+
+    def get_all(self, path, params=None):
+        """
+        Every item of a list endpoint, following its 'next' cursor.
+        """
+        params = dict(params or {})
+        items = []
+        while True:
+            body = self.call("get", path, params=params)
+            items += body['message']
+            cursor = body.get('next')
+            if cursor is None:
+                return items
+            params['cursor'] = cursor
+
+    def login(self, username, password):
+        res = self.request("post", "/users/login", json={"username": username, "password": password})
+        return res.status_code == 200 and res.json().get('message') == "Authenticated Successfully"
+
+
+class Checkpoint:
+    """
+    Source -> destination IDs of everything transferred so far. Each mapping is appended to the file as soon as it is
+    made, so running the transfer again after it stops skips whatever was already created.
+    """
+
+    def __init__(self, path, stats):
+        self.path = path
+        self.stats = stats
+        self.lock = threading.Lock()
+        self.mappings = {}
+        if os.path.exists(path):
+            with open(path) as checkpoint:
+                for line in checkpoint:
+                    try:
+                        kind, source_id, destination_id = json.loads(line)
+                    except ValueError:
+                        # A line cut short when the last run was killed
+                        break
+                    self.mappings.setdefault(kind, {})[source_id] = destination_id
+        self.file = open(path, "a")
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.mappings.values())
+
+    def get(self, kind, source_id):
+        return self.mappings.get(kind, {}).get(str(source_id))
+
+    def ids(self, kind):
+        return dict(self.mappings.get(kind, {}))
+
+    def once(self, kind, source_id, create):
+        """
+        The destination ID of source_id, calling create() for it unless an earlier run already did. Callers make sure
+        no two threads ask for the same source_id at once.
+        """
+        destination_id = self.get(kind, source_id)
+        if destination_id is not None:
+            self.stats.record(skipped=1)
+            return destination_id
+        destination_id = create()
+        with self.lock:
+            self.mappings.setdefault(kind, {})[str(source_id)] = destination_id
+            self.file.write(json.dumps([kind, str(source_id), destination_id]) + "\n")
+            self.file.flush()
+        self.stats.record(created=1)
+        return destination_id
+
+    def close(self):
+        self.file.close()
+
+
+def run_all(pool, function, items):
+    """
+    function(item) for every item on the worker pool, returning the results in order. On the first failure the items
+    not yet started are cancelled and the error is raised.
+    """
+    futures = [pool.submit(function, item) for item in items]
+    try:
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
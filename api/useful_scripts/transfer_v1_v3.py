@@ -1,194 +1,214 @@
 import argparse
-import requests as r
-import shutil
-import json
-import zipfile
 import pickle
-from io import BytesIO
-import time
 import re
-import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
-# Ensure temp directory exists
-os.makedirs('temp', exist_ok=True)
+from transfer_client import Checkpoint, Client, Throughput, run_all
 
+# Loads a version 1 export (a zip of content.pkl, images/ and files/) into a version 3 account. The zip is opened
+# once, images and files go from it to the destination in memory, requests run on a pool of workers, and what has
+# been created is recorded in a checkpoint so the same command can be run again to finish an interrupted transfer.
+# Items that fail are reported and skipped, and retried by the next run.
 
-def create_image(image_handle, dst_address, dst_ip, cookie):
-    files = {"file": image_handle}
-    res = r.post(dst_address + "/images/image", files=files, cookies=cookie)
-    if res.status_code != 200:
-        print("Failed to upload image.")
-        return ""
-    else:
-        print("Uploaded Image")
-    image_id = res.json()['id']
-    return f"http://{dst_ip}/api/images/image?id={image_id}"
+image_pattern = re.compile(
+    r'!\[(.*?)\]\((https?://[^)]*/images\?image=([a-fA-F0-9]+))\)'
+)
 
 
-def process_markdown_images(markdown_text, source_file, dst_address, dst_ip, cookie):
-    if not isinstance(markdown_text, str):
-        print(f"Expected string, got {type(markdown_text)}")
-        return ""
+class SourceArchive:
+    """
+    The version 1 zip, read from any worker thread.
+    """
 
-    pattern = re.compile(
-        r'!\[(.*?)\]\((https?://[^)]*/images\?image=([a-fA-F0-9]+))\)'
-    )
+    def __init__(self, source_file):
+        self.zip = zipfile.ZipFile(source_file, 'r')
+        self.lock = threading.Lock()
 
-    def replacer(match):
-        alt_text, full_url, image_id = match.groups()
-        image_path = os.path.join("images", f"{image_id}.png")
+    def read(self, name):
+        with self.lock:
+            return self.zip.read(name)
 
-        with zipfile.ZipFile(source_file, 'r') as zip_ref:
-            with zip_ref.open(image_path) as file_handle:
-                content = file_handle.read()
-            with open("temp/" + f"{image_id}.png", "wb") as file_out:
-                file_out.write(content)
-            with open("temp/" + f"{image_id}.png", "rb") as image_handle:
-                new_url = create_image(image_handle, dst_address, dst_ip, cookie)
+    def content(self):
+        for file_name in self.zip.namelist():
+            if file_name.endswith('content.pkl'):
+                with self.zip.open(file_name) as pkl_file:
+                    return pickle.load(pkl_file)
+        return None
 
-        return f"![{alt_text}]({new_url})"
+    def close(self):
+        self.zip.close()
 
-    return pattern.sub(replacer, markdown_text)
 
+def attempt(checkpoint, kind, key, create, label):
+    # checkpoint.once, reporting a failure instead of raising it
+    try:
+        return checkpoint.once(kind, key, create)
+    except (ValueError, KeyError) as e:
+        print(f"Failed to create {kind} {label}: {e}")
+        return None
 
-def main(dst_username, dst_password, dst_ip, source_file):
-    dst_address = f"http://{dst_ip}:3001"
 
-    res = r.get(dst_address + "/users/test")
-    if res.json().get('test') != "Users Endpoint Reached.":
-        print("Could not reach user endpoint.")
-        return
+def upload_image(dst, archive, image_id):
+    content = archive.read(f"images/{image_id}.png")
+    return dst.call("post", "/images/image", files={"file": (f"{image_id}.png", content, "image/png")})['id']
 
-    r.post(dst_address + "/users/create_user", json={
-        "username": dst_username,
-        "password": dst_password
-    })
 
-    res = r.post(dst_address + "/users/login", json={
-        "username": dst_username,
-        "password": dst_password
-    })
+def process_markdown_images(markdown_text, image_ids, dst_ip):
+    if not isinstance(markdown_text, str):
+        print(f"Expected string, got {type(markdown_text)}")
+        return ""
 
-    if res.status_code != 200 or res.json().get('message') != "Authenticated Successfully":
-        print("Could Not Authenticate")
-        return
-    else:
-        print("Authenticated")
+    def replacer(match):
+        alt_text, full_url, image_id = match.groups()
+        new_id = image_ids.get(image_id)
+        new_url = "" if new_id is None else f"http://{dst_ip}/api/images/image?id={new_id}"
+        return f"![{alt_text}]({new_url})"
 
-    cookie = {'token': res.cookies['token']}
+    return image_pattern.sub(replacer, markdown_text)
 
-    with zipfile.ZipFile(source_file, 'r') as zip_ref:
-        for file_name in zip_ref.namelist():
-            if file_name.endswith('content.pkl'):
-                with zip_ref.open(file_name) as pkl_file:
-                    content = pickle.load(pkl_file)
-                break
-        else:
-            print("content.pkl not found in the zip.")
-            return
-
-    projects = [content[key] for key in content]
-
-    for project in projects:
-        time.sleep(.1)
-        res = r.post(dst_address + "/projects/create", json={
-            "project_name": project['title'],
-            "project_description": project['purpose'],
-        }, cookies=cookie)
-
-        if res.status_code != 200:
-            print(f"Failed to create project: {project['title']}")
-            continue
 
-        new_project_id = res.json()['id']
-        print(f"Created project: {project['title']}")
+def create_pages(dst, archive, checkpoint, project_key, project, image_ids, dst_ip):
+    """
+    A project's pages, in order, and its files page. Returns the snippets and files to create, as (checkpoint kind,
+    key, function creating it, label).
+    """
+    new_project_id = checkpoint.get('projects', project_key)
+    tasks = []
 
-        for key in project['pages']:
-            page = project['pages'][key]
-            time.sleep(.1)
-            res = r.post(dst_address + "/pages/create", json={
-                "project_id": new_project_id,
-                "name": page['title'],
-            }, cookies=cookie)
+    for key in project['pages']:
+        page = project['pages'][key]
+        page_key = f"{project_key}/{key}"
+
+        def create_page():
+            return dst.call("post", "/pages/create", json={"project_id": new_project_id, "name": page['title']})['id']
 
-            if res.status_code != 200:
-                print(f"Failed to create page: {page['title']}")
-                continue
+        new_page_id = attempt(checkpoint, 'pages', page_key, create_page, page['title'])
+        if new_page_id is None:
+            continue
 
-            new_page_id = res.json()['id']
+        def write_content():
             if page['content'] is None:
                 processed_content = "No Content Yet"
             else:
-                processed_content = process_markdown_images(page['content'], source_file, dst_address, dst_ip, cookie)
-
-            res = r.put(dst_address + "/pages/content", json={
-                "page_id": new_page_id,
-                "content": processed_content,
-            }, cookies=cookie)
+                processed_content = process_markdown_images(page['content'], image_ids, dst_ip)
+            dst.call("put", "/pages/content", json={"page_id": new_page_id, "content": processed_content})
+            return new_page_id
 
-            if res.status_code != 200:
-                print(f"Failed to update page: {page['title']}")
-                continue
-            else:
-                print(f"Updated page: {page['title']}")
+        attempt(checkpoint, 'page_content', page_key, write_content, page['title'])
 
-            for snippet in page.get('code_snippets', {}).values():
-                time.sleep(.1)
-                res = r.post(dst_address + "/code_snippet/create", json={
+        for snippet_key, snippet in page.get('code_snippets', {}).items():
+            def create_snippet(snippet=snippet, new_page_id=new_page_id):
+                return dst.call("post", "/code_snippet/create", json={
                     "page_id": new_page_id,
                     "name": snippet['title'],
                     "description": snippet['description'],
                     "language": snippet['language'].lower(),
                     "content": snippet['raw'],
-                }, cookies=cookie)
+                })['id']
+            tasks.append(('snippets', f"{page_key}/{snippet_key}", create_snippet, snippet['title']))
 
-                if res.status_code != 200:
-                    print(f"Failed to create snippet: {snippet['title']}")
-                else:
-                    print(f"Created snippet: {snippet['title']}")
-
-        if project.get('files'):
-            res = r.post(dst_address + "/pages/create", json={
+    if project.get('files'):
+        def create_files_page():
+            new_page_id = dst.call("post", "/pages/create", json={
                 "project_id": new_project_id,
                 "name": "Transition File Container",
-            }, cookies=cookie)
-
-            if res.status_code != 200:
-                print("Failed to create page: Transition File Container")
-                continue
-
-            new_page_id = res.json()['id']
-
-            res = r.put(dst_address + "/pages/content", json={
+            })['id']
+            dst.call("put", "/pages/content", json={
                 "page_id": new_page_id,
-                "content": "This is a page used to hold file uploads from version 1. Version 3 assigns files to individual pages.",
-            }, cookies=cookie)
-
-            for file in project['files'].values():
-                time.sleep(.1)
-                with zipfile.ZipFile(source_file, 'r') as zip_ref:
-                    with zip_ref.open("files/" + file['file_name']) as file_handle:
-                        content = file_handle.read()
-
-                temp_path = os.path.join("temp", file['original_file_name'])
-                with open(temp_path, "wb") as f:
-                    f.write(content)
-
-                with open(temp_path, "rb") as file_to_upload:
-                    files = {"file": file_to_upload}
-                    data = {
-                        "page_id": new_page_id,
+                "content": "This is a page used to hold file uploads from version 1. "
+                           "Version 3 assigns files to individual pages.",
+            })
+            return new_page_id
+
+        files_page_id = attempt(checkpoint, 'pages', f"{project_key}/files", create_files_page,
+                                "Transition File Container")
+        if files_page_id is not None:
+            for file_key, file in project['files'].items():
+                def upload_file(file=file):
+                    file_content = archive.read("files/" + file['file_name'])
+                    return dst.call("post", "/files/file", data={
+                        "page_id": files_page_id,
                         "name": file['title'],
                         "description": file['description']
-                    }
-                    res = r.post(dst_address + "/files/file", data=data, files=files, cookies=cookie)
+                    }, files={"file": (file['original_file_name'], file_content)})['id']
+                tasks.append(('files', f"{project_key}/{file_key}", upload_file, file['title']))
+
+    return tasks
+
+
+def main(dst_username, dst_password, dst_ip, source_file, workers, checkpoint_path, report_seconds):
+    stats = Throughput()
+    dst = Client(f"http://{dst_ip}:3001", stats, workers)
+
+    res = dst.request("get", "/users/test")
+    if res.json().get('test') != "Users Endpoint Reached.":
+        print("Could not reach user endpoint.")
+        return
+
+    dst.request("post", "/users/create_user", json={
+        "username": dst_username,
+        "password": dst_password
+    })
+
+    if dst.login(dst_username, dst_password):
+        print("Authenticated")
+    else:
+        print("Could Not Authenticate")
+        return
+
+    archive = SourceArchive(source_file)
+    content = archive.content()
+    if content is None:
+        print("content.pkl not found in the zip.")
+        archive.close()
+        return
 
-                if res.status_code != 200:
-                    print(f"Failed to upload file: {file['title']}")
-                else:
-                    print(f"Uploaded file: {file['title']}")
-    if os.path.exists('temp'):
-        shutil.rmtree('temp')
+    if checkpoint_path is None:
+        checkpoint_path = f"transfer-v1-{dst_username}@{dst_ip}.checkpoint"
+    checkpoint = Checkpoint(checkpoint_path, stats)
+    if len(checkpoint) > 0:
+        print(f"Resuming from {checkpoint_path}: {len(checkpoint)} items already transferred")
+
+    stats.report_every(report_seconds)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Created one at a time so the projects keep their order
+            for project_key, project in content.items():
+                def create_project():
+                    return dst.call("post", "/projects/create", json={
+                        "project_name": project['title'],
+                        "project_description": project['purpose'],
+                    })['id']
+                if attempt(checkpoint, 'projects', project_key, create_project, project['title']) is not None:
+                    print(f"Created project: {project['title']}")
+
+            # Every image is uploaded once, however many pages show it
+            image_ids = set()
+            for project in content.values():
+                for page in project['pages'].values():
+                    if isinstance(page['content'], str):
+                        image_ids |= {match[2] for match in image_pattern.findall(page['content'])}
+            print(f"{len(image_ids)} Images To Transfer")
+            run_all(pool, lambda image_id: attempt(checkpoint, 'images', image_id,
+                                                   lambda: upload_image(dst, archive, image_id), image_id),
+                    sorted(image_ids))
+            image_map = checkpoint.ids('images')
+
+            created = [(project_key, project) for project_key, project in content.items()
+                       if checkpoint.get('projects', project_key) is not None]
+            tasks = run_all(pool, lambda item: create_pages(dst, archive, checkpoint, *item, image_map, dst_ip),
+                            created)
+            tasks = [task for project_tasks in tasks for task in project_tasks]
+
+            print(f"{len(tasks)} Snippets And Files To Transfer")
+            run_all(pool, lambda task: attempt(checkpoint, *task), tasks)
+    finally:
+        stats.stop()
+        checkpoint.close()
+        archive.close()
+        print(f"[throughput] {stats.summary()}")
 
 
 if __name__ == "__main__":
@@ -197,6 +217,11 @@ if __name__ == "__main__":
     parser.add_argument("--dst_password", required=True, help="Destination password")
     parser.add_argument("--dst_ip", required=True, help="Destination IP address")
     parser.add_argument("--source_file", required=True, help="Path to source zip file")
+    parser.add_argument("--workers", type=int, default=8, help="Requests to run at once")
+    parser.add_argument("--checkpoint", help="File recording what has been transferred, to resume from "
+                                             "(default: transfer-v1-<dst>.checkpoint)")
+    parser.add_argument("--report_seconds", type=float, default=10, help="Seconds between throughput reports")
 
     args = parser.parse_args()
-    main(args.dst_username.strip(), args.dst_password.strip(), args.dst_ip.strip(), args.source_file)
+    main(args.dst_username.strip(), args.dst_password.strip(), args.dst_ip.strip(), args.source_file,
+         max(args.workers, 1), args.checkpoint, args.report_seconds)
@@ -1,127 +1,258 @@
 import argparse
-import os
-import time
-import shutil
-
-os.makedirs('temp', exist_ok=True)
-
-import requests as r
 import json
 import re
+from concurrent.futures import ThreadPoolExecutor
 
-from pprint import pprint
-
-
-def canary(res):
-    if res.status_code != 200:
-        print(res)
-        res = res.json()
-        pprint(res)
-        raise ValueError("Canary!")
-    return res.json()
-
-
-def replace_canvas_images(content, src_address, src_cookie, dst_address, dst_cookie):
-    parsed_content = json.loads(content)
-    for image in parsed_content['images']:
-        src_res = r.get(src_address + "/images/image", params={"id": image['id']}, cookies=src_cookie)
-        if src_res.status_code != 200:
-            print("issue getting image")
-            raise ValueError("Canary!")
-
-        with open("temp/temp.png", "wb") as file_out:
-            file_out.write(src_res.content)
-
-        with open("temp/temp.png", "rb") as new_image:
-            files = {"file": new_image}
-
-            dst_res = r.post(dst_address + "/images/image", files=files, cookies=dst_cookie)
-            dst_id = canary(dst_res)['id']
-
-        image['id'] = dst_id
-
-    return json.dumps(parsed_content)
+from transfer_client import Checkpoint, Client, Throughput, run_all
 
+# Copies one account to another server through the API. Requests run on a pool of workers over keep-alive sessions,
+# images and files are passed along in memory, and every source -> destination ID is written to a checkpoint, so
+# running the same command again after an interruption carries on instead of starting over.
 
-def translate_images(origional_link, src_address, src_cookie, dst_address, dst_cookie, dst_ip):
-    time.sleep(.01)
-    source_id = origional_link.split("=")[-1]
-    src_res = r.get(src_address + "/images/image", params={"id": source_id}, cookies=src_cookie)
-    if src_res.status_code != 200:
-        print("issue getting image")
-        raise ValueError("Canary!")
+# Matches ![image](http://<host>/api/images/image?id=123)
+image_pattern = re.compile(r'!\[image\]\((http[s]?://[^)]+/api/images/image\?id=(\d+))\)')
 
-    with open("temp/temp.png", "wb") as file_out:
-        file_out.write(src_res.content)
 
-    with open("temp/temp.png", "rb") as image:
-        files = {"file": image}
+def markdown_image_ids(markdown):
+    return {int(image_id) for _, image_id in image_pattern.findall(markdown or "")}
 
-        dst_res = r.post(dst_address + "/images/image", files=files, cookies=dst_cookie)
-    dst_id = canary(dst_res)['id']
 
-    print(f"Created image ID: {dst_id} on Destination.")
+def canvas_image_ids(content):
+    if not content:
+        return set()
+    return {int(image['id']) for image in json.loads(content)['images']}
 
-    return f'http://{dst_ip}/api/images/image?id={dst_id}'
-
-
-def process_markdown_images(markdown, translate_images, src_address, src_cookie, dst_address, dst_cookie, dst_ip):
-    # Pattern to match ![image](http://<host>/api/images/image?id=123)
-    pattern = re.compile(r'!\[image\]\((http[s]?://[^)]+/api/images/image\?id=\d+)\)')
 
+def process_markdown_images(markdown, image_ids, dst_ip):
     def replacer(match):
-        original_link = match.group(1)
-        new_link = translate_images(original_link, src_address, src_cookie, dst_address, dst_cookie, dst_ip)
-        return f'![image]({new_link})'
+        new_id = image_ids.get(match.group(2))
+        if new_id is None:
+            return match.group(0)
+        return f'![image](http://{dst_ip}/api/images/image?id={new_id})'
 
-    return pattern.sub(replacer, markdown)
+    return image_pattern.sub(replacer, markdown)
 
 
-def main(dst_username, dst_password, dst_ip, src_username, src_password, src_ip, delete_dst_user):
-    src_address = f"http://{src_ip}:3001/"
+def replace_canvas_images(content, image_ids):
+    if not content:
+        return content
+    parsed_content = json.loads(content)
+    for image in parsed_content['images']:
+        image['id'] = image_ids.get(str(image['id']), image['id'])
+    return json.dumps(parsed_content)
 
-    dst_address = f"http://{dst_ip}:3001/"
 
-    # src_res = r.post(src_address + "/users/create_user", json={
-    #     "username": src_username,
-    #     "password": src_password
-    # })
-    # src_res = src_res.json()
+def copy_image(src, dst, checkpoint, image_id):
+    def create():
+        res = src.request("get", "/images/image", params={"id": image_id})
+        if res.status_code != 200 or not res.headers.get("Content-Type", "").startswith("image/"):
+            raise ValueError(f"Canary! Could not read image {image_id}")
+        return dst.call("post", "/images/image", files={"file": (f"{image_id}.png", res.content, "image/png")})['id']
+
+    return checkpoint.once('images', image_id, create)
+
+
+def read_project(src, project):
+    project_id = project['ProjectID']
+    return {
+        'project': project,
+        'tags': src.get_all("/tags/get_by_project", {"project_id": project_id}),
+        'todos': src.get_all("/todo/get_project_todo", {"project_id": project_id}),
+        'events': src.get_all("/events/get_project_events", {"project_id": project_id}),
+        'pages': src.get_all("/pages/get_project_pages", {"id": project_id}),
+    }
+
+
+def read_page(src, page):
+    page_id = page['PageID']
+    canvases = src.get_all("/canvas/get_all_by_page", {"id": page_id})
+    for canvas in canvases:
+        canvas['content'] = src.call("get", "/canvas/get", params={"id": canvas['CanvasID']})['message']['content']
+    # Translation lists carry their content, canvas lists don't
+    translations = src.get_all("/translations/get_all_by_page", {"id": page_id})
+    return {
+        'page': page,
+        'content': src.call("get", "/pages/get", params={"id": page_id})['message']['content'],
+        'snippets': src.get_all("/code_snippet/get_all_by_page", {"id": page_id}),
+        'recipes': src.get_all("/recipes/get_all_by_page", {"id": page_id}),
+        'equations': src.get_all("/equations/get_all_by_page", {"id": page_id}),
+        'canvases': canvases,
+        # Only translations with content were ever copied
+        'translations': [translation for translation in translations if translation['content'] is not None],
+        'files': src.get_all("/files/files_by_page", {"page_id": page_id}),
+    }
+
+
+def create_pages(dst, checkpoint, project, pages, image_ids, dst_ip):
+    # One project's pages, in order, so they are numbered on the destination as they were on the source
+    dst_project_id = checkpoint.get('projects', project['ProjectID'])
+    for page in pages:
+        src_page_id = page['page']['PageID']
+
+        def create_page():
+            return dst.call("post", "/pages/create", json={"project_id": dst_project_id,
+                                                           "name": page['page']['name']})['id']
+
+        dst_page_id = checkpoint.once('pages', src_page_id, create_page)
+
+        def write_content():
+            dst.call("put", "/pages/content", json={
+                "page_id": dst_page_id,
+                "content": process_markdown_images(page['content'], image_ids, dst_ip)})
+            return dst_page_id
+
+        checkpoint.once('page_content', src_page_id, write_content)
+    print(f"Created {len(pages)} pages of {project['name']} on Destination.")
+
+
+def project_tasks(dst, checkpoint, project):
+    """
+    The tag assignments, todos and events of a project, as (checkpoint kind, source ID, function creating it).
+    """
+    src_project_id = project['project']['ProjectID']
+    dst_project_id = checkpoint.get('projects', src_project_id)
+    tasks = []
+
+    for tag in project['tags']:
+        def assign(tag=tag):
+            dst_tag_id = checkpoint.get('tags', tag['TagID'])
+            dst.call("post", "/tags/assign", json={'tag_id': dst_tag_id, "project_id": dst_project_id})
+            return dst_tag_id
+        tasks.append(('tag_assignments', f"{src_project_id}:{tag['TagID']}", assign))
+
+    for todo in project['todos']:
+        def create_todo(todo=todo):
+            new_todo_id = dst.call("post", "/todo/create", json={
+                "project_id": dst_project_id,
+                "name": todo['name'],
+                "description": todo['description'],
+                "dueTime": todo['dueTime'],
+                "recurring": todo['recurring'],
+                "interval": todo['interval']})['id']
+            if todo['completed']:
+                dst.call("patch", "/todo/completed_previously", json={
+                    "todo_id": new_todo_id,
+                    "completion_time": todo['timeCompleted']})
+            return new_todo_id
+        tasks.append(('todos', todo['TodoID'], create_todo))
 
-    src_res = r.post(src_address + "/users/login", json={
-        "username": src_username,
-        "password": src_password
-    })
-    src_json = src_res.json()
-    if src_json['message'] == "Authenticated Successfully":
+    for event in project['events']:
+        def create_event(event=event):
+            return dst.call("post", "/events/create", json={
+                "project_id": dst_project_id,
+                "name": event['name'],
+                "description": event['description'],
+                "startTime": event['startTime'],
+                "endTime": event['endTime']})['id']
+        tasks.append(('events', event['EventID'], create_event))
+
+    return tasks
+
+
+def page_tasks(src, dst, checkpoint, page, image_ids, dst_ip):
+    """
+    The snippets, recipes, equations, canvases, translations and files of a page, as (checkpoint kind, source ID,
+    function creating it).
+    """
+    dst_page_id = checkpoint.get('pages', page['page']['PageID'])
+    tasks = []
+
+    for snippet in page['snippets']:
+        def create_snippet(snippet=snippet):
+            return dst.call("post", "/code_snippet/create", json={
+                "page_id": dst_page_id,
+                "name": snippet['name'],
+                "description": snippet['description'],
+                "language": snippet['language'],
+                "content": snippet['content']})['id']
+        tasks.append(('snippets', snippet['CodeID'], create_snippet))
+
+    for recipe in page['recipes']:
+        def create_recipe(recipe=recipe):
+            return dst.call("post", "/recipes/create", json={
+                "page_id": dst_page_id,
+                "name": recipe['name'],
+                "description": recipe['description'],
+                "content": process_markdown_images(recipe['content'], image_ids, dst_ip)})['id']
+        tasks.append(('recipes', recipe['RecipeID'], create_recipe))
+
+    for equation in page['equations']:
+        def create_equation(equation=equation):
+            return dst.call("post", "/equations/create", json={
+                "page_id": dst_page_id,
+                "name": equation['name'],
+                "description": equation['description'],
+                "content": equation['content']})['id']
+        tasks.append(('equations', equation['EquationID'], create_equation))
+
+    for canvas in page['canvases']:
+        def create_canvas(canvas=canvas):
+            return dst.call("post", "/canvas/create", json={
+                "page_id": dst_page_id,
+                "name": canvas['name'],
+                "description": canvas['description'],
+                "content": replace_canvas_images(canvas['content'], image_ids)})['id']
+        tasks.append(('canvases', canvas['CanvasID'], create_canvas))
+
+    for translation in page['translations']:
+        def create_translation(translation=translation):
+            # Created and then filled, each step recorded so a resumed transfer neither repeats nor skips one
+            translation_id = checkpoint.once('translations', translation['TranslationID'], lambda: dst.call(
+                "post", "/translations/create", json={
+                    "page_id": dst_page_id,
+                    "language": translation['language']})['id'])
+            dst.call("put", "/translations/update", json={
+                "translation_id": translation_id,
+                "new_content": process_markdown_images(translation['content'], image_ids, dst_ip)})
+            return translation_id
+        tasks.append(('translation_content', translation['TranslationID'], create_translation))
+
+    for file in page['files']:
+        def upload_file(file=file):
+            content = src.get_bytes("/files/file", params={"id": file['FileID']})
+            return dst.call("post", "/files/file", data={
+                "page_id": dst_page_id,
+                "name": file['name'],
+                "description": file['description']}, files={"file": (file['filename'], content)})['id']
+        tasks.append(('files', file['FileID'], upload_file))
+
+    return tasks
+
+
+def main(dst_username, dst_password, dst_ip, src_username, src_password, src_ip, delete_dst_user, workers,
+         checkpoint_path, report_seconds):
+    stats = Throughput()
+    src = Client(f"http://{src_ip}:3001/", stats, workers)
+    dst = Client(f"http://{dst_ip}:3001/", stats, workers)
+
+    if checkpoint_path is None:
+        checkpoint_path = f"transfer-{src_username}@{src_ip}-{dst_username}@{dst_ip}.checkpoint"
+    checkpoint = Checkpoint(checkpoint_path, stats)
+    resuming = len(checkpoint) > 0
+    if resuming:
+        print(f"Resuming from {checkpoint_path}: {len(checkpoint)} items already transferred")
+
+    if src.login(src_username, src_password):
         print("Authenticated With Source")
     else:
         print(f"Could Not Authenticate with Source: {src_username}@{src_password}")
-        print(src_json)
         return
-    src_cookie = {'token': src_res.cookies['token']}
-
-    if delete_dst_user:
-        dst_res = r.post(dst_address + "/users/login", json={
-            "username": dst_username,
-            "password": dst_password
-        })
-        dst_json = dst_res.json()
-        if dst_json['message'] == "Authenticated Successfully":
+
+    if delete_dst_user and resuming:
+        # The checkpoint's IDs point into the destination account, so it has to be kept
+        print("Not deleting the destination user while resuming")
+    elif delete_dst_user:
+        if dst.login(dst_username, dst_password):
             print("Authenticated With Destination To Delete Account")
-            dst_cookie = {'token': dst_res.cookies['token']}
-            dst_res = r.delete(dst_address + "/users/delete", json={
+            dst_res = dst.request("delete", "/users/delete", json={
                 "username": dst_username,
-                "password": dst_password}, cookies=dst_cookie)
-            dst_res = dst_res.json()
+                "password": dst_password}).json()
             if dst_res['status'] == "success":
                 print(f"Deleted Destination User: {dst_username}@{dst_ip}")
 
-            dst_res = r.post(dst_address + "/users/create_user", json={
+            dst_res = dst.request("post", "/users/create_user", json={
                 "username": dst_username,
-                "password": dst_password
-            })
-            dst_res = dst_res.json()
+                "password": dst_password}).json()
             if dst_res['status'] == "success":
                 print(f"Created Destination User: {dst_username}@{dst_ip}")
         else:
@@ -129,249 +260,62 @@ def main(dst_username, dst_password, dst_ip, src_username, src_password, src_ip,
     else:
         print("Proceeding without deleting destination")
 
-    dst_res = r.post(dst_address + "/users/login", json={
-        "username": dst_username,
-        "password": dst_password
-    })
-    dst_json = dst_res.json()
-    if dst_json['message'] == "Authenticated Successfully":
-        print("Authenticated With Source")
+    if dst.login(dst_username, dst_password):
+        print("Authenticated With Destination")
     else:
-        print(f"Could Not Authenticate with Source: {dst_username}@{dst_password}")
-        print(dst_json)
+        print(f"Could Not Authenticate with Destination: {dst_username}@{dst_password}")
         return
-    dst_cookie = {'token': dst_res.cookies['token']}
-
-    src_res = r.get(src_address + "/projects/get_all", cookies=src_cookie)
-    src_res = src_res.json()
-    src_projects = src_res['message'][::-1]
-
-    print(f"{len(src_projects)} Projects To Transfer")
-
-    src_res = r.get(src_address + "/tags/get", cookies=src_cookie)
-    src_res = src_res.json()
-    src_tags = src_res['message']
-
-    print(f"{len(src_tags)} Tags To Transfer")
-
-    tag_mapping = dict()
-
-    for tag in src_tags:
-        dst_res = r.post(dst_address + "/tags/create", json={
-            "tag": tag['tag'],
-            "options": tag['options']}, cookies=dst_cookie)
-        dst_tag = dst_res.json()
-        print(f"Created tag: {tag['tag']} on Destination.")
-        tag_mapping[tag['TagID']] = dst_tag['id']
-
-    for idx, project in enumerate(src_projects):
-        print(f"Progress: {idx / len(src_projects) * 100}%")
-        time.sleep(.01)
-        # Create new project in DST and get the id
-        dst_res = r.post(dst_address + "/projects/create", json={
-            "project_name": project['name'],
-            "project_description": project['description']}, cookies=dst_cookie)
-        dst_res = canary(dst_res)
-        print(f"Created project: {project['name']} on Destination.")
-        dst_project_id = dst_res['id']
-
-        # Check to see if there are tags in assigned to the source.
-        src_res = r.get(src_address + "/tags/get_by_project", params={"project_id": project['ProjectID']},
-                        cookies=src_cookie)
-        src_tags = canary(src_res)['message']
-        if len(src_tags) > 0:
-            for tag in src_tags:
-                res = r.post(dst_address + "/tags/assign",
-                             json={'tag_id': tag_mapping[tag['TagID']], "project_id": dst_project_id, },
-                             cookies=dst_cookie)
-                canary(res)
-
-        # Get Src Project Todos to Recreate
-        src_res = r.get(src_address + "/todo/get_project_todo", params={"project_id": project['ProjectID']},
-                        cookies=src_cookie)
-        src_todos = canary(src_res)['message']
-        for todo in src_todos:
-            time.sleep(.01)
-            dst_res = r.post(dst_address + "/todo/create", json={
-                "project_id": dst_project_id,
-                "name": todo['name'],
-                "description": todo['description'],
-                "dueTime": todo['dueTime'],
-                "recurring": todo['recurring'],
-                "interval": todo['interval']}, cookies=dst_cookie)
-            new_todo_id = canary(dst_res)['id']
-
-            print(f"Created todo: {todo['name']} on Destination.")
-            if todo['completed']:
-                dst_res = r.patch(dst_address + "/todo/completed_previously", json={
-                    "todo_id": new_todo_id,
-                    "completion_time": todo['timeCompleted']}, cookies=dst_cookie)
-                canary(dst_res)
 
-        # Get Src Project Events to Recreate
-        src_res = r.get(src_address + "/events/get_project_events", params={"project_id": project['ProjectID']},
-                        cookies=src_cookie)
-        src_events = canary(src_res)['message']
-
-        for event in src_events:
-            time.sleep(.01)
-            dst_res = r.post(dst_address + "/events/create", json={
-                "project_id": dst_project_id,
-                "name": event['name'],
-                "description": event['description'],
-                "startTime": event['startTime'],
-                "endTime": event['endTime']}, cookies=dst_cookie)
-            new_event_id = canary(dst_res)['id']
-            canary(dst_res)
-            print(f"Created event: {event['name']} on Destination.")
-
-        # Create Src Pages in the project
-        src_res = r.get(src_address + "/pages/get_project_pages", params={"id": project['ProjectID']},
-                        cookies=src_cookie)
-        src_pages = canary(src_res)['message']
-        for page in src_pages:
-            time.sleep(.01)
-            src_page_id = page['PageID']
-
-            # have to get source content.
-            src_res = r.get(src_address + "/pages/get", params={"id": src_page_id}, cookies=src_cookie)
-            content = canary(src_res)['message']['content']
-
-            translated_page_content = process_markdown_images(content, translate_images, src_address, src_cookie,
-                                                              dst_address, dst_cookie, dst_ip)
-
-            dst_res = r.post(dst_address + "/pages/create", json={"project_id": dst_project_id, "name": page['name']},
-                             cookies=dst_cookie)
-            dst_page_id = canary(dst_res)['id']
-
-            print(f"Created page: {page['name']} on Destination.")
-
-            dst_res = r.put(dst_address + "/pages/content",
-                            json={"page_id": dst_page_id, "content": translated_page_content}, cookies=dst_cookie)
-            canary(dst_res)
-
-            # Page Code Snippets:
-            src_res = r.get(src_address + "/code_snippet/get_all_by_page", params={"id": src_page_id},
-                            cookies=src_cookie)
-            src_code_snippets = canary(src_res)['message']
-
-            for snippet in src_code_snippets:
-                time.sleep(.01)
-                dst_res = r.post(dst_address + "/code_snippet/create", json={
-                    "page_id": dst_page_id,
-                    "name": snippet['name'],
-                    "description": snippet['description'],
-                    "language": snippet['language'],
-                    "content": snippet['content']}, cookies=dst_cookie)
-                canary(dst_res)
-
-                print(f"Created snippet: {snippet['name']} on Destination.")
-
-            # Page Recipes
-            src_res = r.get(src_address + "/recipes/get_all_by_page", params={"id": src_page_id}, cookies=src_cookie)
-            src_recipes = canary(src_res)['message']
-
-            for recipe in src_recipes:
-                time.sleep(.01)
-                translated_recipe_content = process_markdown_images(recipe['content'], translate_images, src_address,
-                                                                    src_cookie, dst_address, dst_cookie, dst_ip)
-                dst_res = r.post(dst_address + "/recipes/create", json={
-                    "page_id": dst_page_id,
-                    "name": recipe['name'],
-                    "description": recipe['description'],
-                    "content": translated_recipe_content}, cookies=dst_cookie)
-                canary(dst_res)
-
-                print(f"Created recipe: {recipe['name']} on Destination.")
-
-            # Page Equations
-            src_res = r.get(src_address + "/equations/get_all_by_page", params={"id": src_page_id}, cookies=src_cookie)
-            src_equations = canary(src_res)['message']
-
-            for equation in src_equations:
-                time.sleep(.01)
-                dst_res = r.post(dst_address + "/equations/create", json={
-                    "page_id": dst_page_id,
-                    "name": equation['name'],
-                    "description": equation['description'],
-                    "content": equation['content']}, cookies=dst_cookie)
-                canary(dst_res)
-
-                print(f"Created equation: {equation['name']} on Destination.")
-
-            # Page Canvas
-            src_res = r.get(src_address + "/canvas/get_all_by_page", params={"id": src_page_id}, cookies=src_cookie)
-            src_canvases = canary(src_res)['message']
-
-            for canvas in src_canvases:
-                src_res = r.get(src_address + "/canvas/get", params={"id": canvas['CanvasID']}, cookies=src_cookie)
-                content = canary(src_res)['message']['content']
-                content = replace_canvas_images(content, src_address, src_cookie, dst_address, dst_cookie)
-                time.sleep(.01)
-                dst_res = r.post(dst_address + "/canvas/create", json={
-                    "page_id": dst_page_id,
-                    "name": canvas['name'],
-                    "description": canvas['description'],
-                    "content": content}, cookies=dst_cookie)
-                canary(dst_res)
-
-                print(f"Created canvas: {canvas['name']} on Destination.")
-
-            # Page translations
-            src_res = r.get(src_address + "/translations/get_all_by_page", params={"id": src_page_id},
-                            cookies=src_cookie)
-            src_translations = canary(src_res)['message']
-
-            for translation in src_translations:
-                src_res = r.get(src_address + "/translations/get", params={"id": translation['TranslationID']},
-                                cookies=src_cookie)
-                content = canary(src_res)['message']['content']
-                if content is None:
-                    continue
-                time.sleep(.01)
-                translated_translation_content = process_markdown_images(content, translate_images, src_address,
-                                                                         src_cookie, dst_address, dst_cookie, dst_ip)
-                dst_res = r.post(dst_address + "/translations/create", json={
-                    "page_id": dst_page_id,
-                    "language": translation['language']}, cookies=dst_cookie)
-                translation_id = canary(dst_res)['id']
-
-                dst_res = r.put(dst_address + "/translations/update", json={
-                    "translation_id": translation_id,
-                    "new_content": translated_translation_content}, cookies=dst_cookie)
-                canary(dst_res)
-
-                print(f"Created translation: {translation['language']} on Destination.")
-
-            # Page Files
-            src_res = r.get(src_address + "/files/files_by_page", params={"page_id": src_page_id}, cookies=src_cookie)
-            src_files = canary(src_res)
-
-            for file in src_files:
-                print(f"Uploading File: {file['name']} from {project['name']}/{page['name']}")
-                time.sleep(.01)
-                src_res = r.get(src_address + "/files/file", params={"id": file['FileID']}, cookies=src_cookie)
-                if src_res.status_code != 200:
-                    print("issue with files")
-                    raise ValueError("Canary!")
-                with open("temp/" + file['filename'], "wb") as file_out:
-                    file_out.write(src_res.content)
-
-                with open("temp/" + file['filename'], "rb") as file_to_upload:
-                    files = {"file": file_to_upload}
-                    data = {
-                        "page_id": dst_page_id,
-                        "name": file['name'],
-                        "description": file['description']}
-                    res = r.post(dst_address + "/files/file", data=data, files=files, cookies=dst_cookie)
-
-                print(f"Created file: {file['name']} on Destination.")
+    stats.report_every(report_seconds)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            src_tags = src.get_all("/tags/get")
+            print(f"{len(src_tags)} Tags To Transfer")
+            run_all(pool, lambda tag: checkpoint.once('tags', tag['TagID'], lambda: dst.call(
+                "post", "/tags/create", json={"tag": tag['tag'], "options": tag['options']})['id']), src_tags)
+
+            # Created one at a time, oldest first, so the projects keep their order
+            src_projects = src.get_all("/projects/get_all")[::-1]
+            print(f"{len(src_projects)} Projects To Transfer")
+            for project in src_projects:
+                checkpoint.once('projects', project['ProjectID'], lambda: dst.call("post", "/projects/create", json={
+                    "project_name": project['name'],
+                    "project_description": project['description']})['id'])
+
+            projects = run_all(pool, lambda project: read_project(src, project), src_projects)
+            pages = run_all(pool, lambda page: read_page(src, page),
+                            [page for project in projects for page in project['pages']])
+            pages_by_id = {page['page']['PageID']: page for page in pages}
+            print(f"Read {len(pages)} pages from Source.")
+
+            # Every image is copied once, however many pages show it
+            image_ids = set()
+            for page in pages:
+                image_ids |= markdown_image_ids(page['content'])
+                for item in page['recipes'] + page['translations']:
+                    image_ids |= markdown_image_ids(item['content'])
+                for canvas in page['canvases']:
+                    image_ids |= canvas_image_ids(canvas['content'])
+            print(f"{len(image_ids)} Images To Transfer")
+            run_all(pool, lambda image_id: copy_image(src, dst, checkpoint, image_id), sorted(image_ids))
+            image_map = checkpoint.ids('images')
+
+            run_all(pool, lambda project: create_pages(
+                dst, checkpoint, project['project'], [pages_by_id[page['PageID']] for page in project['pages']],
+                image_map, dst_ip), projects)
+
+            tasks = [task for project in projects for task in project_tasks(dst, checkpoint, project)]
+            tasks += [task for page in pages for task in page_tasks(src, dst, checkpoint, page, image_map, dst_ip)]
+            print(f"{len(tasks)} Todos, Events, Tags and Page Items To Transfer")
+            run_all(pool, lambda task: checkpoint.once(*task), tasks)
+    finally:
+        stats.stop()
+        checkpoint.close()
+        print(f"[throughput] {stats.summary()}")
 
     print(f"Progress: {100}%")
     print(f"Destination Username: {dst_username}")
     print(f"Destination Password: {dst_password}")
-    if os.path.exists('temp'):
-        shutil.rmtree('temp')
 
 
 if __name__ == "__main__":
@@ -388,8 +332,12 @@ if __name__ == "__main__":
         action="store_true",
         help="If set, the destination user will be deleted."
     )
+    parser.add_argument("--workers", type=int, default=8, help="Requests to run at once")
+    parser.add_argument("--checkpoint", help="File recording what has been transferred, to resume from "
+                                             "(default: transfer-<src>-<dst>.checkpoint)")
+    parser.add_argument("--report_seconds", type=float, default=10, help="Seconds between throughput reports")
 
     args = parser.parse_args()
     main(args.dst_username.strip(), args.dst_password.strip(), args.dst_ip.strip(), args.src_username.strip(),
          args.src_password.strip(), args.src_ip.strip(),
-         args.delete_dst_user)
+         args.delete_dst_user, max(args.workers, 1), args.checkpoint, args.report_seconds)
@@ -1,3 +1,4 @@
+-- Baseline schema. Changes after this point are applied by api/migrations/*.sql.
 
 CREATE TABLE users (
     UserID SERIAL PRIMARY KEY,
@@ -12,6 +12,7 @@ import {
 import { Calendar, momentLocalizer, Views } from 'react-big-calendar'
 import moment from 'moment'
 import Cookies from 'js-cookie'
+import { fetchList } from '../utils/pagination'
 import 'react-big-calendar/lib/css/react-big-calendar.css'
 import './Calendar.css'
 const localizer = momentLocalizer(moment)
@@ -184,16 +185,12 @@ export default function CalendarView ({
         : toUnixSecondsUTC(dateRange[1])
 
     try {
-      const [logRes, userEventRes, todoRes] = await Promise.all([
-        fetch(`${logs_route}start=${start}&end=${end}&summary=false`),
-        fetch(`${userEvents_route}start=${start}&end=${end}`),
-        fetch(`${todo_route}start=${start}&end=${end}`)
+      const [logData, userEventData, todoData] = await Promise.all([
+        fetchList(`${logs_route}start=${start}&end=${end}&summary=false`),
+        fetchList(`${userEvents_route}start=${start}&end=${end}`),
+        fetchList(`${todo_route}start=${start}&end=${end}`)
       ])
 
-      const logData = await logRes.json()
-      const userEventData = await userEventRes.json()
-      const todoData = await todoRes.json()
-
       const logEvents =
         logData.status === 'success'
           ? logData.message.map(entry => ({
@@ -11,6 +11,7 @@ import {
   Container,
   Divider,
 } from "@mui/material"
+import { fetchList } from "../utils/pagination"
 
 export default function CreateProject() {
   const [name, setName] = useState("")
@@ -32,8 +33,7 @@ export default function CreateProject() {
 
   async function fetchTags() {
     try {
-      const res = await fetch("/api/tags/get", { credentials: "include" })
-      const data = await res.json()
+      const data = await fetchList("/api/tags/get")
       if (data.status === "success") {
         setTags(data.message)
       }
@@ -1,4 +1,5 @@
 import { useEffect, useState } from 'react'
+import { fetchList } from '../utils/pagination'
 
 export default function DeleteTags() {
   const [tags, setTags] = useState([])
@@ -13,12 +14,7 @@ export default function DeleteTags() {
   async function fetchTags() {
     setError("")
     try {
-      const res = await fetch('/api/tags/get', {
-        method: 'GET',
-        credentials: 'include',
-      })
-
-      const data = await res.json()
+      const data = await fetchList('/api/tags/get')
 
       if (data.status === 'success') {
         setTags(data.message)
@@ -25,6 +25,7 @@ import {
 
 import TodoCard from './projects/project/TodoCard'
 import EventCard from './projects/project/EventCard'
+import { fetchList } from '../utils/pagination'
 
 export default function Overview () {
   const { project_id } = useParams()
@@ -80,11 +81,7 @@ export default function Overview () {
         }
 
         // 2. Fetch todos
-        const todoRes = await fetch(
-          `/api/todo/get_user_todo?start=0&end=${endTimestamp}`,
-          { credentials: 'include' }
-        )
-        const todoData = await todoRes.json()
+        const todoData = await fetchList(`/api/todo/get_user_todo?start=0&end=${endTimestamp}`)
         if (todoData.status === 'success') {
           const now = Math.floor(Date.now() / 1000)
           const in7Days = now + 7 * 24 * 60 * 60
@@ -95,12 +92,7 @@ export default function Overview () {
           setTodos(relevantTodos)
         }
 
-        const eventRes = await fetch(
-          `/api/events/get_user_events?start=${startTimestamp}&end=${endTimestamp}`,
-          { credentials: 'include' }
-        )
-
-        const eventData = await eventRes.json()
+        const eventData = await fetchList(`/api/events/get_user_events?start=${startTimestamp}&end=${endTimestamp}`)
         if (eventData.status === 'success') {
           const now = Math.floor(Date.now() / 1000)
           const in7Days = now + 7 * 24 * 60 * 60
@@ -174,11 +166,7 @@ export default function Overview () {
     // If recurring, refetch from server to include the next recurrence
     if (completedTodo?.recurring) {
       try {
-        const res = await fetch(
-          `/api/todo/get_project_todo?project_id=${project_id}`,
-          { credentials: 'include' }
-        )
-        const data = await res.json()
+        const data = await fetchList(`/api/todo/get_project_todo?project_id=${project_id}`)
         if (data.status === 'success') {
           const refreshed = data.message.filter(
             todo => !todo.completed && todo.dueTime && todo.dueTime <= in7Days
@@ -15,6 +15,7 @@ import {
   InputLabel
 } from '@mui/material'
 import ProjectCard from './ProjectCard'
+import { fetchList } from '../utils/pagination'
 
 export default function Projects () {
   const [projects, setProjects] = useState([])
@@ -31,8 +32,7 @@ export default function Projects () {
 
   const fetchTags = async () => {
     try {
-      const res = await fetch('/api/tags/get', { credentials: 'include' })
-      const data = await res.json()
+      const data = await fetchList('/api/tags/get')
       if (data.status === 'success') {
         const sortedTags = data.message.sort((a, b) =>
           a.tag.toLowerCase().localeCompare(b.tag.toLowerCase())
@@ -48,14 +48,12 @@ export default function Projects () {
 
   const fetchProjects = async () => {
     try {
-      const res = await fetch('/api/projects/get_all', {
-        method: 'GET',
-        credentials: 'include'
-      })
-      if (!res.ok) throw new Error('Unauthorized or failed request')
-      const data = await res.json()
+      const data = await fetchList('/api/projects/get_all')
       if (data.status === 'success') {
-        const projectList = data.message
+        // The list comes by ID, timeCreated holds when each project was last opened
+        const projectList = data.message.sort(
+          (a, b) => b.timeCreated - a.timeCreated
+        )
         if (!projectList || projectList.length === 0) {
           setError('No projects found.')
           setProjects([])
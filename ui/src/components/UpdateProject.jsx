@@ -10,6 +10,7 @@ import {
   Button,
   Divider,
 } from "@mui/material"
+import { fetchList } from "../utils/pagination"
 
 export default function EditProject() {
   const { project_id } = useParams()
@@ -51,8 +52,7 @@ export default function EditProject() {
 
   async function fetchTags() {
     try {
-      const res = await fetch("/api/tags/get", { credentials: "include" })
-      const data = await res.json()
+      const data = await fetchList("/api/tags/get")
       if (data.status === "success") {
         setTags(data.message)
       }
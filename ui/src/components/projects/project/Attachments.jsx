@@ -1,27 +1,23 @@
 import { useParams, Link } from 'react-router-dom'
 import { Typography, Box, Button,Divider, Grid } from '@mui/material'
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../utils/changes'
 import FileCard from './pages/FileCard'
+import { fetchList } from '../../../utils/pagination'
 
 export default function Attachments () {
   const { project_id } = useParams()
   const [files, setFiles] = useState([])
 
   useEffect(() => {
-    let intervalId
     async function fetchFiles () {
-      const res = await fetch(`/api/files/files_by_project?id=${project_id}`, {
-        credentials: 'include'
-      })
-      const data = await res.json()
-      setFiles(data)
+      const data = await fetchList(`/api/files/files_by_project?id=${project_id}`)
+      setFiles(data.message)
     }
 
     fetchFiles()
 
-    intervalId = setInterval(fetchFiles, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('project', project_id, ['files'], fetchFiles)
   }, [project_id])
 
   const handleDelete = deletedId => {
@@ -7,19 +7,17 @@ import {
   Grid
 } from '@mui/material'
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../utils/changes'
 import CanvasCard from './pages/CanvasCard'
+import { fetchList } from '../../../utils/pagination'
 
 export default function Canvases () {
   const {project_id } = useParams()
   const [canvases, setCanvases] = useState([])
 
   useEffect(() => {
-    let intervalId
     async function fetchCanvases() {
-      const res = await fetch(`/api/canvas/get_all_by_project?id=${project_id}`, {
-        credentials: 'include',
-      })
-      const data = await res.json()
+      const data = await fetchList(`/api/canvas/get_all_by_project?id=${project_id}`)
       if (data.status === 'success') {
         setCanvases(data.message)
       }
@@ -27,9 +25,7 @@ export default function Canvases () {
 
     fetchCanvases()
 
-    intervalId = setInterval(fetchCanvases, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('project', project_id, ['canvas'], fetchCanvases)
   }, [project_id])
 
   const handleDelete = (deletedId) => {
@@ -8,6 +8,7 @@ import {
 } from '@mui/material'
 import { useEffect, useState } from 'react'
 import EquationCard from './pages/EquationCard'
+import { fetchList } from '../../../utils/pagination'
 
 export default function Equations () {
   const {project_id } = useParams()
@@ -15,10 +16,7 @@ export default function Equations () {
 
   useEffect(() => {
     async function fetchEquations() {
-      const res = await fetch(`/api/equations/get_all_by_project?id=${project_id}`, {
-        credentials: 'include',
-      })
-      const data = await res.json()
+      const data = await fetchList(`/api/equations/get_all_by_project?id=${project_id}`)
       if (data.status === 'success') {
         setEquations(data.message)
       }
@@ -7,19 +7,17 @@ import {
   Grid
 } from '@mui/material'
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../utils/changes'
 import EventCard from './EventCard'
+import { fetchList } from '../../../utils/pagination'
 
 export default function Events() {
   const { project_id } = useParams()
   const [events, setEvents] = useState([])
 
   useEffect(() => {
-    let intervalId
     async function fetchEvents() {
-      const res = await fetch(`/api/events/get_project_events?project_id=${project_id}`, {
-        credentials: 'include',
-      })
-      const data = await res.json()
+      const data = await fetchList(`/api/events/get_project_events?project_id=${project_id}`)
       if (data.status === 'success') {
         setEvents(data.message)
       }
@@ -27,9 +25,7 @@ export default function Events() {
 
     fetchEvents()
 
-    intervalId = setInterval(fetchEvents, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('project', project_id, ['events'], fetchEvents)
   }, [project_id])
 
   const handleDelete = (deletedId) => {
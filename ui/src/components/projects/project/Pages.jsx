@@ -11,7 +11,9 @@ import {
   InputLabel
 } from '@mui/material'
 import { useEffect, useState, useMemo } from 'react'
+import { subscribeToChanges } from '../../../utils/changes'
 import PageCard from './PageCard'
+import { fetchList } from '../../../utils/pagination'
 
 export default function Pages () {
   const { project_id } = useParams()
@@ -19,20 +21,15 @@ export default function Pages () {
   const [sortBy, setSortBy] = useState('lastEdit') // default: last edited
 
   useEffect(() => {
-    let intervalId
     async function fetchPages () {
-      const res = await fetch(`/api/pages/get_project_pages?id=${project_id}`, {
-        credentials: 'include'
-      })
-      const data = await res.json()
+      const data = await fetchList(`/api/pages/get_project_pages?id=${project_id}`)
       if (data.status === 'success') {
         setPages(data.message)
       }
     }
 
     fetchPages()
-    intervalId = setInterval(fetchPages, 5000)
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('project', project_id, ['pages'], fetchPages)
   }, [project_id])
 
   const handleDelete = deletedId => {
@@ -25,6 +25,7 @@ import {
 
 import TodoCard from './TodoCard'
 import EventCard from './EventCard'
+import { fetchList } from '../../../utils/pagination'
 
 export default function ProjectOverview () {
   const { project_id } = useParams()
@@ -40,14 +41,29 @@ export default function ProjectOverview () {
     async function fetchAllData () {
       setLoading(true)
       try {
-        // 1. Fetch pages
-        const pageRes = await fetch(
-          `/api/pages/get_project_pages?id=${project_id}`,
+        // Pages, review list, todos and events come from the project dashboard in one request
+        const res = await fetch(
+          `/api/projects/dashboard?id=${project_id}&panels=pages,reviews,todos,events`,
           { credentials: 'include' }
         )
-        const pageData = await pageRes.json()
-        if (pageData.status === 'success') {
-          const pages = pageData.message
+        const data = await res.json()
+        if (data.status === 'success') {
+          const { reviews } = data.message
+          // Panels cut short at the dashboard's limit continue from their own endpoints
+          const [pages, todos, events] = await Promise.all(
+            [
+              ['pages', `/api/pages/get_project_pages?id=${project_id}`],
+              ['todos', `/api/todo/get_project_todo?project_id=${project_id}`],
+              ['events', `/api/events/get_project_events?project_id=${project_id}`]
+            ].map(async ([panel, url]) => {
+              const next = data.next?.[panel]
+              if (!next) return data.message[panel]
+              const rest = await fetchList(url, next)
+              return rest.status === 'success'
+                ? data.message[panel].concat(rest.message)
+                : data.message[panel]
+            })
+          )
           if (pages.length > 0) {
             const mostRecentPage = pages.reduce((latest, page) => {
               return !latest || page.lastEditTime > latest.lastEditTime
@@ -56,42 +72,18 @@ export default function ProjectOverview () {
             }, null)
             setLastEditedPage(mostRecentPage)
           }
-        }
 
-        const reviewRes = await fetch(
-          `/api/pages/get_project_pages_review_list?id=${project_id}`,
-          { credentials: 'include' }
-        )
-        const reviewDataJson = await reviewRes.json()
-        if (reviewDataJson.status === 'success') {
-          setReviewData(reviewDataJson.message)
-        }
+          setReviewData(reviews)
 
-        // 2. Fetch todos
-        const todoRes = await fetch(
-          `/api/todo/get_project_todo?project_id=${project_id}`,
-          { credentials: 'include' }
-        )
-        const todoData = await todoRes.json()
-        if (todoData.status === 'success') {
           const now = Math.floor(Date.now() / 1000)
           const in7Days = now + 7 * 24 * 60 * 60
 
-          const relevantTodos = todoData.message.filter(
+          const relevantTodos = todos.filter(
             todo => !todo.completed && todo.dueTime && todo.dueTime <= in7Days
           ).sort((a, b) => a.dueTime - b.dueTime)
           setTodos(relevantTodos)
-        }
-        const eventRes = await fetch(
-          `/api/events/get_project_events?project_id=${project_id}`,
-          { credentials: 'include' }
-        )
-        const eventData = await eventRes.json()
-        if (eventData.status === 'success') {
-          const now = Math.floor(Date.now() / 1000)
-          const in7Days = now + 7 * 24 * 60 * 60
 
-          const upcomingEvents = eventData.message.filter(
+          const upcomingEvents = events.filter(
             event =>
               event.eventTime &&
               event.eventTime >= now &&
@@ -160,11 +152,7 @@ export default function ProjectOverview () {
     // If recurring, refetch from server to include the next recurrence
     if (completedTodo?.recurring) {
       try {
-        const res = await fetch(
-          `/api/todo/get_project_todo?project_id=${project_id}`,
-          { credentials: 'include' }
-        )
-        const data = await res.json()
+        const data = await fetchList(`/api/todo/get_project_todo?project_id=${project_id}`)
         if (data.status === 'success') {
           const refreshed = data.message.filter(
             todo => !todo.completed && todo.dueTime && todo.dueTime <= in7Days
@@ -7,19 +7,17 @@ import {
   Grid
 } from '@mui/material'
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../utils/changes'
 import SnippetCard from './pages/SnippetCard'
+import { fetchList } from '../../../utils/pagination'
 
 export default function Snippets() {
   const {project_id } = useParams()
   const [snippets, setSnippets] = useState([])
 
   useEffect(() => {
-    let intervalId
     async function fetchSnippets() {
-      const res = await fetch(`/api/code_snippet/get_all_by_project?id=${project_id}`, {
-        credentials: 'include',
-      })
-      const data = await res.json()
+      const data = await fetchList(`/api/code_snippet/get_all_by_project?id=${project_id}`)
       if (data.status === 'success') {
         setSnippets(data.message)
       }
@@ -27,9 +25,7 @@ export default function Snippets() {
 
     fetchSnippets()
 
-    intervalId = setInterval(fetchSnippets, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('project', project_id, ['codesnippets'], fetchSnippets)
   }, [project_id])
 
   const handleDelete = (deletedId) => {
@@ -10,7 +10,9 @@ import {
 } from '@mui/material'
 
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../utils/changes'
 import TodoCard from './TodoCard'
+import { fetchList } from '../../../utils/pagination'
 
 export default function Todos () {
   const { project_id } = useParams()
@@ -18,15 +20,8 @@ export default function Todos () {
   const [snackbarOpen, setSnackbarOpen] = useState(false)
 
   useEffect(() => {
-    let intervalId
     async function fetchTodos () {
-      const res = await fetch(
-        `/api/todo/get_project_todo?project_id=${project_id}`,
-        {
-          credentials: 'include'
-        }
-      )
-      const data = await res.json()
+      const data = await fetchList(`/api/todo/get_project_todo?project_id=${project_id}`)
       if (data.status === 'success') {
         setTodos(data.message)
       }
@@ -34,9 +29,7 @@ export default function Todos () {
 
     fetchTodos()
 
-    intervalId = setInterval(fetchTodos, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('project', project_id, ['todo'], fetchTodos)
   }, [project_id])
 
   const handleDelete = deletedId => {
@@ -62,13 +55,7 @@ export default function Todos () {
     // If the todo is recurring, refetch from server
     if (completedTodo?.recurring) {
       try {
-        const res = await fetch(
-          `/api/todo/get_project_todo?project_id=${project_id}`,
-          {
-            credentials: 'include'
-          }
-        )
-        const data = await res.json()
+        const data = await fetchList(`/api/todo/get_project_todo?project_id=${project_id}`)
         if (data.status === 'success') {
           setTodos(data.message)
           setSnackbarOpen(true)
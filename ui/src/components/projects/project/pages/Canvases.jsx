@@ -1,19 +1,17 @@
 import { useParams, Link } from 'react-router-dom'
 import { Typography, Box, Button, Divider, Grid } from '@mui/material'
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../../utils/changes'
 import CanvasCard from './CanvasCard'
+import { fetchList } from '../../../../utils/pagination'
 
 export default function PageCanvases () {
   const { project_id, page_id } = useParams()
   const [canvases, setCanvases] = useState([])
 
   useEffect(() => {
-    let intervalId
     async function fetchCanvases () {
-      const res = await fetch(`/api/canvas/get_all_by_page?id=${page_id}`, {
-        credentials: 'include'
-      })
-      const data = await res.json()
+      const data = await fetchList(`/api/canvas/get_all_by_page?id=${page_id}`)
       if (data.status === 'success') {
         setCanvases(data.message)
       }
@@ -21,9 +19,7 @@ export default function PageCanvases () {
 
     fetchCanvases()
 
-    intervalId = setInterval(fetchCanvases, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('page', page_id, ['canvas'], fetchCanvases)
   }, [page_id])
 
   const handleDelete = deletedId => {
@@ -7,19 +7,17 @@ import {
   Grid
 } from '@mui/material'
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../../utils/changes'
 import EquationCard from './EquationCard'
+import { fetchList } from '../../../../utils/pagination'
 
 export default function PageEquations () {
   const {project_id,  page_id } = useParams()
   const [equations, setEquations] = useState([])
 
   useEffect(() => {
-    let intervalId
     async function fetchEquations() {
-      const res = await fetch(`/api/equations/get_all_by_page?id=${page_id}`, {
-        credentials: 'include',
-      })
-      const data = await res.json()
+      const data = await fetchList(`/api/equations/get_all_by_page?id=${page_id}`)
       if (data.status === 'success') {
         setEquations(data.message)
       }
@@ -27,9 +25,7 @@ export default function PageEquations () {
 
     fetchEquations()
 
-    intervalId = setInterval(fetchEquations, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('page', page_id, ['equations'], fetchEquations)
   }, [page_id])
 
   const handleDelete = (deletedId) => {
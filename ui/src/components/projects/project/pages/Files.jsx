@@ -1,27 +1,23 @@
 import { useParams, Link } from 'react-router-dom'
 import { Typography, Box, Button, Divider, Grid } from '@mui/material'
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../../utils/changes'
 import FileCard from './FileCard'
+import { fetchList } from '../../../../utils/pagination'
 
 export default function PageFiles () {
   const { project_id, page_id } = useParams()
   const [files, setFiles] = useState([])
 
   useEffect(() => {
-    let intervalId
     async function fetchFiles () {
-      const res = await fetch(`/api/files/files_by_page?page_id=${page_id}`, {
-        credentials: 'include'
-      })
-      const data = await res.json()
-      setFiles(data)
+      const data = await fetchList(`/api/files/files_by_page?page_id=${page_id}`)
+      setFiles(data.message)
     }
 
     fetchFiles()
 
-    intervalId = setInterval(fetchFiles, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('page', page_id, ['files'], fetchFiles)
   }, [page_id])
 
   const handleDelete = deletedId => {
@@ -29,6 +29,7 @@ import {
   oneLight
 } from 'react-syntax-highlighter/dist/esm/styles/prism'
 import Cookies from 'js-cookie'
+import { fetchList } from '../../../../utils/pagination'
 
 export default function PageContent () {
   const [fullscreen, setFullscreen] = useState(false)
@@ -84,14 +85,8 @@ export default function PageContent () {
 
   const fetchTranslations = async () => {
     try {
-      const res = await fetch(
-        `/api/translations/get_all_by_page?id=${page_id}`,
-        {
-          credentials: 'include'
-        }
-      )
-      const data = await res.json()
-      if (res.ok && data.status === 'success') {
+      const data = await fetchList(`/api/translations/get_all_by_page?id=${page_id}`)
+      if (data.status === 'success') {
         setTranslations(data.message || [])
       }
     } catch (err) {
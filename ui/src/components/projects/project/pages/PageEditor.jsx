@@ -1,4 +1,4 @@
-import { useState, useEffect, useRef } from 'react'
+import { useState, useEffect, useRef, useMemo } from 'react'
 import { useParams } from 'react-router-dom'
 import { TextField, Button, Box } from '@mui/material'
 import { Fullscreen, FullscreenExit } from '@mui/icons-material' 
@@ -8,6 +8,7 @@ import rehypeKatex from 'rehype-katex'
 import rehypeHighlight from 'rehype-highlight'
 import remarkGfm from 'remark-gfm'
 import { replaceImageHosts } from '../../../../utils/scripts.js'
+import { createContentSaver } from '../../../../utils/patches.js'
 import 'katex/dist/katex.min.css'
 import 'highlight.js/styles/github-dark.css'
 import { Prism as SyntaxHighlighter } from 'react-syntax-highlighter'
@@ -35,6 +36,11 @@ export default function PageEditor () {
   const updateTimeout = 1000 // 1 second delay for auto-save
   const autoSaveTimeout = 500 // 500ms delay for auto-save
 
+  const saver = useMemo(
+    () => createContentSaver('/api/pages/content', { page_id }, () => fetchPage()),
+    [page_id]
+  )
+
   useEffect(() => {
     fetchPage()
   }, [page_id])
@@ -47,6 +53,7 @@ export default function PageEditor () {
       const data = await res.json()
       if (res.ok && data.status === 'success') {
         const uncleaned_content = data.message.content || ''
+        saver.reset(uncleaned_content, data.message.revision)
         setText(replaceImageHosts(uncleaned_content))
         lastEditTimeRef.current = (data.message.lastEditTime || 0) * 1000
         if (lastSaveTimeRef.current < lastEditTimeRef.current) {
@@ -92,15 +99,7 @@ export default function PageEditor () {
     const timeout = setTimeout(async () => {
       setSaving(true)
       try {
-        await fetch('/api/pages/content', {
-          method: 'PUT',
-          headers: { 'Content-Type': 'application/json' },
-          credentials: 'include',
-          body: JSON.stringify({
-            page_id: page_id,
-            content: text
-          })
-        })
+        await saver.save(text)
         lastSaveTimeRef.current = Date.now()
       } catch (err) {
         console.error('Auto-save failed:', err)
@@ -109,7 +108,7 @@ export default function PageEditor () {
       }
     }, autoSaveTimeout)
     return () => clearTimeout(timeout)
-  }, [text, page_id])
+  }, [text, saver])
 
   useEffect(() => {
     if (containerRef.current) {
@@ -180,15 +179,7 @@ export default function PageEditor () {
     // Immediate save after paste
     try {
       setSaving(true)
-      await fetch('/api/pages/content', {
-        method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
-        credentials: 'include',
-        body: JSON.stringify({
-          page_id: page_id,
-          content: newText
-        })
-      })
+      await saver.save(newText)
       lastSaveTimeRef.current = Date.now()
     } catch (err) {
       console.error('Auto-save after paste failed:', err)
@@ -7,19 +7,17 @@ import {
   Grid
 } from '@mui/material'
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../../utils/changes'
 import RecipeCard from './RecipeCard'
+import { fetchList } from '../../../../utils/pagination'
 
 export default function PageRecipes () {
   const {project_id,  page_id } = useParams()
   const [recipes, setRecipes] = useState([])
 
   useEffect(() => {
-    let intervalId
     async function fetchRecipes() {
-      const res = await fetch(`/api/recipes/get_all_by_page?id=${page_id}`, {
-        credentials: 'include',
-      })
-      const data = await res.json()
+      const data = await fetchList(`/api/recipes/get_all_by_page?id=${page_id}`)
       if (data.status === 'success') {
         setRecipes(data.message)
       }
@@ -27,9 +25,7 @@ export default function PageRecipes () {
 
     fetchRecipes()
 
-    intervalId = setInterval(fetchRecipes, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('page', page_id, ['recipes'], fetchRecipes)
   }, [page_id])
 
   const handleDelete = (deletedId) => {
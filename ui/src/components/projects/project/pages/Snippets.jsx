@@ -7,19 +7,17 @@ import {
   Grid
 } from '@mui/material'
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../../utils/changes'
 import SnippetCard from './SnippetCard'
+import { fetchList } from '../../../../utils/pagination'
 
 export default function PageSnippets() {
   const {project_id,  page_id } = useParams()
   const [snippets, setSnippets] = useState([])
 
   useEffect(() => {
-    let intervalId
     async function fetchSnippets() {
-      const res = await fetch(`/api/code_snippet/get_all_by_page?id=${page_id}`, {
-        credentials: 'include',
-      })
-      const data = await res.json()
+      const data = await fetchList(`/api/code_snippet/get_all_by_page?id=${page_id}`)
       if (data.status === 'success') {
         setSnippets(data.message)
       }
@@ -27,9 +25,7 @@ export default function PageSnippets() {
 
     fetchSnippets()
 
-    intervalId = setInterval(fetchSnippets, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('page', page_id, ['codesnippets'], fetchSnippets)
   }, [page_id])
 
   const handleDelete = (deletedId) => {
@@ -7,19 +7,17 @@ import {
   Grid
 } from '@mui/material'
 import { useEffect, useState } from 'react'
+import { subscribeToChanges } from '../../../../utils/changes'
 import TranslationCard from './TranslationCard'
+import { fetchList } from '../../../../utils/pagination'
 
 export default function PageTranslations () {
   const {project_id,  page_id } = useParams()
   const [translations, setTranslations] = useState([])
 
   useEffect(() => {
-    let intervalId
     async function fetchTranslations() {
-      const res = await fetch(`/api/translations/get_all_by_page?id=${page_id}`, {
-        credentials: 'include',
-      })
-      const data = await res.json()
+      const data = await fetchList(`/api/translations/get_all_by_page?id=${page_id}`)
       if (data.status === 'success') {
         setTranslations(data.message)
       }
@@ -27,9 +25,7 @@ export default function PageTranslations () {
 
     fetchTranslations()
 
-    intervalId = setInterval(fetchTranslations, 5000)
-
-    return () => clearInterval(intervalId)
+    return subscribeToChanges('page', page_id, ['translations'], fetchTranslations)
   }, [page_id])
   const handleDelete = (deletedId) => {
     setTranslations((prev) => prev.filter((translation) => translation.TranslationID !== deletedId))
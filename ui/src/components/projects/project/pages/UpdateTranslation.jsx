@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useRef } from 'react'
+import React, { useState, useEffect, useRef, useMemo } from 'react'
 import { useNavigate, useParams } from 'react-router-dom'
 import {
   Box,
@@ -13,6 +13,7 @@ import remarkMath from 'remark-math'
 import rehypeKatex from 'rehype-katex'
 import 'katex/dist/katex.min.css'
 import { replaceImageHosts } from '../../../../utils/scripts.js'
+import { createContentSaver } from '../../../../utils/patches.js'
 import { Fullscreen, FullscreenExit } from '@mui/icons-material'
 
 export default function UpdateTranslation () {
@@ -46,6 +47,7 @@ export default function UpdateTranslation () {
       if (!res.ok)
         throw new Error(data.message || 'Failed to load Translation.')
 
+      saver.reset(data.message.content || '', data.message.revision)
       setContent(replaceImageHosts(data.message.content || ''))
       setLanguage(data.message.language || '')
 
@@ -76,6 +78,16 @@ export default function UpdateTranslation () {
     }
   }
 
+  const saver = useMemo(
+    () =>
+      createContentSaver(
+        '/api/translations/update',
+        { translation_id: Number(translation_id) },
+        () => fetchTranslation()
+      ),
+    [translation_id]
+  )
+
   useEffect(() => {
     fetchTranslation()
     fetchCurrentPage()
@@ -88,16 +100,19 @@ export default function UpdateTranslation () {
       // Skip polling if last edit was within the last 2 seconds
       if (now - lastEditTimeRef.current < 2000) return
       try {
+        // One request for both; the browser revalidates it with If-None-Match
         const res = await fetch(
-          `/api/translations/last_update?id=${translation_id}`,
+          `/api/sync/last_updates?translation=${translation_id}&page=${page_id}`,
           {
             credentials: 'include'
           }
         )
         const data = await res.json()
+        if (!res.ok || data.status !== 'success') return
 
-        if (res.ok && data.last_update && data.last_update !== 'Null') {
-          const lastUpdate = Number(data.last_update) * 1000
+        const translationUpdate = data.message.translation[translation_id]
+        if (translationUpdate !== null) {
+          const lastUpdate = Number(translationUpdate) * 1000
           if (
             lastUpdate > lastEditTimeRef.current &&
             lastUpdate > lastSaveTimeRef.current
@@ -106,14 +121,10 @@ export default function UpdateTranslation () {
           }
         }
 
-        const pageRes = await fetch(`/api/pages/last_update?id=${page_id}`, {
-          credentials: 'include'
-        })
-        const pageData = await pageRes.json()
+        const pageUpdate = data.message.page[page_id]
         if (
-          pageRes.ok &&
-          pageData.last_update &&
-          pageData.last_update > lastCurrentPagePollRef.current
+          pageUpdate !== null &&
+          pageUpdate > lastCurrentPagePollRef.current
         ) {
           fetchCurrentPage()
         }
@@ -131,15 +142,7 @@ export default function UpdateTranslation () {
     const timeout = setTimeout(async () => {
       setSaving(true)
       try {
-        await fetch('/api/translations/update', {
-          method: 'PUT',
-          headers: { 'Content-Type': 'application/json' },
-          credentials: 'include',
-          body: JSON.stringify({
-            translation_id: Number(translation_id),
-            new_content: content
-          })
-        })
+        await saver.save(content)
         lastSaveTimeRef.current = Date.now()
       } catch (err) {
         console.error('Auto-save failed:', err)
@@ -149,7 +152,7 @@ export default function UpdateTranslation () {
     }, autoSaveTimeout)
 
     return () => clearTimeout(timeout)
-  }, [content, translation_id])
+  }, [content, saver])
 
   useEffect(() => {
     const handlePaste = async e => {
@@ -213,15 +216,7 @@ export default function UpdateTranslation () {
 
     try {
       setSaving(true)
-      await fetch('/api/translations/update', {
-        method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
-        credentials: 'include',
-        body: JSON.stringify({
-          translation_id: Number(translation_id),
-          new_content: newText
-        })
-      })
+      await saver.save(newText)
       lastSaveTimeRef.current = Date.now()
     } catch (err) {
       console.error('Auto-save after paste failed:', err)
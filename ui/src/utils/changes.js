@@ -0,0 +1,85 @@
+// One EventSource per tab, carrying the changes of every project and page that components have subscribed to. When a
+// project or page is added the stream is reopened with the new list, and the previous stream is only closed once the
+// new one is ready, so no change is missed in between.
+const scopes = new Map()
+const retiring = new Set()
+let current = null
+let reopenTimer = null
+
+function notify (key, change) {
+  const listeners = scopes.get(key)
+  if (listeners) listeners.forEach(listener => listener(change))
+}
+
+function refetchAll (stream) {
+  stream.keys.forEach(key => notify(key, null))
+}
+
+function openStream () {
+  reopenTimer = null
+  if (current) retiring.add(current)
+  current = null
+
+  if (scopes.size === 0) {
+    retiring.forEach(stream => stream.source.close())
+    retiring.clear()
+    return
+  }
+
+  const keys = [...scopes.keys()]
+  const query = keys.map(key => key.replace(':', '_id=')).join('&')
+  const stream = {
+    source: new EventSource(`/api/changes/stream?${query}`, { withCredentials: true }),
+    keys,
+    connected: false
+  }
+
+  stream.source.addEventListener('change', event => {
+    const change = JSON.parse(event.data)
+    notify(`project:${change.project_id}`, change)
+    notify(`page:${change.page_id}`, change)
+  })
+  // The server sends 'ready' on every connect. Anything after the first connect, and any 'resync', means changes
+  // may have been missed while disconnected, so the stream's subscribers refetch.
+  stream.source.addEventListener('ready', () => {
+    if (stream.connected) refetchAll(stream)
+    stream.connected = true
+    if (stream === current) {
+      retiring.forEach(previous => previous.source.close())
+      retiring.clear()
+    }
+  })
+  stream.source.addEventListener('resync', () => refetchAll(stream))
+
+  current = stream
+}
+
+function scheduleReopen () {
+  // Components mounting and unmounting together, as on navigation, cause a single reopen
+  if (reopenTimer === null) reopenTimer = setTimeout(openStream, 0)
+}
+
+// Calls onChange whenever one of tables changes in the project or page (scope is 'project' or 'page'), or with
+// null when the client should refetch everything. Returns the unsubscribe function, for use as an effect cleanup.
+export function subscribeToChanges (scope, id, tables, onChange) {
+  const key = `${scope}:${id}`
+  const listener = change => {
+    if (change === null || tables.includes(change.table)) onChange(change)
+  }
+
+  if (!scopes.has(key)) {
+    scopes.set(key, new Set())
+    if (!current || !current.keys.includes(key)) scheduleReopen()
+  }
+  scopes.get(key).add(listener)
+
+  return () => {
+    const listeners = scopes.get(key)
+    listeners.delete(listener)
+    if (listeners.size === 0) {
+      scopes.delete(key)
+      // A scope no longer listened to stays on the stream until it is next reopened, unless it was the last one
+      if (scopes.size === 0) scheduleReopen()
+    }
+  }
+}
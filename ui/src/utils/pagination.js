@@ -0,0 +1,23 @@
+// Fetches a list endpoint and every following page of it, continuing from the 'next' cursor of each response until
+// there is none. Resolves to the body of the first response with message holding all the items, or to the first
+// body that isn't a success, so callers check data.status and read data.message as for a single request. cursor
+// starts the list after the items already read, as from a dashboard panel's next.
+export async function fetchList (url, cursor = null) {
+  const separator = url.includes('?') ? '&' : '?'
+  const first = cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url
+  const res = await fetch(first, { credentials: 'include' })
+  const data = await res.json()
+  let next = data.next
+  delete data.next
+
+  while (data.status === 'success' && next) {
+    const pageRes = await fetch(`${url}${separator}cursor=${encodeURIComponent(next)}`, {
+      credentials: 'include'
+    })
+    const page = await pageRes.json()
+    if (page.status !== 'success') return page
+    data.message = data.message.concat(page.message)
+    next = page.next
+  }
+  return data
+}
@@ -0,0 +1,65 @@
+const isLowSurrogate = code => code >= 0xdc00 && code <= 0xdfff
+
+// Splice ops turning base into content, as [[start, deleteCount, insert]] with offsets into base. Autosaves are
+// small, contiguous edits, so a single op covering everything between the common prefix and suffix is enough.
+export function makePatch (base, content) {
+  if (base === content) return []
+
+  const shorter = Math.min(base.length, content.length)
+  let start = 0
+  while (start < shorter && base[start] === content[start]) start++
+  // Never split a surrogate pair
+  if (start > 0 && isLowSurrogate(base.charCodeAt(start))) start--
+
+  let end = 0
+  while (
+    end < shorter - start &&
+    base[base.length - 1 - end] === content[content.length - 1 - end]
+  ) end++
+  if (end > 0 && isLowSurrogate(base.charCodeAt(base.length - end))) end--
+
+  return [[start, base.length - start - end, content.slice(start, content.length - end)]]
+}
+
+// Saves content as patches against the last revision the server acknowledged. Saves are sent one at a time so each
+// is based on the previous one. body holds the ID field(s) for the endpoint. If the server has moved on to another
+// revision, onConflict is called and should refetch, then call reset with the server's content and revision.
+export function createContentSaver (url, body, onConflict) {
+  let base = null
+  let pending = Promise.resolve()
+
+  const send = async content => {
+    if (base === null) return
+    const ops = makePatch(base.content, content)
+    if (ops.length === 0) return
+
+    const res = await fetch(url, {
+      method: 'PATCH',
+      headers: { 'Content-Type': 'application/json' },
+      credentials: 'include',
+      body: JSON.stringify({ ...body, base_revision: base.revision, ops })
+    })
+    const data = await res.json()
+    if (res.ok && data.status === 'success') {
+      base = { content, revision: data.revision }
+    } else if (res.status === 409) {
+      base = null
+      onConflict()
+    } else {
+      throw new Error(data.message || 'Save failed')
+    }
+  }
+
+  return {
+    reset (content, revision) {
+      base = { content, revision }
+    },
+    save (content) {
+      pending = pending.then(() => send(content))
+      // Keep the chain going after a failed save
+      const saved = pending
+      pending = pending.catch(() => {})
+      return saved
+    }
+  }
+}